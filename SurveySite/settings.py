@@ -38,19 +38,22 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'import_export',
-    'django_archive',
     'coverage',
+    'rest_framework',
     'survey',
+    'django_archive',
     'report_builder',
 ]
 
 
 MIDDLEWARE = [
+    'survey.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'survey.identity.EmployeeIdentityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,10 +62,17 @@ ROOT_URLCONF = 'SurveySite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'survey.profiling.ProfilingDjangoTemplates',
         'DIRS': [TEMPLATE_DIR, os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept for the life of the process, restart
+            # the server after editing templates
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.contrib.auth.context_processors.auth',
                 'django.template.context_processors.debug',
@@ -94,6 +104,17 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'survey',
+    }
+}
+
+# Sessions are read from the cache and written through to the database,
+# 'django.contrib.sessions.backends.signed_cookies' works as well
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
@@ -147,7 +168,7 @@ LOGGING = {
         },
         'django.db': {
             'handlers': ['db_logging'],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': False,
         },
         'django.template': {
@@ -188,3 +209,13 @@ EMAIL_PORT = 587
 
 AUTH_USER_MODEL = 'survey.User'
 
+# Request profiling, see survey.profiling.ProfilingMiddleware
+SURVEY_PROFILING = False
+SURVEY_PROFILING_BUFFER = 500
+SURVEY_QUERY_BUDGETS = {
+    'employee': 8,
+    'que_list': 8,
+    'save': 30,
+}
+SURVEY_QUERY_BUDGET_ACTION = 'log'
+
@@ -15,9 +15,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from survey.profiling import profiling_view
 
 
 urlpatterns = [
+    path('admin/profiling/', admin.site.admin_view(profiling_view), name='profiling'),
     path('admin/', admin.site.urls, name='admin'),
     path('', include('survey.urls'), name='survey'),
     path('report_builder/', include('report_builder.urls')),
@@ -0,0 +1,3 @@
+__version__ = '1.0.0'
+
+default_app_config = 'survey.apps.SurveyConfig'
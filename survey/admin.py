@@ -2,13 +2,26 @@
 This file handling all admin site customization
 """
 import logging
-from smtplib import SMTPAuthenticationError
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from django.core.mail import EmailMessage
-from import_export import resources
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from import_export import fields, resources, widgets
 from import_export.admin import ImportExportModelAdmin
-from .models import Employee, Organization, Survey, Question, SurveyFeedback, User
+from .exports import EXPORT_FORMATS, iter_export
+from .forms import EmployeeImportForm, SurveyForm
+from .imports import import_employees, read_rows
+from .mail_queue import enqueue_mail
+from .queries import assign_employees, invalidate_archived_organizations, \
+    scope_to_organization, set_questions
+from .models import Employee, Organization, Survey, Question, SurveyFeedback, User, \
+    OutboundEmail, SurveyAssignment, SurveyResultSummary, QuestionResultSummary, \
+    SurveyQuestion, SurveySection
 from django.utils.timezone import now
 
 
@@ -39,13 +52,17 @@ class SurveyResource(resources.ModelResource):
     Implementing Import Export
     functionality on survey model
     """
+    # Assignments carry a status, they are exported but not imported
+    employee = fields.Field(attribute='employee', column_name='employee', readonly=True,
+                            widget=widgets.ManyToManyWidget(Employee))
+
     class Meta:
         """
         Customization in Survey Module
         """
         model = Survey
         fields = ('id', 'survey_name', 'employee',
-                  'startDatetime', 'endDatetime', 'flag')
+                  'startDatetime', 'endDatetime')
         export_order = fields
 
 
@@ -75,15 +92,19 @@ class MyUserAdmin(UserAdmin):
 
 
 def archive_action(modeladmin, request, queryset):
-    for org in queryset:
-        org.is_archived = True
-        org.save()
+    """
+    Archiving selected organizations with a single update
+    """
+    queryset.update(is_archived=True)
+    invalidate_archived_organizations()
 
 
 def restore_action(modeladmin, request, queryset):
-    for org in queryset:
-        org.is_archived = False
-        org.save()
+    """
+    Restoring selected organizations with a single update
+    """
+    queryset.update(is_archived=False)
+    invalidate_archived_organizations()
 
 
 archive_action.short_description = 'Archive'
@@ -96,6 +117,7 @@ class OrganizationDetails(admin.ModelAdmin):
     """
     list_display = ('id', 'company_name', 'location', 'description', 'status')
     list_filter = ('location',)
+    exclude = Organization.VERSION_FIELDS
 
     actions = [archive_action, restore_action]
 
@@ -135,6 +157,34 @@ class EmployeeDetails(ImportExportModelAdmin, admin.ModelAdmin):
     )
     ordering = ('emp_username',)
     resource_class = EmployeeResource
+    change_list_template = 'admin/survey/employee/change_list.html'
+
+    def get_urls(self):
+        """
+        Adding bulk import url to the employee admin
+        """
+        urls = [path('bulk-import/', self.admin_site.admin_view(self.bulk_import_view),
+                     name='survey_employee_bulk_import')]
+        return urls + super(EmployeeDetails, self).get_urls()
+
+    def bulk_import_view(self, request):
+        """
+        Importing uploaded employees into the organization
+        of logged-in organization admin in batches
+        """
+        if not self.has_add_permission(request) or request.user.organization_id is None:
+            raise PermissionDenied
+        report = None
+        form = EmployeeImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            report = import_employees(read_rows(upload, upload.name),
+                                      request.user.organization_id,
+                                      update_existing=form.cleaned_data['update_existing'])
+            LOGGER.info("%s imported employees : %s", request.user, report)
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta,
+                       title='Bulk import employees', form=form, report=report)
+        return TemplateResponse(request, 'admin/survey/employee/bulk_import.html', context)
 
     def get_queryset(self, request):
         """
@@ -145,7 +195,7 @@ class EmployeeDetails(ImportExportModelAdmin, admin.ModelAdmin):
         if request.user.is_superuser:
             return queryset
         elif request.user.is_authenticated:
-            return queryset.filter(organization_id=request.user.organization, organization__is_archived=False)
+            return scope_to_organization(queryset, request.user.organization_id)
         return queryset
 
     def save_model(self, request, obj, form, change):
@@ -192,12 +242,49 @@ class QuestionDetails(admin.ModelAdmin):
             if request.user.is_superuser:
                 return queryset
             elif request.user.is_authenticated:
-                return queryset.filter(organization=request.user.organization, organization__is_archived=False)
+                return scope_to_organization(queryset, request.user.organization_id)
             return queryset
         except Exception as e:
             LOGGER.error("Error :", e)
 
 
+class SurveySectionInline(admin.TabularInline):
+    """
+    Sections of a survey, each shown on its own page
+    """
+    model = SurveySection
+    fields = ('title', 'position')
+    extra = 0
+
+
+class SurveyQuestionInline(admin.TabularInline):
+    """
+    Position and section of the questions of a survey,
+    questions are added and removed through the survey form
+    """
+    model = SurveyQuestion
+    fields = ('question', 'section', 'position')
+    readonly_fields = ('question',)
+    ordering = ('position', 'id')
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super(SurveyQuestionInline, self).get_queryset(request).select_related('question')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        """
+        Offering only the sections of the edited survey
+        """
+        formset = super(SurveyQuestionInline, self).get_formset(request, obj, **kwargs)
+        formset.form.base_fields['section'].queryset = \
+            obj.sections.all() if obj is not None else SurveySection.objects.none()
+        return formset
+
+
 class SurveyDetails(ImportExportModelAdmin, admin.ModelAdmin):
     """
     Customizing Survey Model
@@ -210,90 +297,138 @@ class SurveyDetails(ImportExportModelAdmin, admin.ModelAdmin):
                     'organization')
     list_filter = ('startDatetime', 'endDatetime')
 
+    form = SurveyForm
+    inlines = (SurveySectionInline, SurveyQuestionInline)
     fieldsets = (
         ('Survey', {'fields': ('survey_name',
-                               'description', 'question',
-                               'employee', 'startDatetime',
-                               'endDatetime', 'flag')}),
+                               'description', 'questions',
+                               'assignees', 'startDatetime',
+                               'endDatetime')}),
     )
 
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('Survey', {'fields': ('survey_name',
-                               'description', 'question',
-                               'employee', 'startDatetime',
-                               'endDatetime', 'flag')}),
+                               'description', 'questions',
+                               'assignees', 'startDatetime',
+                               'endDatetime')}),
     )
     ordering = ('survey_name',)
 
+    list_select_related = ('organization',)
+    assignee_preview_size = 3
+    assignees_per_page = 100
+
     def get_employee(self, obj):
         """
-        Getting Employee list assigned to respective survey
+        Getting assignee count and preview of respective survey
+        with a link to the paginated assignee list
         """
-        return ", ".join([p.emp_username for p in obj.employee.all()])
+        preview = [getattr(obj, 'assignee_%s' % index)
+                   for index in range(self.assignee_preview_size)]
+        preview = ", ".join(username for username in preview if username)
+        if obj.assignee_count > self.assignee_preview_size:
+            preview += ", ..."
+        url = reverse('admin:survey_survey_assignees', args=[obj.id])
+        return format_html('<a href="{}">{} employees</a> {}', url, obj.assignee_count, preview)
     get_employee.short_description = 'employees'
+    get_employee.admin_order_field = 'assignee_count'
+
+    def get_urls(self):
+        """
+        Adding paginated assignee list url to the survey admin
+        """
+        urls = [path('<int:survey_id>/assignees/',
+                     self.admin_site.admin_view(self.assignees_view),
+                     name='survey_survey_assignees')]
+        return urls + super(SurveyDetails, self).get_urls()
+
+    def assignees_view(self, request, survey_id):
+        """
+        Paginated list of employees assigned to a survey
+        """
+        survey = self.get_object(request, survey_id)
+        if survey is None or not self.has_view_permission(request, survey):
+            raise PermissionDenied
+        assignees = survey.employee.order_by('emp_username').values_list(
+            'emp_name', 'emp_username', 'emp_designation')
+        page = Paginator(assignees, self.assignees_per_page).get_page(request.GET.get('page'))
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta,
+                       title='Employees assigned to %s' % survey, survey=survey, page=page)
+        return TemplateResponse(request, 'admin/survey/survey/assignees.html', context)
 
     resource_class = SurveyResource
 
-    def formfield_for_manytomany(self, db_field, request, **kwargs):
+    def get_form(self, request, obj=None, **kwargs):
         """
-        Getting questions and employees
-        in many to many field based on
-        current logged-in organization admin
+        Offering questions and employees of the
+        logged-in organization admin
         """
-        if db_field.name == "question":
-            kwargs["queryset"] = Question.objects.filter(organization=request.user.organization,
-                                                         organization__is_archived=False)
-        if db_field.name == "employee":
-            kwargs["queryset"] = Employee.objects.filter(organization=request.user.organization,
-                                                         organization__is_archived=False)
-        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+        form = super(SurveyDetails, self).get_form(request, obj, **kwargs)
+        if 'questions' in form.base_fields:
+            form.base_fields['questions'].queryset = scope_to_organization(
+                Question.objects.all(), request.user.organization_id)
+        if 'assignees' in form.base_fields:
+            form.base_fields['assignees'].queryset = scope_to_organization(
+                Employee.objects.all(), request.user.organization_id)
+        return form
 
     def status_list(self, obj):
         """
-        Modifying status of survey based on flag
+        Status of survey based on
+        completed assignments
         """
-        if obj.flag is True:
+        if not obj.assignee_count:
+            return "Not assigned"
+        elif obj.completed_count == obj.assignee_count:
             return 'Completed'
-        elif obj.flag is False:
-            return 'Pending'
-        elif obj.flag is None:
-            return "Not started"
+        return '%s of %s completed' % (obj.completed_count, obj.assignee_count)
     status_list.short_description = 'Status'
+    status_list.admin_order_field = 'completed_count'
 
     def save_model(self, request, obj, form, change):
         """
-        saving organization, flag None and
-        sending mail when employee and questions
-        assigned to survey
+        saving organization of
+        logged-in organization admin
         """
         obj.organization = request.user.organization
-        obj.flag = None
-        employee = form.cleaned_data.get('employee')
-        for emp in employee:
-            try:
-                email_body = "Hi, \n Your have assigned following survey \n" + \
-                             request.build_absolute_uri('/')[:-1].strip("/") \
-                             + "/employee/"
-                email = EmailMessage(
-                    'Survey Feedback ', email_body, to=[emp.emp_username]
-                )
-                LOGGER.info(emp.emp_name)
-
-                email.send()
-                LOGGER.info("Email has been sent to : %s", emp.emp_username)
-            except SMTPAuthenticationError:
-                LOGGER.exception("Email error : ")
         obj.save()
 
+    def save_related(self, request, form, formsets, change):
+        """
+        saving questions and assignments and queuing mail
+        for newly assigned employees
+        """
+        super(SurveyDetails, self).save_related(request, form, formsets, change)
+        set_questions(form.instance, [question.id for question in form.cleaned_data['questions']])
+        employee = form.cleaned_data.get('assignees') or []
+        added = assign_employees(form.instance, [emp.id for emp in employee])
+        if added:
+            email_body = "Hi, \n Your have assigned following survey \n" + \
+                         request.build_absolute_uri('/')[:-1].strip("/") \
+                         + "/employee/"
+            recipients = [emp.emp_username for emp in employee if emp.id in added]
+            enqueue_mail('Survey Feedback ', email_body, recipients)
+            LOGGER.info("Email has been queued for %s employees", len(recipients))
+
     def get_queryset(self, request):
         """
         Displaying survey for logged-in organization admin
-        """
-        queryset = super(SurveyDetails, self).get_queryset(request)
+        with assignee and completed counts and preview usernames annotated
+        """
+        assignees = SurveyAssignment.objects.filter(
+            survey_id=OuterRef('pk')).order_by('employee__emp_username')
+        previews = {
+            'assignee_%s' % index: Subquery(assignees.values('employee__emp_username')[index:index + 1])
+            for index in range(self.assignee_preview_size)}
+        queryset = super(SurveyDetails, self).get_queryset(request).annotate(
+            assignee_count=Count('assignments'),
+            completed_count=Count('assignments', filter=Q(
+                assignments__status=SurveyAssignment.COMPLETED)),
+            **previews)
         if request.user.is_superuser:
             return queryset
         elif request.user.is_authenticated:
-            return queryset.filter(organization=request.user.organization,  organization__is_archived=False)
+            return scope_to_organization(queryset, request.user.organization_id)
         return queryset
 
 
@@ -306,6 +441,41 @@ class AnswerDetails(admin.ModelAdmin):
                     'flag', 'created_date', 'updated_date')
     list_filter = ('employee', 'survey', 'created_date', 'updated_date')
 
+    def get_urls(self):
+        """
+        Adding streaming export url to the answer admin
+        """
+        urls = [path('export/', self.admin_site.admin_view(self.export_view),
+                     name='survey_surveyfeedback_export')]
+        return urls + super(AnswerDetails, self).get_urls()
+
+    def export_view(self, request):
+        """
+        Streaming answers of logged-in organization admin as csv or
+        json lines, optionally gzipped and limited to one survey
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        organization_id = None
+        if not request.user.is_superuser:
+            organization_id = request.user.organization_id
+            if organization_id is None:
+                raise PermissionDenied
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            export_format = 'csv'
+        compress = request.GET.get('gzip') == '1'
+        survey_id = request.GET.get('survey')
+        filename = 'answers.%s%s' % (export_format, '.gz' if compress else '')
+        response = StreamingHttpResponse(
+            iter_export(export_format, compress, organization_id=organization_id,
+                        survey_id=int(survey_id) if survey_id and survey_id.isdigit() else None),
+            content_type='application/gzip' if compress else
+            'text/csv' if export_format == 'csv' else 'application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+        LOGGER.info("%s exporting answers as %s", request.user, filename)
+        return response
+
     def has_add_permission(self, request, obj=None):
         """
         disabling add operation from django-admin
@@ -340,16 +510,143 @@ class AnswerDetails(admin.ModelAdmin):
         if request.user.is_superuser:
             return query_set
         elif request.user.is_authenticated:
-            return query_set.filter(organization=request.user.organization,  organization__is_archived=False)
+            return scope_to_organization(query_set, request.user.organization_id)
         return query_set
 
 
+class OutboundEmailDetails(admin.ModelAdmin):
+    """
+    Customizing Outbound Email queue Model
+    """
+
+    list_display = ('id', 'recipient', 'subject', 'status', 'attempts',
+                    'next_attempt', 'sent_date', 'last_error')
+    list_filter = ('status',)
+
+    def has_module_permission(self, request):
+        """
+        Queued emails are not tied to an organization,
+        only superusers see the queue
+        """
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        """
+        limiting the queue to superusers
+        """
+        return request.user.is_superuser
+
+    def get_queryset(self, request):
+        """
+        Displaying queued emails to superusers only
+        """
+        queryset = super(OutboundEmailDetails, self).get_queryset(request)
+        return queryset if request.user.is_superuser else queryset.none()
+
+    def has_add_permission(self, request, obj=None):
+        """
+        disabling add operation from django-admin
+        """
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """
+        disabling update operation from django-admin
+        """
+        return False
+
+
+class QuestionResultInline(admin.TabularInline):
+    """
+    Read-only question results of a survey summary
+    """
+    model = QuestionResultSummary
+    fields = ('question', 'answer_count', 'choice_counts', 'integer_count',
+              'integer_min', 'integer_max', 'integer_mean', 'histogram')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        """
+        Loading questions, choice counts and histogram buckets upfront
+        """
+        queryset = super(QuestionResultInline, self).get_queryset(request)
+        return queryset.select_related('question').prefetch_related(
+            'choiceresultcount_set__choice', 'integerresultcount_set')
+
+    def has_add_permission(self, request, obj=None):
+        """
+        disabling add operation from django-admin
+        """
+        return False
+
+    @staticmethod
+    def choice_counts(obj):
+        """
+        Number of answers per choice
+        """
+        return ", ".join("%s: %s" % (count.choice.label, count.total)
+                         for count in obj.choiceresultcount_set.all())
+
+    @staticmethod
+    def histogram(obj):
+        """
+        Number of answers per integer value
+        """
+        return ", ".join("%s: %s" % (count.value, count.total)
+                         for count in obj.integerresultcount_set.all())
+
+
+class ResultSummaryDetails(admin.ModelAdmin):
+    """
+    Read-only survey results page
+    """
+
+    list_display = ('survey', 'respondent_count', 'completed_count', 'updated_date')
+    fields = ('survey', 'respondent_count', 'completed_count', 'updated_date')
+    readonly_fields = fields
+    inlines = [QuestionResultInline]
+
+    def has_add_permission(self, request, obj=None):
+        """
+        disabling add operation from django-admin
+        """
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """
+        disabling update operation from django-admin
+        """
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        """
+        disabling delete operation from django-admin
+        """
+        return False
+
+    def get_queryset(self, request):
+        """
+        Displaying survey results for logged-in organization admin
+        """
+        queryset = super(ResultSummaryDetails, self).get_queryset(request).select_related('survey')
+        if request.user.is_superuser:
+            return queryset
+        elif request.user.is_authenticated:
+            return scope_to_organization(queryset, request.user.organization_id,
+                                         field='survey__organization_id')
+        return queryset
+
+
 admin.site.register(Employee, EmployeeDetails)
 admin.site.register(Organization, OrganizationDetails)
 admin.site.register(Question, QuestionDetails)
 admin.site.register(Survey, SurveyDetails)
 admin.site.register(SurveyFeedback, AnswerDetails)
 admin.site.register(User, MyUserAdmin)
+admin.site.register(OutboundEmail, OutboundEmailDetails)
+admin.site.register(SurveyResultSummary, ResultSummaryDetails)
 admin.site.site_header = 'Survey Administration'
 admin.site.site_title = "Survey Admin Portal"
 admin.site.index_title = "Welcome to Survey Admin Portal"
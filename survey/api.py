@@ -0,0 +1,151 @@
+"""
+This is JSON API file serving the employee dashboard, survey
+definitions and answer submission through the same query
+layer as the survey views
+"""
+import logging
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import serializers
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from .definitions import get_definition, get_etag
+from .models import Survey
+from .queries import get_employee_dashboard, get_response_index, get_revision, \
+    save_answers
+from .serializers import AnswerBatchSerializer, DefinitionSerializer, EmployeeSerializer, \
+    SurveySerializer
+
+LOGGER = logging.getLogger(__name__)
+
+
+class IsEmployee(BasePermission):
+    """
+    Allowing logged-in users whose session carries an employee
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated
+                    and getattr(request, 'employee', None) is not None)
+
+
+def save_batch(request, survey, allow_finish=False):
+    """
+    Saving a posted answer batch, answers rejected by the
+    answer rules of the survey become a 400 response
+    :param request:
+    :param survey:
+    :param allow_finish: whether the batch may finish the survey
+    """
+    emp = request.employee
+    batch = AnswerBatchSerializer(data=request.data)
+    batch.is_valid(raise_exception=True)
+    finish = allow_finish and batch.validated_data['finish']
+    try:
+        return save_answers(survey, emp, emp.organization_id, batch.validated_data['answers'],
+                            finish, replace=True)
+    except ValidationError as error:
+        raise serializers.ValidationError({'answers': error.message_dict})
+
+
+def get_assigned_survey(survey_id, emp):
+    """
+    Survey assigned to the employee, 404 otherwise
+    :param survey_id:
+    :param emp:
+    """
+    try:
+        return Survey.objects.get(id=survey_id, employee=emp.id,
+                                  organization=emp.organization_id)
+    except Survey.DoesNotExist:
+        raise Http404
+
+
+@api_view(['GET'])
+@permission_classes([IsEmployee])
+def employee_dashboard(request):
+    """
+    Surveys of the logged-in employee split like the dashboard page,
+    the status lists carry ids of current surveys
+    :param request:
+    """
+    emp = request.employee
+    dashboard = get_employee_dashboard(emp)
+    return Response({
+        'employee': EmployeeSerializer(emp).data,
+        'current': SurveySerializer(dashboard['current_surveys'], many=True).data,
+        'upcoming': SurveySerializer(dashboard['upcoming_surveys'], many=True).data,
+        'expired': SurveySerializer(dashboard['expired_surveys'], many=True).data,
+        'assigned': [survey.id for survey in dashboard['assigned_survey']],
+        'incomplete': [survey.id for survey in dashboard['incomplete_survey']],
+        'completed': [survey.id for survey in dashboard['completed_survey']],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsEmployee])
+def survey_definition(request, survey_id):
+    """
+    Survey with its questions. The ETag and Last-Modified come from the
+    definition version, unchanged definitions are answered with 304
+    from the cached definition without serializing it
+    :param request:
+    :param survey_id:
+    """
+    organization_id = request.employee.organization_id
+    definition = get_definition(survey_id, organization_id)
+    if definition is None:
+        raise Http404
+    etag = quote_etag(get_etag(survey_id, organization_id, definition['version']))
+    last_modified = int(definition['modified'].timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(DefinitionSerializer(definition).data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsEmployee])
+def survey_answers(request, survey_id):
+    """
+    Answers of the logged-in employee for an assigned survey. Posting
+    saves a batch of answers, new questions are inserted and answered
+    ones replaced in one transaction
+    :param request:
+    :param survey_id:
+    """
+    emp = request.employee
+    survey = get_assigned_survey(survey_id, emp)
+    saved = 0
+    if request.method == 'POST':
+        saved = save_batch(request, survey, allow_finish=True)
+        LOGGER.info("%s answers saved for survey %s through the API", saved, survey_id)
+    index = get_response_index(survey.id, emp.id)
+    return Response({'survey': survey.id, 'saved': saved,
+                     'revision': get_revision(survey.id, emp.id),
+                     'answers': {question_id: {'response': answer.response,
+                                               'integer_response': answer.integer_response,
+                                               'finished': answer.flag}
+                                 for question_id, (answer, *_) in index.items()}})
+
+
+@api_view(['POST'])
+@permission_classes([IsEmployee])
+def autosave(request, survey_id):
+    """
+    Saving only the answers changed on the question page since its
+    last autosave, returning the revision of the employee's answers
+    :param request:
+    :param survey_id:
+    """
+    emp = request.employee
+    survey = get_assigned_survey(survey_id, emp)
+    saved = save_batch(request, survey)
+    return Response({'saved': saved, 'revision': get_revision(survey.id, emp.id)})
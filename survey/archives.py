@@ -0,0 +1,409 @@
+"""
+This is archive file writes the rows of every model into its own
+tar member in chunks, so a backup never holds a whole table in memory,
+and reads those members back for restore
+"""
+import datetime
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management import call_command
+from django.core.serializers import json as json_serializer
+from django.db import connections, models
+from django.db.models import Max, Min
+from .models import SurveyFeedback
+
+ARCHIVE_COMPRESSIONS = ('bz2', 'gz', 'xz')
+ARCHIVE_EXCLUDE = (
+    'auth.Permission',
+    'contenttypes.ContentType',
+    'sessions.Session',
+)
+MANIFEST_NAME = 'meta.json'
+LEGACY_DATA_NAME = 'data.json'
+ARCHIVE_SPLIT = ('survey.surveyfeedback',)
+
+# Rows of a model to dump into one member, primary keys in (first, last]
+DumpTask = namedtuple('DumpTask', 'label member first last')
+
+
+class ChunkedSerializer(json_serializer.Serializer):
+    """
+    JSON serializer reading many to many values from the prefetch cache
+    instead of querying once per row
+    """
+
+    def handle_m2m_field(self, obj, field):
+        if field.remote_field.through._meta.auto_created:
+            self._current[field.name] = [
+                self._value_from_field(related, related._meta.pk)
+                for related in getattr(obj, field.name).all()
+            ]
+
+
+class ModelDump:
+    """
+    Serialized rows of one model spooled to a temporary file, or to a
+    named file when dumped by a worker process
+    """
+
+    def __init__(self, label, member, fileobj, rows, size, seconds, path=None):
+        self.label = label
+        self.member = member
+        self.fileobj = fileobj
+        self.rows = rows
+        self.size = size
+        self.seconds = seconds
+        self.path = path
+
+    def open(self):
+        return self.fileobj if self.path is None else open(self.path, 'rb')
+
+    def as_manifest(self):
+        return {'model': self.label, 'member': self.member, 'rows': self.rows,
+                'bytes': self.size, 'seconds': round(self.seconds, 3)}
+
+    def __str__(self):
+        return '{}: {} rows, {} bytes in {:.2f}s'.format(
+            self.member, self.rows, self.size, self.seconds)
+
+
+def get_archive_models(exclude=ARCHIVE_EXCLUDE):
+    """
+    Models to archive, ordered so that foreign keys load before their rows
+    :param exclude: app_label.ModelName labels left out of the archive
+    """
+    excluded = {label.lower() for label in exclude}
+    app_list = [(config, None) for config in apps.get_app_configs()
+                if config.models_module is not None]
+    return [model for model in serializers.sort_dependencies(app_list)
+            if model._meta.label_lower not in excluded and
+            model._meta.app_config.label.lower() not in excluded and
+            not model._meta.proxy and model._meta.managed]
+
+
+def get_file_models():
+    """
+    Models having file fields with the names of those fields
+    """
+    return [(model, [field.name for field in model._meta.fields
+                     if isinstance(field, models.FileField)])
+            for model in apps.get_models()
+            if any(isinstance(field, models.FileField) for field in model._meta.fields)]
+
+
+def iter_rows(queryset, chunk_size=2000):
+    """
+    Iterating the rows of a queryset in primary key order, one chunk per
+    query with many to many values prefetched
+    :param queryset:
+    :param chunk_size:
+    """
+    m2m = [field.name for field in queryset.model._meta.many_to_many]
+    queryset = queryset.order_by('pk').prefetch_related(*m2m)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].pk
+
+
+def dump_model(model, queryset=None, chunk_size=2000, member=None, directory=None):
+    """
+    Serializing the rows of a model into a temporary file
+    :param model:
+    :param queryset: rows to dump, every row of the model when omitted
+    :param chunk_size:
+    :param member: tar member name, data/<app_label.model>.json when omitted
+    :param directory: write a named file there instead, for worker processes
+    """
+    started = time.time()
+    if queryset is None:
+        queryset = model._default_manager.all()
+    rows = 0
+
+    def counted(objects):
+        nonlocal rows
+        for obj in objects:
+            rows += 1
+            yield obj
+
+    if directory is None:
+        fileobj = tempfile.TemporaryFile()
+    else:
+        fileobj = tempfile.NamedTemporaryFile(dir=directory, suffix='.json', delete=False)
+    stream = io.TextIOWrapper(fileobj, encoding='utf-8')
+    ChunkedSerializer().serialize(counted(iter_rows(queryset, chunk_size)), stream=stream)
+    stream.flush()
+    stream.detach()
+    size = fileobj.tell()
+    label = model._meta.label_lower
+    member = member or 'data/%s.json' % label
+    seconds = time.time() - started
+    if directory is not None:
+        fileobj.close()
+        return ModelDump(label, member, None, rows, size, seconds, path=fileobj.name)
+    fileobj.seek(0)
+    return ModelDump(label, member, fileobj, rows, size, seconds)
+
+
+def bounded_queryset(model, first=None, last=None):
+    """
+    Rows of a model with primary keys in (first, last]
+    :param model:
+    :param first:
+    :param last:
+    """
+    queryset = model._default_manager.all()
+    if first is not None:
+        queryset = queryset.filter(pk__gt=first)
+    if last is not None:
+        queryset = queryset.filter(pk__lte=last)
+    return queryset
+
+
+def split_range(model, first=None, last=None, parts=1):
+    """
+    Splitting the primary keys of a model into parts tasks of even width
+    :param model:
+    :param first: dump primary keys above first
+    :param last: dump primary keys up to last
+    :param parts:
+    """
+    label = model._meta.label_lower
+    queryset = bounded_queryset(model, first, last)
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if parts <= 1 or bounds['low'] is None:
+        return [DumpTask(label, 'data/%s.json' % label, first, last)]
+    low, width = bounds['low'] - 1, bounds['high'] - bounds['low'] + 1
+    edges = sorted({low + width * index // parts for index in range(parts + 1)})
+    return [DumpTask(label, 'data/%s.%04d.json' % (label, index), start, end)
+            for index, (start, end) in enumerate(zip(edges, edges[1:]))]
+
+
+def plan_tasks(archive_models, bounds=None, split=ARCHIVE_SPLIT, parts=1):
+    """
+    Dump tasks of the archive, large models split into primary key ranges
+    :param archive_models:
+    :param bounds: (first, last) primary keys to dump by model label
+    :param split: labels of models split into ranges
+    :param parts: ranges per split model
+    """
+    tasks = []
+    for model in archive_models:
+        label = model._meta.label_lower
+        first, last = (bounds or {}).get(label, (None, None))
+        if label in split:
+            tasks += split_range(model, first, last, parts)
+        else:
+            tasks.append(DumpTask(label, 'data/%s.json' % label, first, last))
+    return tasks
+
+
+def dump_task(task, chunk_size=2000, directory=None):
+    """
+    Dumping the rows of one task
+    :param task:
+    :param chunk_size:
+    :param directory:
+    """
+    model = apps.get_model(task.label)
+    return dump_model(model, bounded_queryset(model, task.first, task.last),
+                      chunk_size, task.member, directory)
+
+
+def run_tasks(tasks, chunk_size=2000, workers=1):
+    """
+    Iterating the dumps of tasks in order. With several workers the tasks
+    run in forked processes, each with its own database connection
+    :param tasks:
+    :param chunk_size:
+    :param workers:
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield dump_task(task, chunk_size)
+        return
+    directory = tempfile.mkdtemp()
+    # Forked workers must not share the connection of this process
+    connections.close_all()
+    try:
+        with ProcessPoolExecutor(workers, mp_context=get_context('fork')) as pool:
+            futures = [pool.submit(dump_task, task, chunk_size, directory) for task in tasks]
+            for future in futures:
+                yield future.result()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def add_member(tar, name, fileobj, size):
+    """
+    Adding a file object to the archive under name
+    :param tar:
+    :param name:
+    :param fileobj:
+    :param size:
+    """
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = time.time()
+    tar.addfile(info, fileobj)
+
+
+def open_archive(filename, compression='bz2', level=None):
+    """
+    Opening a tar archive for writing with the chosen compressor
+    :param filename:
+    :param compression: bz2, gz or xz
+    :param level: compression level, 1 fastest and 9 smallest
+    """
+    kwargs = {}
+    if level is not None:
+        kwargs['preset' if compression == 'xz' else 'compresslevel'] = level
+    return tarfile.open(filename, 'w:%s' % compression, **kwargs)
+
+
+def read_manifest(filename):
+    """
+    Reading a manifest written next to an archive, None when missing
+    :param filename:
+    """
+    if not filename or not os.path.exists(filename):
+        return None
+    with open(filename) as manifest:
+        return json.load(manifest)
+
+
+def write_manifest(filename, manifest):
+    """
+    Writing the manifest of the last archive
+    :param filename:
+    :param manifest:
+    """
+    with open(filename, 'w') as output:
+        json.dump(manifest, output, indent=2)
+
+
+def incremental_first(manifest):
+    """
+    Last answer already archived according to manifest
+    :param manifest:
+    """
+    return manifest.get('last_feedback_id') if manifest else None
+
+
+def incremental_since(manifest):
+    """
+    Day the archive of manifest was taken, answers updated on or after
+    it are archived again. Answers only carry the day of their last
+    update, so answers updated on that day may be archived twice
+    :param manifest:
+    """
+    if not manifest or not manifest.get('created'):
+        return None
+    return datetime.datetime.strptime(manifest['created'][:10], '%Y-%m-%d').date()
+
+
+def updated_feedback(manifest):
+    """
+    Answers archived before manifest and updated since, None for a first archive
+    :param manifest:
+    """
+    first, since = incremental_first(manifest), incremental_since(manifest)
+    if first is None or since is None:
+        return None
+    return SurveyFeedback.objects.filter(pk__lte=first, updated_date__gte=since)
+
+
+def get_last_feedback_id():
+    """
+    Highest answer id, archives only dump answers up to it
+    """
+    return SurveyFeedback.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def archive_manifest(filename):
+    """
+    Manifest stored in an archive, empty for archives without one
+    :param filename:
+    """
+    with tarfile.open(filename, 'r:*') as tar:
+        if MANIFEST_NAME not in tar.getnames():
+            return {}
+        return json.load(io.TextIOWrapper(tar.extractfile(MANIFEST_NAME), 'utf-8'))
+
+
+def check_archive_chain(filenames):
+    """
+    Making sure incremental archives are restored on top of the archive
+    they were taken after, their answers refer to rows of that chain
+    :param filenames: a full archive followed by its incremental archives
+    """
+    previous = None
+    for filename in filenames:
+        manifest = archive_manifest(filename)
+        if manifest.get('mode') == 'incremental':
+            if previous is None:
+                raise ValueError('%s is incremental, restore %s before it.'
+                                 % (filename, manifest.get('base') or 'its full archive'))
+            if manifest.get('base') != os.path.basename(previous):
+                raise ValueError('%s follows %s, not %s.'
+                                 % (filename, manifest.get('base'), previous))
+        previous = filename
+
+
+def extract_archive(filename, directory, prefix=''):
+    """
+    Extracting the data members of an archive as fixture files, in the
+    order the manifest lists them
+    :param filename:
+    :param directory:
+    :param prefix: file name prefix keeping fixtures of several archives apart
+    """
+    fixtures = []
+    with tarfile.open(filename, 'r:*') as tar:
+        names = tar.getnames()
+        members = [LEGACY_DATA_NAME] if LEGACY_DATA_NAME in names else []
+        if MANIFEST_NAME in names:
+            manifest = json.load(io.TextIOWrapper(tar.extractfile(MANIFEST_NAME), 'utf-8'))
+            members += [entry['member'] for entry in manifest.get('models', ()) if entry['rows']]
+        for index, name in enumerate(members):
+            path = os.path.join(directory, '%s%04d.json' % (prefix, index))
+            with open(path, 'wb') as fixture:
+                shutil.copyfileobj(tar.extractfile(name), fixture)
+            fixtures.append(path)
+    return fixtures
+
+
+def restore_archives(filenames, stdout=None):
+    """
+    Loading one or more archives, a full archive first and then its
+    incremental archives, in a single transaction. Incremental archives
+    without the archives before them are refused
+    :param filenames:
+    :param stdout:
+    """
+    check_archive_chain(filenames)
+    directory = tempfile.mkdtemp()
+    try:
+        fixtures = []
+        for index, filename in enumerate(filenames):
+            fixtures += extract_archive(filename, directory, prefix='%02d-' % index)
+        if fixtures:
+            call_command('loaddata', *fixtures, stdout=stdout)
+        return fixtures
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
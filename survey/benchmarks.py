@@ -0,0 +1,388 @@
+"""
+This is benchmark file seeds organizations, employees, questions and
+surveys of a realistic shape and drives the employee flow through the
+test client, reporting latency percentiles, queries per request and
+throughput. It also compares rendering a long question list with and
+without cached input fragments, and checks the feedback indexes serve
+their access paths on about a million answers
+"""
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import time
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from mixer.backend.django import Mixer
+from .queries import add_questions
+from .models import Employee, Organization, Question, Survey, SurveyAssignment, \
+    SurveyFeedback, User
+
+FLOW_STEPS = ('login', 'employee', 'que_list', 'save')
+PERCENTILES = (50, 90, 95, 99)
+# Committed baselines of the default configuration, one report per database vendor
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+EMPLOYEE_PASSWORD = 'Bench@1234'
+# Share of each question type in seeded organizations
+QUESTION_MIX = ((Question.TEXT, 4), (Question.RADIO, 3), (Question.SELECT, 1),
+                (Question.SELECT_MULTIPLE, 1), (Question.INTEGER, 1))
+# Shape of the feedback index dataset, every employee answers every
+# question of FEEDBACK_SURVEYS_PER_EMPLOYEE surveys
+FEEDBACK_QUESTIONS = 50
+FEEDBACK_SURVEYS = 2000
+FEEDBACK_SURVEYS_PER_EMPLOYEE = 10
+FEEDBACK_FLAG_INDEX = 'feedback_survey_emp_flag_idx'
+SURVEY_DATE_INDEX = 'survey_start_end_idx'
+
+
+def seed(organizations=2, employees=50, questions=30, surveys=6,
+         questions_per_survey=10, seed_value=0):
+    """
+    Seeding organizations with employees, questions and surveys. Each
+    survey gets a sample of the organization's questions and is assigned
+    to about half of its employees, one third of the surveys are current
+    :param organizations:
+    :param employees: employees per organization
+    :param questions: questions per organization
+    :param surveys: surveys per organization
+    :param questions_per_survey:
+    :param seed_value: seed of the random and Faker generators
+    """
+    rand = random.Random(seed_value)
+    builder = Mixer(commit=False)
+    builder.faker.seed(seed_value)
+    faker = builder.faker
+    today = datetime.date.today()
+    types = [kind for kind, weight in QUESTION_MIX for _ in range(weight)]
+    for org_index in range(organizations):
+        org = Organization.objects.create(company_name=faker.company(), location=faker.city(),
+                                          description=faker.catch_phrase()[:200])
+        User.objects.create(username='bench-admin-%s-%s' % (seed_value, org_index),
+                            organization=org)
+        Employee.objects.bulk_create(builder.cycle(employees).blend(
+            Employee, organization=org, emp_name=faker.name,
+            emp_username=(('bench%s.%s.%s@%s' % (seed_value, org_index, index,
+                                                 faker.free_email_domain()))
+                          for index in range(employees)),
+            emp_password=EMPLOYEE_PASSWORD, emp_designation=faker.job,
+            emp_address=faker.city))
+        Question.objects.bulk_create(builder.cycle(questions).blend(
+            Question, organization=org, is_required=False,
+            question=lambda: faker.sentence().rstrip('.') + ' ?',
+            question_type=lambda: rand.choice(types),
+            choices=lambda: ', '.join(dict.fromkeys(faker.words(rand.randint(3, 6))))))
+        question_rows = list(Question.objects.filter(organization=org))
+        Question.sync_all_choices(question_rows)
+        Survey.objects.bulk_create([
+            Survey(survey_name=faker.bs()[:200], description=faker.catch_phrase()[:200],
+                   organization=org,
+                   startDatetime=today + datetime.timedelta(days=(-2, -5, 3)[index % 3]),
+                   endDatetime=today + datetime.timedelta(days=(5, -1, 10)[index % 3]))
+            for index in range(surveys)])
+        employee_ids = list(Employee.objects.filter(organization=org).values_list('id', flat=True))
+        for survey in Survey.objects.filter(organization=org):
+            sample = rand.sample(question_rows, min(questions_per_survey, len(question_rows)))
+            add_questions(survey, [question.id for question in sample])
+            SurveyAssignment.objects.bulk_create([
+                SurveyAssignment(survey=survey, employee_id=employee_id)
+                for employee_id in rand.sample(employee_ids, max(1, len(employee_ids) // 2))])
+
+
+def answer_for(question, rand):
+    """
+    Posted values answering a question
+    :param question:
+    :param rand:
+    """
+    labels = question.get_choice_labels()
+    if question.question_type == Question.INTEGER:
+        return [str(rand.randint(1, 10))]
+    if question.question_type == Question.SELECT_MULTIPLE and labels:
+        return rand.sample(labels, rand.randint(1, len(labels)))
+    if question.question_type in Question.CHOICE_TYPES and labels:
+        return [rand.choice(labels)]
+    return ['benchmark answer %s' % rand.randint(1, 1000)]
+
+
+def run_flows(iterations=20, seed_value=0, warmup=3):
+    """
+    Driving login, employee, question list and save for employees having
+    a current survey, returning the latency and query count of every step
+    :param iterations: number of measured employee flows
+    :param seed_value:
+    :param warmup: flows run first and left out of the samples
+    """
+    rand = random.Random(seed_value)
+    today = datetime.date.today()
+    assignments = list(SurveyAssignment.objects.filter(
+        survey__startDatetime__lte=today, survey__endDatetime__gte=today).values_list(
+            'employee_id', 'survey_id', 'survey__organization_id'))
+    if not assignments:
+        raise ValueError('No current survey is assigned, seed data first.')
+    users = {user.organization_id: user for user in User.objects.filter(
+        username__startswith='bench-admin-')}
+    samples = {step: [] for step in FLOW_STEPS}
+
+    def timed(step, request, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request(*args, **kwargs)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise AssertionError('%s returned %s' % (step, response.status_code))
+        samples[step].append((elapsed, len(queries)))
+        return response
+
+    started = time.perf_counter()
+    for iteration in range(warmup + iterations):
+        if iteration == warmup:
+            samples = {step: [] for step in FLOW_STEPS}
+            started = time.perf_counter()
+        employee_id, survey_id, organization_id = rand.choice(assignments)
+        emp = Employee.objects.get(id=employee_id)
+        client = Client()
+        client.force_login(users[organization_id])
+        timed('login', client.post, reverse('login'),
+              {'username': emp.emp_username, 'password': emp.emp_password})
+        timed('employee', client.get, reverse('employee'))
+        response = timed('que_list', client.get, reverse('que_list', args=[survey_id]))
+        post = {str(question.id): answer_for(question, rand)
+                for question in response.context['question_list']}
+        post['btn_response'] = rand.choice(('Save', 'Finish'))
+        timed('save', client.post, reverse('save', args=[survey_id]), post)
+    return samples, time.perf_counter() - started
+
+
+def time_question_list(questions=200, iterations=20, seed_value=0, warmup=2):
+    """
+    Rendering the question list of one survey holding all questions on
+    a single page, once with cached input fragments and once rendering
+    every input from the template, returning the samples of both modes
+    :param questions: questions of the survey
+    :param iterations: measured requests per mode
+    :param seed_value:
+    :param warmup: requests run first in every mode and left out of the samples
+    """
+    seed(organizations=1, employees=1, questions=questions, surveys=1,
+         questions_per_survey=questions, seed_value=seed_value)
+    survey = Survey.objects.get(organization__user__username='bench-admin-%s-0' % seed_value)
+    emp = survey.employee.get()
+    client = Client()
+    client.force_login(User.objects.get(organization_id=survey.organization_id))
+    client.post(reverse('login'), {'username': emp.emp_username, 'password': emp.emp_password})
+    samples = {'fragments': [], 'templates': []}
+    started = time.perf_counter()
+    for mode, rows in samples.items():
+        with override_settings(SURVEY_INPUT_FRAGMENTS=mode == 'fragments',
+                               SURVEY_PAGE_SIZE=questions):
+            for iteration in range(warmup + iterations):
+                with CaptureQueriesContext(connection) as queries:
+                    request_started = time.perf_counter()
+                    response = client.get(reverse('que_list', args=[survey.id]))
+                    elapsed = time.perf_counter() - request_started
+                if len(response.context['question_list']) != questions:
+                    raise AssertionError('question_list rendered a partial survey')
+                if iteration >= warmup:
+                    rows.append((elapsed, len(queries)))
+    return samples, time.perf_counter() - started
+
+
+def seed_feedback(rows=1000000, seed_value=0, batch_size=5000):
+    """
+    Seeding one organization with about rows answers. Survey dates are
+    spread over ten years so only a few surveys are current. Statistics
+    are refreshed afterwards, the planner keeps its default settings.
+    Returns one of the answers
+    :param rows: answers to seed
+    :param seed_value:
+    :param batch_size: answers built in memory at once
+    """
+    rand = random.Random(seed_value)
+    today = datetime.date.today()
+    org = Organization.objects.create(company_name='Feedback bench %s' % seed_value,
+                                      location='Pune', description='Feedback index benchmark')
+    Question.objects.bulk_create([
+        Question(question='question %s ?' % index, organization=org)
+        for index in range(FEEDBACK_QUESTIONS)])
+    start_days = [rand.randint(0, 3650) for _ in range(FEEDBACK_SURVEYS)]
+    Survey.objects.bulk_create([
+        Survey(survey_name='survey %s' % index, description='feedback bench', organization=org,
+               startDatetime=today - datetime.timedelta(days=days),
+               endDatetime=today - datetime.timedelta(days=days - rand.randint(7, 30)))
+        for index, days in enumerate(start_days)])
+    per_employee = FEEDBACK_QUESTIONS * FEEDBACK_SURVEYS_PER_EMPLOYEE
+    Employee.objects.bulk_create([
+        Employee(emp_name='employee %s' % index, organization=org,
+                 emp_username='feedback%s.%s@example.com' % (seed_value, index))
+        for index in range(max(1, rows // per_employee))])
+    question_ids = list(Question.objects.filter(organization=org).values_list('id', flat=True))
+    survey_ids = list(Survey.objects.filter(organization=org).values_list('id', flat=True))
+
+    def answers():
+        for employee_id in Employee.objects.filter(organization=org).values_list(
+                'id', flat=True).order_by('id'):
+            for survey_id in rand.sample(survey_ids, FEEDBACK_SURVEYS_PER_EMPLOYEE):
+                for question_id in question_ids:
+                    yield SurveyFeedback(survey_id=survey_id, employee_id=employee_id,
+                                         question_id=question_id, organization=org,
+                                         response='good', flag=rand.random() < 0.5)
+
+    remaining = answers()
+    while True:
+        batch = list(itertools.islice(remaining, batch_size))
+        if not batch:
+            break
+        SurveyFeedback.objects.bulk_create(batch)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return SurveyFeedback.objects.filter(organization=org).order_by('id').first()
+
+
+def unique_feedback_index():
+    """
+    Name of the unique survey, employee, question index of answers
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, SurveyFeedback._meta.db_table)
+    return next(name for name, details in constraints.items()
+                if details['unique'] and
+                details['columns'] == ['survey_id', 'employee_id', 'question_id'])
+
+
+def feedback_access_paths(answer):
+    """
+    Feedback queries of the employee flow with the indexes meant to serve them
+    :param answer: answer whose survey, employee and question are looked up
+    """
+    today = datetime.date.today()
+    unique_index = unique_feedback_index()
+    answers = SurveyFeedback.objects.filter(survey_id=answer.survey_id,
+                                            employee_id=answer.employee_id)
+    return (
+        ('survey_employee', answers, (unique_index, FEEDBACK_FLAG_INDEX)),
+        ('survey_employee_question', answers.filter(question_id=answer.question_id),
+         (unique_index,)),
+        ('survey_employee_flag', answers.filter(flag=True), (FEEDBACK_FLAG_INDEX,)),
+        ('current_surveys', Survey.objects.filter(startDatetime__lte=today,
+                                                  endDatetime__gte=today),
+         (SURVEY_DATE_INDEX,)),
+    )
+
+
+def explain_feedback(answer):
+    """
+    EXPLAIN of every feedback access path, returning the path, the
+    expected index found in its plan or None, and the plan
+    :param answer:
+    """
+    results = []
+    for path, queryset, names in feedback_access_paths(answer):
+        plan = queryset.explain()
+        results.append((path, next((name for name in names if name in plan), None), plan))
+    return results
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile of sorted values
+    :param values:
+    :param percent:
+    """
+    index = max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(samples, elapsed):
+    """
+    Report of latency percentiles, queries per request and throughput
+    :param samples: (seconds, queries) of every request by step
+    :param elapsed: wall time of all flows
+    """
+    steps = {}
+    for step, rows in samples.items():
+        if not rows:
+            continue
+        latencies = sorted(seconds * 1000 for seconds, _ in rows)
+        report = {'requests': len(rows),
+                  'mean_ms': round(sum(latencies) / len(latencies), 3),
+                  'max_ms': round(latencies[-1], 3),
+                  'queries': round(sum(queries for _, queries in rows) / len(rows), 2)}
+        for percent in PERCENTILES:
+            report['p%s_ms' % percent] = round(percentile(latencies, percent), 3)
+        steps[step] = report
+    requests = sum(step['requests'] for step in steps.values())
+    return {'vendor': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'requests': requests,
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(requests / elapsed, 2) if elapsed else None,
+            'steps': steps}
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    Metrics of report worse than baseline by more than threshold
+    :param report:
+    :param baseline: earlier report of the same database vendor
+    :param threshold: allowed relative increase
+    """
+    regressions = []
+    for step, current in report['steps'].items():
+        previous = baseline.get('steps', {}).get(step)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((step, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def load_baseline(path):
+    """
+    Reports of a baseline file keyed by database vendor
+    :param path:
+    """
+    try:
+        with open(path) as baseline:
+            return json.load(baseline)
+    except FileNotFoundError:
+        return {}
+
+
+def check_baseline(path):
+    """
+    Making sure a run can be stored in the baseline file before it is
+    spent, the file has to hold valid JSON and be writable
+    :param path:
+    """
+    try:
+        load_baseline(path)
+    except ValueError:
+        raise ValueError('%s is not a valid baseline file.' % path)
+    if os.path.exists(path):
+        writable = os.access(path, os.W_OK)
+    else:
+        writable = os.access(os.path.dirname(os.path.abspath(path)), os.W_OK)
+    if not writable:
+        raise ValueError('%s is not writable.' % path)
+
+
+def save_baseline(path, report):
+    """
+    Storing report as the baseline of its database vendor
+    :param path:
+    :param report:
+    """
+    baselines = load_baseline(path)
+    baselines[report['vendor']] = report
+    with open(path, 'w') as baseline:
+        json.dump(baselines, baseline, indent=2, sort_keys=True)
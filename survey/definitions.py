@@ -0,0 +1,171 @@
+"""
+This is survey definition cache file, the questions of a survey
+are cached per organization under the definition version of the
+organization, signals move the version when a definition changes
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.template import loader
+from django.utils import timezone
+from .models import Organization, Survey, SurveyQuestion
+from .validation import build_rules
+
+DEFINITION_TIMEOUT = 60 * 60
+INPUT_TEMPLATE = 'survey/question_input.html'
+
+
+def get_version_state(organization_id):
+    """
+    Current definition version of an organization and the time its
+    definitions last changed. Both live on the organization row, so
+    every process agrees on them
+    :param organization_id:
+    """
+    state = Organization.objects.filter(id=organization_id).values_list(
+        'definition_version', 'definitions_modified').first()
+    return state or (1, timezone.now())
+
+
+def get_version(organization_id):
+    """
+    Current definition version of an organization
+    :param organization_id:
+    """
+    return get_version_state(organization_id)[0]
+
+
+def get_modified(organization_id):
+    """
+    Time the definitions of an organization last changed
+    :param organization_id:
+    """
+    return get_version_state(organization_id)[1]
+
+
+def bump_version(organization_id):
+    """
+    Invalidating every cached survey definition of an organization
+    :param organization_id:
+    """
+    Organization.objects.filter(id=organization_id).update(
+        definition_version=F('definition_version') + 1, definitions_modified=timezone.now())
+
+
+def get_etag(survey_id, organization_id, version=None):
+    """
+    Entity tag of a survey definition, it changes with the definition version
+    :param survey_id:
+    :param organization_id:
+    :param version: definition version when already known
+    """
+    if version is None:
+        version = get_version(organization_id)
+    return '%s-%s-%s' % (organization_id, survey_id, version)
+
+
+def build_pages(questions, sections, page_size):
+    """
+    Splitting the ordered questions of a survey into pages. Questions
+    outside sections come first in pages of page_size, followed by one
+    page per section
+    :param questions: questions carrying their section_id
+    :param sections: sections in position order
+    :param page_size:
+    """
+    loose = [question for question in questions if question.section_id is None]
+    pages = [{'title': '', 'questions': loose[start:start + page_size]}
+             for start in range(0, len(loose), page_size)]
+    by_section = {}
+    for question in questions:
+        if question.section_id is not None:
+            by_section.setdefault(question.section_id, []).append(question)
+    pages.extend({'title': section.title, 'questions': by_section[section.id]}
+                 for section in sections if section.id in by_section)
+    return pages or [{'title': '', 'questions': []}]
+
+
+def build_definition(survey_id):
+    """
+    Loading a survey, its sections and its ordered questions with
+    parsed choices, split into pages, and the compiled answer rules
+    :param survey_id:
+    """
+    survey = Survey.objects.filter(id=survey_id).first()
+    if survey is None:
+        return None
+    questions = []
+    for row in SurveyQuestion.objects.filter(survey_id=survey_id).select_related(
+            'question').order_by('position', 'id'):
+        question = row.question
+        question.choice_list = question.get_choice_labels()
+        question.section_id = row.section_id
+        questions.append(question)
+    sections = list(survey.sections.all())
+    pages = build_pages(questions, sections, getattr(settings, 'SURVEY_PAGE_SIZE', 50))
+    return {'survey': survey, 'questions': questions, 'sections': sections, 'pages': pages,
+            'rules': build_rules(questions)}
+
+
+def get_definition(survey_id, organization_id):
+    """
+    Getting the cached definition of a survey of the organization,
+    built on a miss and carrying the version it was built for.
+    Surveys of other organizations are None
+    :param survey_id:
+    :param organization_id:
+    """
+    version, modified = get_version_state(organization_id)
+    key = 'survey-definition:%s:%s:%s' % (organization_id, survey_id, version)
+    definition = cache.get(key)
+    if definition is None:
+        definition = build_definition(survey_id)
+        if definition is None or definition['survey'].organization_id != organization_id:
+            return None
+        definition.update(version=version, modified=modified)
+        cache.set(key, definition, DEFINITION_TIMEOUT)
+    return definition
+
+
+def get_answer_rules(survey_id, organization_id):
+    """
+    Compiled answer rules of a survey keyed by question id,
+    cached with the survey definition
+    :param survey_id:
+    :param organization_id:
+    """
+    definition = get_definition(survey_id, organization_id)
+    return definition['rules'] if definition is not None else {}
+
+
+def input_key(question_id, version):
+    """
+    Cache key of the rendered blank input of a question
+    :param question_id:
+    :param version: definition version of the question's organization
+    """
+    return 'survey-question-input:%s:%s' % (question_id, version)
+
+
+def get_input_fragments(questions, organization_id, version=None):
+    """
+    Rendered blank inputs of questions keyed by question id. Cached
+    inputs are read with one round trip, missing ones are rendered and
+    stored together. None when SURVEY_INPUT_FRAGMENTS is off
+    :param questions: definition questions carrying their choice_list
+    :param organization_id:
+    :param version: definition version when already known
+    """
+    if not getattr(settings, 'SURVEY_INPUT_FRAGMENTS', True):
+        return None
+    if version is None:
+        version = get_version(organization_id)
+    keys = {input_key(question.id, version): question for question in questions}
+    fragments = cache.get_many(list(keys))
+    if len(fragments) < len(keys):
+        template = loader.get_template(INPUT_TEMPLATE)
+        missing = {key: template.render({'que': question, 'answers': []})
+                   for key, question in keys.items() if key not in fragments}
+        cache.set_many(missing, DEFINITION_TIMEOUT)
+        fragments.update(missing)
+    return {question.id: fragments[key] for key, question in keys.items()}
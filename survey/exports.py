@@ -0,0 +1,94 @@
+"""
+This is export file streams survey responses as CSV or
+JSON Lines in chunks so memory stays flat for any row count
+"""
+import csv
+import json
+import zlib
+from .models import SurveyFeedback
+from .queries import scope_to_organization
+
+EXPORT_FIELDS = ('id', 'survey_id', 'survey__survey_name', 'employee_id',
+                 'employee__emp_username', 'question_id', 'question__question',
+                 'response', 'integer_response', 'flag', 'created_date', 'updated_date')
+EXPORT_HEADER = ('id', 'survey_id', 'survey', 'employee_id', 'employee', 'question_id',
+                 'question', 'response', 'integer_response', 'flag', 'created_date',
+                 'updated_date')
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+class Echo:
+    """
+    File-like object handing written lines back to the csv writer caller
+    """
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def get_export_rows(organization_id=None, survey_id=None, chunk_size=2000):
+    """
+    Iterating response rows as tuples, fetched from the database in chunks
+    :param organization_id: scope rows to one organization when given
+    :param survey_id: scope rows to one survey when given
+    :param chunk_size:
+    """
+    queryset = SurveyFeedback.objects.order_by('id')
+    if organization_id is not None:
+        queryset = scope_to_organization(queryset, organization_id)
+    if survey_id is not None:
+        queryset = queryset.filter(survey_id=survey_id)
+    return queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(rows):
+    """
+    Encoding rows as CSV lines
+    :param rows:
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER).encode('utf-8')
+    for row in rows:
+        yield writer.writerow(row).encode('utf-8')
+
+
+def iter_jsonl(rows):
+    """
+    Encoding rows as JSON Lines
+    :param rows:
+    """
+    for row in rows:
+        yield (json.dumps(dict(zip(EXPORT_HEADER, row)), default=str) + '\n').encode('utf-8')
+
+
+def iter_gzip(chunks, buffer_size=64 * 1024):
+    """
+    Compressing encoded chunks into a gzip stream
+    :param chunks:
+    :param buffer_size: bytes collected before they are compressed
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            data = compressor.compress(b''.join(buffer))
+            buffer, size = [], 0
+            if data:
+                yield data
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
+
+
+def iter_export(export_format='csv', compress=False, **kwargs):
+    """
+    Streaming encoded export of survey responses
+    :param export_format: csv or jsonl
+    :param compress: gzip the stream
+    :param kwargs: scope and chunk size passed to get_export_rows
+    """
+    encoder = iter_jsonl if export_format == 'jsonl' else iter_csv
+    chunks = encoder(get_export_rows(**kwargs))
+    return iter_gzip(chunks) if compress else chunks
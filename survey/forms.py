@@ -0,0 +1,41 @@
+"""
+This is forms file used by the admin customization
+"""
+from django import forms
+from django.contrib.admin.widgets import FilteredSelectMultiple
+from .models import Employee, Question, Survey
+
+
+class EmployeeImportForm(forms.Form):
+    """
+    Upload form of the bulk employee import
+    """
+    file = forms.FileField(help_text='CSV or XLSX file with emp_name, emp_username, '
+                                     'emp_password, emp_designation and emp_address columns.')
+    update_existing = forms.BooleanField(required=False, initial=True)
+
+
+class SurveyForm(forms.ModelForm):
+    """
+    Survey admin form, employees are assigned through SurveyAssignment
+    and questions are placed through SurveyQuestion
+    """
+    questions = forms.ModelMultipleChoiceField(
+        queryset=Question.objects.none(), label='Questions',
+        widget=FilteredSelectMultiple('questions', False))
+    assignees = forms.ModelMultipleChoiceField(
+        queryset=Employee.objects.none(), required=False, label='Employees',
+        widget=FilteredSelectMultiple('employees', False))
+
+    class Meta:
+        model = Survey
+        fields = ('survey_name', 'description', 'startDatetime', 'endDatetime')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault('questions', list(
+                self.instance.survey_questions.order_by('position').values_list(
+                    'question_id', flat=True)))
+            self.initial.setdefault('assignees', list(
+                self.instance.assignments.values_list('employee_id', flat=True)))
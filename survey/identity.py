@@ -0,0 +1,103 @@
+"""
+This is employee identity file resolves the logged-in employee
+once per session and keeps it on the request, so employee views
+do not look the employee up by username on every request
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from .models import Employee
+
+SESSION_KEY = 'employee'
+IDENTITY_FIELDS = ('id', 'organization_id', 'emp_name', 'emp_username')
+
+
+def identity_ttl():
+    """
+    Seconds a stored identity is trusted before it is checked again
+    """
+    return getattr(settings, 'SURVEY_IDENTITY_TTL', 300)
+
+
+def changed_key(employee_id):
+    """
+    Cache key holding the time an employee was last changed or deleted
+    :param employee_id:
+    """
+    return 'employee-identity-changed:%s' % employee_id
+
+
+def forget_employee(employee_id):
+    """
+    Making sessions check the stored identity of a changed or deleted
+    employee on their next request. The marker reaches the cache of the
+    current process, the others catch up when the identity expires
+    :param employee_id:
+    """
+    cache.set(changed_key(employee_id), time.time(), identity_ttl())
+
+
+def remember_employee(session, emp):
+    """
+    Storing the identity of the logged-in employee in the session,
+    plain values so every session engine can serialize it
+    :param session:
+    :param emp:
+    """
+    identity = {field: getattr(emp, field) for field in IDENTITY_FIELDS}
+    identity['checked'] = time.time()
+    session[SESSION_KEY] = identity
+
+
+def is_current(identity, username):
+    """
+    Whether a stored identity still belongs to the username and
+    was checked after the employee last changed and within the TTL
+    :param identity:
+    :param username:
+    """
+    if not identity or identity.get('emp_username') != username:
+        return False
+    checked = identity.get('checked', 0)
+    if time.time() - checked > identity_ttl():
+        return False
+    changed = cache.get(changed_key(identity['id']))
+    return changed is None or changed < checked
+
+
+def get_session_employee(session):
+    """
+    Employee of the session built from the stored identity. The
+    employee is looked up when the session has a username but no
+    current identity, so deleted employees lose their session and
+    moved employees pick up their new organization
+    :param session:
+    """
+    username = session.get('username')
+    if not username:
+        return None
+    identity = session.get(SESSION_KEY)
+    if not is_current(identity, username):
+        emp = Employee.objects.filter(emp_username=username).only(*IDENTITY_FIELDS).first()
+        if emp is None:
+            session.pop(SESSION_KEY, None)
+            return None
+        remember_employee(session, emp)
+        identity = session[SESSION_KEY]
+    return Employee(**{field: identity[field] for field in IDENTITY_FIELDS})
+
+
+class EmployeeIdentityMiddleware:
+    """
+    Setting request.employee to the logged-in employee, None when no
+    employee is logged in. The employee carries the identity fields
+    only and must not be saved
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.employee = get_session_employee(request.session)
+        return self.get_response(request)
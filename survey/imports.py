@@ -0,0 +1,142 @@
+"""
+This is bulk import file loads employees from CSV or XLSX
+files in committed batches and reports rejected rows
+"""
+import csv
+import io
+import logging
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from openpyxl import load_workbook
+from .identity import forget_employee
+from .models import Employee
+
+LOGGER = logging.getLogger(__name__)
+
+IMPORT_FIELDS = ('emp_name', 'emp_username', 'emp_password',
+                 'emp_designation', 'emp_address')
+UPDATE_FIELDS = ('emp_name', 'emp_password', 'emp_designation', 'emp_address')
+
+
+class ImportReport:
+    """
+    Outcome of a bulk employee import
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.rejected = []
+
+    def reject(self, line, username, error):
+        self.rejected.append((line, username, error))
+
+    def __str__(self):
+        return 'created %s, updated %s, rejected %s' % (
+            self.created, self.updated, len(self.rejected))
+
+
+def read_csv(stream):
+    """
+    Iterating rows of a CSV file as dictionaries
+    :param stream: binary or text file object
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(stream):
+        yield row
+
+
+def read_xlsx(stream):
+    """
+    Iterating rows of the first XLSX sheet as dictionaries
+    :param stream: binary file object
+    """
+    workbook = load_workbook(stream, read_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+    for values in rows:
+        yield {name: '' if value is None else str(value) for name, value in zip(header, values)}
+
+
+def read_rows(stream, filename):
+    """
+    Choosing the reader from the file extension
+    :param stream:
+    :param filename:
+    """
+    if filename.lower().endswith('.xlsx'):
+        return read_xlsx(stream)
+    return read_csv(stream)
+
+
+def clean_row(row):
+    """
+    Validating one imported row and returning the employee values
+    :param row:
+    """
+    values = {name: (row.get(name) or '').strip() for name in IMPORT_FIELDS}
+    if not values['emp_name']:
+        raise ValidationError('emp_name is required.')
+    validate_email(values['emp_username'])
+    for name in IMPORT_FIELDS:
+        if len(values[name]) > Employee._meta.get_field(name).max_length:
+            raise ValidationError('%s is too long.' % name)
+    return values
+
+
+def import_employees(rows, organization_id, batch_size=1000, update_existing=True):
+    """
+    Importing employee rows for an organization. Existing usernames are
+    loaded once into memory, rows are written with bulk_create and one
+    update statement per batch, each batch committed on its own
+    :param rows: iterable of dictionaries keyed by IMPORT_FIELDS
+    :param organization_id:
+    :param batch_size:
+    :param update_existing: update employees of the organization already imported
+    """
+    report = ImportReport()
+    existing = {username: (emp_id, org_id) for username, emp_id, org_id in
+                Employee.objects.values_list('emp_username', 'id', 'organization_id').iterator()}
+    seen = set()
+    batch = []
+
+    def flush():
+        new = [Employee(organization_id=organization_id, **values)
+               for values in batch if values['emp_username'] not in existing]
+        changed = [Employee(id=existing[values['emp_username']][0], **values)
+                   for values in batch if values['emp_username'] in existing]
+        with transaction.atomic():
+            Employee.objects.bulk_create(new)
+            Employee.objects.bulk_update(changed, UPDATE_FIELDS)
+        # bulk_update sends no post_save, sessions of updated employees are told here
+        for emp in changed:
+            forget_employee(emp.id)
+        report.created += len(new)
+        report.updated += len(changed)
+        LOGGER.info("Employee import batch committed : %s", report)
+
+    for line, row in enumerate(rows, start=2):
+        try:
+            values = clean_row(row)
+        except ValidationError as error:
+            report.reject(line, row.get('emp_username'), ' '.join(error.messages))
+            continue
+        username = values['emp_username']
+        if username in seen:
+            report.reject(line, username, 'Duplicate username in file.')
+            continue
+        if username in existing and (not update_existing or
+                                     existing[username][1] != organization_id):
+            report.reject(line, username, 'An account with this email exist.')
+            continue
+        seen.add(username)
+        batch.append(values)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return report
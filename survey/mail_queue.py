@@ -0,0 +1,124 @@
+"""
+This is outbound mail queue file, requests enqueue emails
+and the send_queued_mail command delivers them in batches
+"""
+import datetime
+import logging
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboundEmail
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def enqueue_mail(subject, body, recipients, from_email=None):
+    """
+    Queuing one email per recipient instead of sending it inline
+    :param subject:
+    :param body:
+    :param recipients:
+    :param from_email:
+    """
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=body, from_email=from_email, recipient=recipient)
+        for recipient in recipients])
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff delay before the next delivery attempt
+    :param attempts:
+    """
+    backoff = getattr(settings, 'MAIL_QUEUE_BACKOFF', 60)
+    return datetime.timedelta(seconds=backoff * 2 ** max(attempts - 1, 0))
+
+
+def record_failure(messages, error, max_attempts, stats):
+    """
+    Counting a failed delivery attempt of unsent messages, retried
+    with backoff or marked failed once max_attempts is reached
+    :param messages:
+    :param error:
+    :param max_attempts:
+    :param stats:
+    """
+    retry_groups = {}
+    for message in messages:
+        retry_groups.setdefault(message.attempts + 1, []).append(message.id)
+    for attempts, group_ids in retry_groups.items():
+        if attempts >= max_attempts:
+            OutboundEmail.objects.filter(id__in=group_ids).update(
+                status=OutboundEmail.FAILED, attempts=attempts, last_error=str(error))
+            stats['failed'] += len(group_ids)
+        else:
+            OutboundEmail.objects.filter(id__in=group_ids).update(
+                attempts=attempts, last_error=str(error),
+                next_attempt=timezone.now() + retry_delay(attempts))
+            stats['retried'] += len(group_ids)
+
+
+def deliver(batch, connection):
+    """
+    Sending a batch one message at a time over the connection,
+    opened on first use. Returns the ids of the messages the backend
+    accepted and the error that stopped the batch, if any
+    :param batch:
+    :param connection:
+    """
+    sent_ids = []
+    try:
+        connection.open()
+        for message in batch:
+            email = EmailMessage(message.subject, message.body,
+                                 message.from_email or settings.DEFAULT_FROM_EMAIL,
+                                 [message.recipient], connection=connection)
+            if email.send():
+                sent_ids.append(message.id)
+    except (SMTPException, OSError) as error:
+        LOGGER.exception("Email error : ")
+        return sent_ids, error
+    return sent_ids, None
+
+
+def send_queued_mail(batch_size=100, max_attempts=5, connection=None):
+    """
+    Draining due queued emails over one pooled connection, opened
+    only once a batch is due. Messages are sent one by one, so when
+    delivery fails only the unsent messages of the batch are retried
+    with backoff until max_attempts is reached
+    :param batch_size:
+    :param max_attempts:
+    :param connection:
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    connection = connection or get_connection()
+    try:
+        while True:
+            with transaction.atomic():
+                batch = list(OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+                    status=OutboundEmail.PENDING, next_attempt__lte=timezone.now()
+                ).order_by('next_attempt', 'id')[:batch_size])
+                if not batch:
+                    break
+                sent_ids, error = deliver(batch, connection)
+                OutboundEmail.objects.filter(id__in=sent_ids).update(
+                    status=OutboundEmail.SENT, sent_date=timezone.now())
+                stats['sent'] += len(sent_ids)
+                # Messages the backend did not accept count as a failed attempt
+                # too, otherwise they would stay due and be picked up again
+                sent = set(sent_ids)
+                unsent = [message for message in batch if message.id not in sent]
+                if unsent:
+                    record_failure(unsent, error or 'Not accepted by the mail backend.',
+                                   max_attempts, stats)
+            if error is not None:
+                # Reconnecting on the next batch, after the attempts are committed
+                connection.close()
+    finally:
+        connection.close()
+    return stats
@@ -1,15 +1,18 @@
-from django.apps.registry import apps
 from django.conf import settings
 from django.core.management import call_command
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils.encoding import smart_bytes
 from datetime import datetime
 from io import BytesIO
 from json import dump
-from os import path
-from tarfile import TarInfo, TarFile
+from os import path, remove
+from tarfile import TarInfo
 from ... import __version__
-from django.db import models
+from ...archives import (ARCHIVE_COMPRESSIONS, ARCHIVE_EXCLUDE, ARCHIVE_SPLIT, add_member,
+                         dump_model, get_archive_models, get_file_models, get_last_feedback_id,
+                         incremental_first, open_archive, plan_tasks, read_manifest,
+                         run_tasks, updated_feedback, write_manifest)
+from ...models import SurveyFeedback
 
 
 class MixedIO(BytesIO):
@@ -42,27 +45,70 @@ class Command(BaseCommand):
 
     help = "Create a compressed archive of database tables and uploaded media."
 
+    def add_arguments(self, parser):
+        parser.add_argument('--stream', action='store_true',
+                            help='Write each model into its own archive member in chunks.')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only archive answers created or updated since the last '
+                                 'manifest, other models are archived in full.')
+        parser.add_argument('--compression', choices=ARCHIVE_COMPRESSIONS,
+                            help='Archive compressor, bz2 when omitted.')
+        parser.add_argument('--level', type=int, choices=range(1, 10),
+                            help='Compression level, 1 fastest and 9 smallest.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database per round trip.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes dumping models and answer ranges in parallel.')
+        parser.add_argument('--manifest',
+                            help='Manifest of the last archive, ARCHIVE_MANIFEST when omitted.')
+
     def handle(self, *args, **kwargs):
         """
         Process the command.
         """
-        tar = self._create_archive()
-        self._dump_db(tar)
-        self._dump_files(tar)
-        self._dump_meta(tar)
+        manifest_path = kwargs.get('manifest') or getattr(
+            settings, 'ARCHIVE_MANIFEST',
+            path.join(getattr(settings, 'SurveyRepo', ''), 'archive-manifest.json'))
+        previous = None
+        if kwargs.get('incremental'):
+            previous = read_manifest(manifest_path)
+            if previous is None:
+                raise CommandError('No manifest at %s, take a full archive before an '
+                                   'incremental one.' % manifest_path)
+        manifest = {'version': __version__,
+                    'created': datetime.now().isoformat(),
+                    'mode': 'incremental' if kwargs.get('incremental') else 'full'}
+        tar = self._create_archive(kwargs.get('compression'), kwargs.get('level'))
+        manifest['archive'] = path.basename(tar.name)
+        try:
+            if kwargs.get('incremental'):
+                manifest['base'] = previous.get('archive')
+                manifest.update(self._dump_incremental(tar, previous, kwargs['chunk_size'],
+                                                       kwargs['workers']))
+            elif kwargs.get('stream') or kwargs['workers'] > 1:
+                manifest.update(self._stream_db(tar, kwargs['chunk_size'], kwargs['workers']))
+            else:
+                manifest.update(self._dump_db(tar))
+            if not kwargs.get('incremental'):
+                self._dump_files(tar)
+            self._dump_meta(tar, manifest)
+        finally:
+            tar.close()
+        # Every archive becomes the base of the next incremental one
+        write_manifest(manifest_path, manifest)
         self.stdout.write("Backup completed.")
 
-    def _create_archive(self):
+    def _create_archive(self, compression=None, level=None):
         """
         Create the archive and return the TarFile.
         """
         filename = getattr(settings, 'surveyArchive', '%Y-%m-%d--%H-%M-%S')
-        fmt = getattr(settings, '.zip', 'bz2')
+        fmt = compression or getattr(settings, '.zip', 'bz2')
         absolute_path = path.join(
             getattr(settings, 'SurveyRepo', ''),
             '%s.tar.%s' % (datetime.today().strftime(filename), fmt)
         )
-        return TarFile.open(absolute_path, 'w:%s' % fmt)
+        return open_archive(absolute_path, fmt, level)
 
     def _dump_db(self, tar):
         """
@@ -70,11 +116,8 @@ class Command(BaseCommand):
         """
 
         # Determine the list of models to exclude
-        exclude = getattr(settings, 'ARCHIVE_EXCLUDE', (
-            'auth.Permission',
-            'contenttypes.ContentType',
-            'sessions.Session',
-        ))
+        exclude = getattr(settings, 'ARCHIVE_EXCLUDE', ARCHIVE_EXCLUDE)
+        last_feedback_id = get_last_feedback_id()
 
         # Dump the tables to a MixedIO
         data = MixedIO()
@@ -82,39 +125,80 @@ class Command(BaseCommand):
         info = TarInfo('data.json')
         info.size = data.rewind()
         tar.addfile(info, data)
+        return {'last_feedback_id': last_feedback_id}
+
+    def _add_dumps(self, tar, dumps):
+        """
+        Add model dumps to the archive and report them.
+        """
+        entries = []
+        for dumped in dumps:
+            fileobj = dumped.open()
+            try:
+                add_member(tar, dumped.member, fileobj, dumped.size)
+            finally:
+                fileobj.close()
+                if dumped.path:
+                    remove(dumped.path)
+            self.stdout.write(str(dumped))
+            entries.append(dumped.as_manifest())
+        return entries
+
+    def _stream_db(self, tar, chunk_size, workers=1):
+        """
+        Dump the rows of each model to its own archive member in chunks.
+        """
+        exclude = getattr(settings, 'ARCHIVE_EXCLUDE', ARCHIVE_EXCLUDE)
+        last_feedback_id = get_last_feedback_id()
+        tasks = plan_tasks(get_archive_models(exclude),
+                           {SurveyFeedback._meta.label_lower: (None, last_feedback_id)},
+                           getattr(settings, 'ARCHIVE_SPLIT', ARCHIVE_SPLIT), workers)
+        return {'models': self._add_dumps(tar, run_tasks(tasks, chunk_size, workers)),
+                'last_feedback_id': last_feedback_id}
+
+    def _dump_incremental(self, tar, previous, chunk_size, workers=1):
+        """
+        Dump the answers created since the previous archive, the older
+        answers updated since it and every other model in full, so new
+        answers find the surveys, questions and employees they refer to.
+        """
+        exclude = getattr(settings, 'ARCHIVE_EXCLUDE', ARCHIVE_EXCLUDE)
+        first = incremental_first(previous)
+        last_feedback_id = max(get_last_feedback_id(), first or 0)
+        tasks = plan_tasks(get_archive_models(exclude),
+                           {SurveyFeedback._meta.label_lower: (first, last_feedback_id)},
+                           getattr(settings, 'ARCHIVE_SPLIT', ARCHIVE_SPLIT), workers)
+        dumps = list(run_tasks(tasks, chunk_size, workers))
+        updated = updated_feedback(previous)
+        if updated is not None:
+            dumps.append(dump_model(SurveyFeedback, updated, chunk_size,
+                                    'data/survey.surveyfeedback.updated.json'))
+        return {'models': self._add_dumps(tar, dumps),
+                'last_feedback_id': last_feedback_id}
 
     def _dump_files(self, tar):
         """
         Dump all uploaded media to the archive.
         """
 
-        # Loop through all models and find FileFields
-        for model in apps.get_models():
-
-            # Get the name of all file fields in the model
-            field_names = []
-            for field in model._meta.fields:
-                if isinstance(field, models.FileField):
-                    field_names.append(field.name)
-
-            # If any were found, loop through each row
-            if len(field_names):
-                for row in model.objects.all():
-                    for field_name in field_names:
-                        field = getattr(row, field_name)
-                        if field:
-                            field.open()
-                            info = TarInfo(field.name)
-                            info.size = field.size
-                            tar.addfile(info, field)
-                            field.close()
-
-    def _dump_meta(self, tar):
+        # Only models having file fields are walked, each row once
+        for model, field_names in get_file_models():
+            for row in model._default_manager.only('pk', *field_names).iterator():
+                for field_name in field_names:
+                    field = getattr(row, field_name)
+                    if field:
+                        field.open()
+                        info = TarInfo(field.name)
+                        info.size = field.size
+                        tar.addfile(info, field)
+                        field.close()
+
+    def _dump_meta(self, tar, manifest=None):
         """
         Dump metadata to the archive.
         """
         data = MixedIO()
-        dump({'version': __version__}, data)
+        dump(manifest or {'version': __version__}, data)
         info = TarInfo('meta.json')
         info.size = data.rewind()
         tar.addfile(info, data)
@@ -0,0 +1,125 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from survey.benchmarks import BASELINE_PATH, check_baseline, compare, explain_feedback, \
+    load_baseline, run_flows, save_baseline, seed, seed_feedback, summarize, time_question_list
+from survey.models import SurveyFeedback
+
+CONFIG_OPTIONS = ('organizations', 'employees', 'questions', 'surveys',
+                  'questions_per_survey', 'iterations', 'seed')
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and benchmark the employee flow. Run it '
+            'with a settings module pointing at PostgreSQL to benchmark that database, '
+            'baselines are kept per database vendor')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=2)
+        parser.add_argument('--employees', type=int, default=50,
+                            help='Employees per organization.')
+        parser.add_argument('--questions', type=int, default=30,
+                            help='Questions per organization.')
+        parser.add_argument('--surveys', type=int, default=6,
+                            help='Surveys per organization.')
+        parser.add_argument('--questions-per-survey', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Employee flows to run.')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Flows run before measuring.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline',
+                            help='JSON baseline file to compare with, defaults to the '
+                                 'committed survey/benchmark_baseline.json.')
+        parser.add_argument('--save', action='store_true',
+                            help='Store this run as the baseline of its database vendor.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative increase before a metric is a regression.')
+        parser.add_argument('--render', type=int, metavar='QUESTIONS',
+                            help='Instead of the flow, time the question list of a survey '
+                                 'with this many questions with and without cached '
+                                 'input fragments.')
+        parser.add_argument('--explain', type=int, metavar='ROWS',
+                            help='Instead of the flow, seed this many answers and check '
+                                 'EXPLAIN shows the feedback indexes in use, with default '
+                                 'planner settings.')
+
+    def handle(self, *args, **options):
+        if options['explain']:
+            return self.explain(options['explain'], options['seed'])
+        if options['render'] and (options['baseline'] or options['save']):
+            raise CommandError('--render does not support baselines.')
+        baseline_path = None if options['render'] else options['baseline'] or BASELINE_PATH
+        if options['save']:
+            try:
+                check_baseline(baseline_path)
+            except ValueError as error:
+                raise CommandError(error)
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            cache.clear()
+            if options['render']:
+                report = summarize(*time_question_list(options['render'], options['iterations'],
+                                                       options['seed'], options['warmup']))
+            else:
+                seed(options['organizations'], options['employees'], options['questions'],
+                     options['surveys'], options['questions_per_survey'], options['seed'])
+                report = summarize(*run_flows(options['iterations'], options['seed'],
+                                              options['warmup']))
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        report['config'] = {name: options[name] for name in CONFIG_OPTIONS}
+        self.stdout.write("{vendor}: {requests} requests in {seconds}s, "
+                          "{throughput_rps} requests/s".format(**report))
+        for step, row in report['steps'].items():
+            self.stdout.write("{:<9} p50 {p50_ms:>8.2f}ms  p95 {p95_ms:>8.2f}ms  "
+                              "p99 {p99_ms:>8.2f}ms  {queries:>6.2f} queries".format(step, **row))
+        if options['render']:
+            steps = report['steps']
+            self.stdout.write("Cached input fragments render {:.1f}x faster at p50".format(
+                steps['templates']['p50_ms'] / steps['fragments']['p50_ms']))
+
+        if baseline_path:
+            baseline = load_baseline(baseline_path).get(report['vendor'])
+            if baseline and baseline.get('config') != report['config']:
+                self.stderr.write("Baseline was recorded with {}".format(baseline.get('config')))
+            regressions = compare(report, baseline, options['threshold']) if baseline else []
+            for step, metric, previous, current in regressions:
+                self.stderr.write("Regression in {} {}: {} -> {}".format(
+                    step, metric, previous, current))
+            if options['save']:
+                save_baseline(baseline_path, report)
+            if regressions and not options['save']:
+                raise CommandError('%s metrics regressed.' % len(regressions))
+
+    def explain(self, rows, seed_value):
+        """
+        Seed rows answers in a throwaway test database and report the
+        index each feedback access path uses
+        """
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            started = time.perf_counter()
+            answer = seed_feedback(rows, seed_value)
+            self.stdout.write("Seeded {} answers in {:.1f}s".format(
+                SurveyFeedback.objects.count(), time.perf_counter() - started))
+            results = explain_feedback(answer)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        for path, index, plan in results:
+            self.stdout.write("{:<25} {}".format(path, index or 'NO INDEX'))
+            if index is None:
+                self.stderr.write(plan)
+        missing = [path for path, index, plan in results if index is None]
+        if missing:
+            raise CommandError('%s do not use their index.' % ', '.join(missing))
@@ -1,66 +1,116 @@
 import datetime
+import time
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
-from survey.models import Survey, Employee
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Exists, OuterRef
+from django.utils.timezone import localdate
+from survey.models import Survey, NotificationLog
+
+FROM_EMAIL = 'sonal.pawar@harbingergroup.com'
 
 
 class Command(BaseCommand):
-    help = 'Type the help text here'
+    help = 'Send survey reminder notifications to assigned employees'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Resolve recipients without sending any email.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of emails handed to the connection at once.')
+        parser.add_argument('--ended-days', type=int, default=7,
+                            help='Surveys ended within this many days get the ended '
+                                 'notification, older ones were notified already.')
 
     def handle(self, *args, **options):
-        self.send_notification_one_day_prior()
-        self.send_notification_on_start_date()
-        self.send_notification_one_day_before_end_date()
-        self.send_notification_after_end_date()
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.connection = None if self.dry_run else get_connection()
+        started = time.time()
+        total = 0
+        try:
+            windows = self.get_windows(localdate(), options['ended_days'])
+            for kind, filters, subject, message in windows:
+                count = self.send_notification(kind, filters, subject, message)
+                self.stdout.write("{}: {} recipients".format(kind, count))
+                total += count
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+        elapsed = time.time() - started
+        self.stdout.write("{} {} emails in {:.2f}s ({:.1f} emails/s)".format(
+            'Resolved' if self.dry_run else 'Sent', total, elapsed,
+            total / elapsed if elapsed else total))
 
     @staticmethod
-    def send_notification_one_day_prior():
-        upcoming = Survey.objects.filter(startDatetime=datetime.date.today() + datetime.timedelta(days=1))
-        for employee in upcoming:
-            emp = Employee.objects.get(pk=employee.employee_id)
-            subject = 'You have a new survey coming tomorrow.'
-            body = "Hello {}<br><br> ".format(emp.emp_name)
-            body += "You have a new survey coming tomorrow.<br>"
-            body += "Please login to survey management and complete your survey.<br><br>"
-            body += "Thanks,<br>{}".format("Survey Management Team")
-            send_mail(subject, body, 'sonal.pawar@harbingergroup.com', [emp.emp_username],
-                      html_message=body)
+    def get_windows(today, ended_days=7):
+        """
+        Notification kinds with their survey date filter, subject and message.
+        Only recently ended surveys are notified, the ledger is not filled
+        for surveys that ended before it existed
+        """
+        tomorrow = today + datetime.timedelta(days=1)
+        return (
+            ('one_day_prior', {'startDatetime': tomorrow},
+             'You have a new survey coming tomorrow.',
+             'You have a new survey coming tomorrow.'),
+            ('start_date', {'startDatetime': today},
+             'You have a new survey in your dashboard.',
+             'You have a new survey in your dashboard.'),
+            ('one_day_before_end_date', {'endDatetime': tomorrow},
+             'Survey assigned to you ending tomorrow.',
+             'Survey in your dashboard ending tomorrow.'),
+            ('after_end_date', {'endDatetime__lt': today,
+                                'endDatetime__gte': today - datetime.timedelta(days=ended_days)},
+             'Survey assigned to you was ended.',
+             'Survey in your dashboard ended.'),
+        )
 
     @staticmethod
-    def send_notification_on_start_date():
-        started = Survey.objects.filter(startDatetime=datetime.date.today())
-        for employee in started:
-            emp = Employee.objects.get(pk=employee.employee_id)
-            subject = 'You have a new survey in your dashboard.'
-            body = "Hello {}<br><br> ".format(emp.emp_name)
-            body += "You have a new survey in your dashboard.<br>"
-            body += "Please login to survey management and complete your survey.<br><br>"
-            body += "Thanks,<br>{}".format("Survey Management Team")
-            send_mail(subject, body, 'sonal.pawar@harbingergroup.com', [emp.emp_username],
-                      html_message=body)
+    def get_recipients(kind, filters):
+        """
+        Survey assignments of a notification window joined to their
+        employees in a single query, skipping already notified ones
+        """
+        filters = {'survey__' + key: value for key, value in filters.items()}
+        notified = NotificationLog.objects.filter(employee_id=OuterRef('employee_id'),
+                                                  survey_id=OuterRef('survey_id'),
+                                                  kind=kind)
+        return Survey.employee.through.objects.filter(**filters).annotate(
+            notified=Exists(notified)).filter(notified=False).values_list(
+                'survey_id', 'employee_id', 'employee__emp_name',
+                'employee__emp_username').order_by('survey_id', 'employee_id')
 
     @staticmethod
-    def send_notification_one_day_before_end_date():
-        started = Survey.objects.filter(endDatetime=datetime.date.today() + datetime.timedelta(days=1))
-        for employee in started:
-            emp = Employee.objects.get(pk=employee.employee_id)
-            subject = 'Survey assigned to you ending tomorrow.'
-            body = "Hello {}<br><br> ".format(emp.emp_name)
-            body += "Survey in your dashboard ending tomorrow.<br>"
-            body += "Please login to survey management and complete your survey.<br><br>"
-            body += "Thanks,<br>{}".format("Survey Management Team")
-            send_mail(subject, body, 'sonal.pawar@harbingergroup.com', [emp.emp_username],
-                      html_message=body)
+    def render_body(message):
+        """
+        Rendering message template once, employee name is filled per recipient
+        """
+        body = "Hello {}<br><br> "
+        body += message + "<br>"
+        body += "Please login to survey management and complete your survey.<br><br>"
+        body += "Thanks,<br>Survey Management Team"
+        return body
 
-    @staticmethod
-    def send_notification_after_end_date():
-        started = Survey.objects.filter(endDatetime__lt=datetime.date.today())
-        for employee in started:
-            emp = Employee.objects.get(pk=employee.employee_id)
-            subject = 'Survey assigned to you was ended.'
-            body = "Hello {}<br><br> ".format(emp.emp_name)
-            body += "Survey in your dashboard ended.<br>"
-            body += "Please login to survey management and complete your survey.<br><br>"
-            body += "Thanks,<br>{}".format("Survey Management Team")
-            send_mail(subject, body, 'sonal.pawar@harbingergroup.com', [emp.emp_username],
-                      html_message=body)
+    def send_notification(self, kind, filters, subject, message):
+        body = self.render_body(message)
+        recipients = list(self.get_recipients(kind, filters))
+        if self.dry_run:
+            return len(recipients)
+        for start in range(0, len(recipients), self.batch_size):
+            batch = recipients[start:start + self.batch_size]
+            sent = list()
+            try:
+                for survey_id, employee_id, emp_name, emp_username in batch:
+                    text = body.format(emp_name)
+                    email = EmailMultiAlternatives(subject, text, FROM_EMAIL, [emp_username],
+                                                   connection=self.connection)
+                    email.attach_alternative(text, 'text/html')
+                    if self.connection.send_messages([email]):
+                        sent.append((survey_id, employee_id))
+            finally:
+                # Recording every delivered message, also when the batch fails
+                # part way, lets an interrupted run resume without re-sending
+                NotificationLog.objects.bulk_create([
+                    NotificationLog(survey_id=survey_id, employee_id=employee_id, kind=kind)
+                    for survey_id, employee_id in sent])
+        return len(recipients)
@@ -0,0 +1,34 @@
+import sys
+import time
+from django.core.management.base import BaseCommand
+from survey.exports import EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream survey answers to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output.')
+        parser.add_argument('--organization', type=int, help='Only export this organization.')
+        parser.add_argument('--survey', type=int, help='Only export this survey.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database per round trip.')
+        parser.add_argument('--output', help='File to write, standard output when omitted.')
+
+    def handle(self, *args, **options):
+        started = time.time()
+        chunks = iter_export(options['format'], options['gzip'],
+                             organization_id=options['organization'],
+                             survey_id=options['survey'],
+                             chunk_size=options['chunk_size'])
+        written = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+        self.stderr.write("Exported {} bytes in {:.2f}s".format(written, time.time() - started))
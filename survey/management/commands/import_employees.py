@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from survey.imports import import_employees, read_rows
+from survey.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Bulk import employees of an organization from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with emp_* columns.')
+        parser.add_argument('--organization', type=int, required=True)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written and committed per batch.')
+        parser.add_argument('--no-update', action='store_true',
+                            help='Reject rows of employees that already exist.')
+
+    def handle(self, *args, **options):
+        if not Organization.objects.filter(id=options['organization']).exists():
+            raise CommandError('Organization %s does not exist.' % options['organization'])
+        started = time.time()
+        with open(options['path'], 'rb') as stream:
+            report = import_employees(read_rows(stream, options['path']),
+                                      options['organization'],
+                                      batch_size=options['batch_size'],
+                                      update_existing=not options['no_update'])
+        elapsed = time.time() - started
+        rows = report.created + report.updated + len(report.rejected)
+        for line, username, error in report.rejected:
+            self.stderr.write("Line {} ({}): {}".format(line, username, error))
+        self.stdout.write("Imported {}: {} rows in {:.2f}s ({:.0f} rows/s)".format(
+            report, rows, elapsed, rows / elapsed if elapsed else rows))
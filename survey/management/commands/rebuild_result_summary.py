@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from survey.models import Survey
+from survey.results import rebuild_summary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild precomputed survey result summaries from all saved answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', nargs='*', type=int,
+                            help='Surveys to rebuild, every survey when omitted.')
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.order_by('id')
+        if options['survey_ids']:
+            surveys = surveys.filter(id__in=options['survey_ids'])
+        for survey_id in surveys.values_list('id', flat=True).iterator():
+            summary = rebuild_summary(survey_id)
+            self.stdout.write("Survey {}: {} respondents, {} completed".format(
+                survey_id, summary.respondent_count, summary.completed_count))
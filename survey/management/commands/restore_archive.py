@@ -0,0 +1,24 @@
+import time
+from os import path
+from django.core.management.base import BaseCommand, CommandError
+from survey.archives import restore_archives
+
+
+class Command(BaseCommand):
+    help = 'Restore database rows from archives written by the archive command'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archives', nargs='+',
+                            help='A full archive followed by its incremental archives.')
+
+    def handle(self, *args, **options):
+        for filename in options['archives']:
+            if not path.exists(filename):
+                raise CommandError('Archive %s does not exist.' % filename)
+        started = time.time()
+        try:
+            fixtures = restore_archives(options['archives'], stdout=self.stdout)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write("Restored {} members from {} archives in {:.2f}s".format(
+            len(fixtures), len(options['archives']), time.time() - started))
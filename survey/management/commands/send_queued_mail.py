@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from survey.mail_queue import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound emails in batches over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of emails claimed per batch.')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Attempts before an email is marked as failed.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep draining the queue until interrupted.')
+        parser.add_argument('--interval', type=int, default=30,
+                            help='Seconds to sleep between drains with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = send_queued_mail(batch_size=options['batch_size'],
+                                     max_attempts=options['max_attempts'])
+            self.stdout.write("Sent {sent}, retried {retried}, failed {failed}.".format(**stats))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0015_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('sent_date', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.Employee')),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.Survey')),
+            ],
+            options={
+                'unique_together': {('employee', 'survey', 'kind')},
+            },
+        ),
+    ]
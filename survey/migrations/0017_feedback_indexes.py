@@ -0,0 +1,41 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:45
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_feedback(apps, schema_editor):
+    """
+    Keeping the first answer of each survey, employee and question
+    so the unique constraint can be created on existing data
+    """
+    SurveyFeedback = apps.get_model('survey', 'SurveyFeedback')
+    duplicates = SurveyFeedback.objects.values('survey', 'employee', 'question').annotate(
+        first_id=Min('id'), total=Count('id')).filter(total__gt=1).order_by()
+    for row in duplicates:
+        SurveyFeedback.objects.filter(
+            survey=row['survey'], employee=row['employee'], question=row['question']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0016_notificationlog'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_feedback, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='surveyfeedback',
+            unique_together={('survey', 'employee', 'question')},
+        ),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['startDatetime', 'endDatetime'], name='survey_start_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyfeedback',
+            index=models.Index(fields=['survey', 'employee', 'flag'], name='feedback_survey_emp_flag_idx'),
+        ),
+    ]
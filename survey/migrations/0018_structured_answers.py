@@ -0,0 +1,85 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CHOICE_TYPES = (' radio ', 'select', 'select-multiple')
+
+
+def populate_structured_answers(apps, schema_editor):
+    """
+    Creating choices of existing questions and linking
+    existing comma-joined and integer answers to them
+    """
+    Question = apps.get_model('survey', 'Question')
+    QuestionChoice = apps.get_model('survey', 'QuestionChoice')
+    SurveyFeedback = apps.get_model('survey', 'SurveyFeedback')
+
+    for question in Question.objects.filter(question_type__in=CHOICE_TYPES).iterator():
+        labels = []
+        for label in (question.choices or '').split(','):
+            if label.strip() and label.strip() not in labels:
+                labels.append(label.strip())
+        QuestionChoice.objects.bulk_create([
+            QuestionChoice(question_id=question.id, label=label, position=position)
+            for position, label in enumerate(labels)])
+
+    choice_ids = {(question_id, label): choice_id for question_id, label, choice_id
+                  in QuestionChoice.objects.values_list('question_id', 'label', 'id')}
+    through = SurveyFeedback.choices.through
+    links = []
+    answers = SurveyFeedback.objects.filter(question__question_type__in=CHOICE_TYPES)
+    for feedback_id, question_id, response in answers.values_list(
+            'id', 'question_id', 'response').iterator():
+        for value in set((response or '').split(',')):
+            choice_id = choice_ids.get((question_id, value.strip()))
+            if choice_id is not None:
+                links.append(through(surveyfeedback_id=feedback_id, questionchoice_id=choice_id))
+        if len(links) >= 1000:
+            through.objects.bulk_create(links)
+            links = []
+    through.objects.bulk_create(links)
+
+    integer_ids = {}
+    answers = SurveyFeedback.objects.filter(question__question_type='integer')
+    for feedback_id, response in answers.values_list('id', 'response').iterator():
+        try:
+            integer_ids.setdefault(int((response or '').strip()), []).append(feedback_id)
+        except ValueError:
+            continue
+    for value, ids in integer_ids.items():
+        SurveyFeedback.objects.filter(id__in=ids).update(integer_response=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0017_feedback_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyfeedback',
+            name='integer_response',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='QuestionChoice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=200)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.Question')),
+            ],
+            options={
+                'ordering': ('position',),
+                'unique_together': {('question', 'label')},
+            },
+        ),
+        migrations.AddField(
+            model_name='surveyfeedback',
+            name='choices',
+            field=models.ManyToManyField(blank=True, to='survey.QuestionChoice'),
+        ),
+        migrations.RunPython(populate_structured_answers, migrations.RunPython.noop),
+    ]
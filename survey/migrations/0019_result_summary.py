@@ -0,0 +1,65 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0018_structured_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyResultSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('respondent_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='survey.Survey')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionResultSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer_count', models.PositiveIntegerField(default=0)),
+                ('integer_count', models.PositiveIntegerField(default=0)),
+                ('integer_sum', models.BigIntegerField(default=0)),
+                ('integer_min', models.IntegerField(blank=True, null=True)),
+                ('integer_max', models.IntegerField(blank=True, null=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.Question')),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.SurveyResultSummary')),
+            ],
+            options={
+                'unique_together': {('summary', 'question')},
+            },
+        ),
+        migrations.CreateModel(
+            name='IntegerResultCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.IntegerField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('question_summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.QuestionResultSummary')),
+            ],
+            options={
+                'ordering': ('value',),
+                'unique_together': {('question_summary', 'value')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ChoiceResultCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.QuestionChoice')),
+                ('question_summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.QuestionResultSummary')),
+            ],
+            options={
+                'unique_together': {('question_summary', 'choice')},
+            },
+        ),
+    ]
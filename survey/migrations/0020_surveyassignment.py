@@ -0,0 +1,93 @@
+# Generated by Django 2.1.7 on 2026-10-18 18:10
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def populate_assignment_status(apps, schema_editor):
+    """
+    Deriving the status of existing assignments from the answers
+    given so far, finished answers mark the assignment completed
+    """
+    SurveyAssignment = apps.get_model('survey', 'SurveyAssignment')
+    SurveyFeedback = apps.get_model('survey', 'SurveyFeedback')
+
+    def at_midnight(date):
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+    rows = SurveyFeedback.objects.values('survey_id', 'employee_id').annotate(
+        first=Min('created_date'), last=Max('updated_date'),
+        finished=Count('id', filter=Q(flag=True))).order_by()
+    for row in rows.iterator():
+        SurveyAssignment.objects.filter(survey_id=row['survey_id'],
+                                        employee_id=row['employee_id']).update(
+            status='completed' if row['finished'] else 'in_progress',
+            started_at=at_midnight(row['first']),
+            completed_at=at_midnight(row['last']) if row['finished'] else None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0019_result_summary'),
+    ]
+
+    operations = [
+        # The automatic survey_survey_employee table becomes the through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='SurveyAssignment',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='survey.Employee')),
+                        ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='survey.Survey')),
+                    ],
+                    options={
+                        'db_table': 'survey_survey_employee',
+                    },
+                ),
+                migrations.AlterUniqueTogether(
+                    name='surveyassignment',
+                    unique_together={('survey', 'employee')},
+                ),
+                migrations.AlterField(
+                    model_name='survey',
+                    name='employee',
+                    field=models.ManyToManyField(through='survey.SurveyAssignment', to='survey.Employee'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='surveyassignment',
+            name='status',
+            field=models.CharField(choices=[('assigned', 'Not started'), ('in_progress', 'In progress'), ('completed', 'Completed')], default='assigned', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='surveyassignment',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='surveyassignment',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_assignment_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='surveyassignment',
+            index=models.Index(fields=['employee', 'status'], name='assignment_emp_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyassignment',
+            index=models.Index(fields=['survey', 'status'], name='assignment_survey_status_idx'),
+        ),
+        migrations.RemoveField(
+            model_name='survey',
+            name='flag',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.7 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0020_surveyassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyassignment',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every save that changes the answers.'),
+        ),
+        migrations.AlterField(
+            model_name='surveyfeedback',
+            name='updated_date',
+            field=models.DateField(auto_now=True),
+        ),
+    ]
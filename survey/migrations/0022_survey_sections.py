@@ -0,0 +1,81 @@
+# Generated by Django 2.1.7 on 2026-10-18 19:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_question_positions(apps, schema_editor):
+    """
+    Numbering the questions of every survey in the order
+    they were shown so far, by question id
+    """
+    SurveyQuestion = apps.get_model('survey', 'SurveyQuestion')
+    survey_id, position = None, 0
+    rows = SurveyQuestion.objects.order_by('survey_id', 'question_id').values_list(
+        'id', 'survey_id')
+    for row_id, row_survey_id in rows.iterator():
+        position = position + 1 if row_survey_id == survey_id else 1
+        survey_id = row_survey_id
+        SurveyQuestion.objects.filter(id=row_id).update(position=position)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0021_answer_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveySection',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='survey.Survey')),
+            ],
+            options={
+                'ordering': ('position', 'id'),
+            },
+        ),
+        # The automatic survey_survey_question table becomes the through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='SurveyQuestion',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='survey.Question')),
+                        ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='survey_questions', to='survey.Survey')),
+                    ],
+                    options={
+                        'db_table': 'survey_survey_question',
+                    },
+                ),
+                migrations.AlterUniqueTogether(
+                    name='surveyquestion',
+                    unique_together={('survey', 'question')},
+                ),
+                migrations.AlterField(
+                    model_name='survey',
+                    name='question',
+                    field=models.ManyToManyField(through='survey.SurveyQuestion', to='survey.Question'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='surveyquestion',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='surveyquestion',
+            name='section',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='survey_questions', to='survey.SurveySection'),
+        ),
+        migrations.RunPython(populate_question_positions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='surveyquestion',
+            index=models.Index(fields=['survey', 'position'], name='survey_question_position_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+def strip_radio_type(apps, schema_editor):
+    """
+    Radio questions were stored with spaces around their type
+    """
+    Question = apps.get_model('survey', 'Question')
+    Question.objects.filter(question_type=' radio ').update(question_type='radio')
+
+
+def pad_radio_type(apps, schema_editor):
+    Question = apps.get_model('survey', 'Question')
+    Question.objects.filter(question_type='radio').update(question_type=' radio ')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0022_survey_sections'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='question_type',
+            field=models.CharField(choices=[('text', 'text'), ('radio', 'radio'), ('select', 'select'), ('select-multiple', 'Select Multiple'), ('integer', 'integer')], default='text', max_length=200),
+        ),
+        migrations.RunPython(strip_radio_type, pad_radio_type),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0023_radio_question_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionchoice',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0024_choice_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='definition_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='definitions_modified',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
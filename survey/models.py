@@ -4,6 +4,7 @@ This is the database structure of survey application
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class Organization(models.Model):
@@ -14,6 +15,21 @@ class Organization(models.Model):
     location = models.CharField(max_length=100)
     description = models.CharField(max_length=200)
     is_archived = models.BooleanField(default=False)
+    definition_version = models.PositiveIntegerField(default=1)
+    definitions_modified = models.DateTimeField(default=timezone.now)
+
+    VERSION_FIELDS = ('definition_version', 'definitions_modified')
+
+    def save(self, *args, **kwargs):
+        """
+        Saving an existing organization leaves its definition version
+        alone, the version only moves through survey.definitions
+        """
+        if self.pk and not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key
+                                       and field.name not in self.VERSION_FIELDS]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.company_name
@@ -60,7 +76,7 @@ class Question(models.Model):
     This is question class
     """
     TEXT = 'text'
-    RADIO = ' radio '
+    RADIO = 'radio'
     SELECT = 'select'
     SELECT_MULTIPLE = 'select-multiple'
     INTEGER = 'integer'
@@ -80,15 +96,95 @@ class Question(models.Model):
                                          ' provide a comma-separated list of options for this question .')
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
 
+    CHOICE_TYPES = (RADIO, SELECT, SELECT_MULTIPLE)
+
     # noinspection PyUnresolvedReferences
     def get_choice(self):
         if self.choices is not None:
             return self.choices.split(',')
 
+    def get_choice_labels(self):
+        """
+        Choices without surrounding spaces and empty items
+        """
+        labels = [label.strip() for label in self.get_choice() or [] if label.strip()]
+        return list(dict.fromkeys(labels))
+
+    def sync_choices(self):
+        """
+        Keeping QuestionChoice rows in step with the comma-separated choices
+        """
+        Question.sync_all_choices([self])
+
+    @staticmethod
+    def sync_all_choices(questions):
+        """
+        Keeping QuestionChoice rows of many questions in step with their
+        comma-separated choices, also used after bulk_create. Dropped
+        choices are deactivated instead of deleted, so recorded answers
+        keep the choices they picked
+        :param questions:
+        """
+        existing = {(choice.question_id, choice.label): choice for choice in
+                    QuestionChoice.objects.filter(question__in=[question.id for question in questions])}
+        new_choices = list()
+        kept_ids = set()
+        for question in questions:
+            labels = question.get_choice_labels() \
+                if question.question_type in Question.CHOICE_TYPES else []
+            for position, label in enumerate(labels):
+                choice = existing.get((question.id, label))
+                if choice is None:
+                    new_choices.append(QuestionChoice(question_id=question.id, label=label,
+                                                      position=position))
+                    continue
+                kept_ids.add(choice.id)
+                if choice.position != position or not choice.is_active:
+                    QuestionChoice.objects.filter(id=choice.id).update(position=position,
+                                                                        is_active=True)
+        QuestionChoice.objects.filter(
+            id__in=[choice.id for choice in existing.values()
+                    if choice.is_active and choice.id not in kept_ids]).update(is_active=False)
+        QuestionChoice.objects.bulk_create(new_choices)
+
+    def clean(self):
+        """
+        Choice questions need a comma-separated list of choices
+        """
+        if self.question_type in self.CHOICE_TYPES:
+            try:
+                validate_list(self.choices or '')
+            except ValidationError as error:
+                raise ValidationError({'choices': error.messages})
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.sync_choices()
+
     def __str__(self):
         return self.question
 
 
+class QuestionChoice(models.Model):
+    """
+    Normalized option of a radio, select or select multiple question
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    label = models.CharField(max_length=200)
+    position = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.label
+
+    class Meta:
+        """
+        One option per label of a question
+        """
+        unique_together = ('question', 'label')
+        ordering = ('position',)
+
+
 class Survey(models.Model):
     """
     This is Survey class
@@ -97,11 +193,10 @@ class Survey(models.Model):
     description = models.CharField(max_length=200)
     organization = models.ForeignKey(Organization,
                                      on_delete=models.CASCADE)
-    question = models.ManyToManyField(Question)
-    employee = models.ManyToManyField(Employee)
+    question = models.ManyToManyField(Question, through='SurveyQuestion')
+    employee = models.ManyToManyField(Employee, through='SurveyAssignment')
     startDatetime = models.DateField(blank=True, null=True)
     endDatetime = models.DateField(blank=True, null=True)
-    flag = models.BooleanField(blank=True, null=True)
 
     def __str__(self):
         return self.survey_name
@@ -111,6 +206,88 @@ class Survey(models.Model):
               this shows class in plural form
         """
         verbose_name_plural = 'surveys'
+        indexes = [models.Index(fields=['startDatetime', 'endDatetime'],
+                                name='survey_start_end_idx')]
+
+
+class SurveySection(models.Model):
+    """
+    This is section class, a titled group of questions
+    shown on one page of a survey
+    """
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='sections')
+    title = models.CharField(max_length=200)
+    position = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        """
+        Sections are shown in position order
+        """
+        ordering = ('position', 'id')
+
+
+class SurveyQuestion(models.Model):
+    """
+    This is survey question class, a question of a survey
+    with its position and optional section
+    """
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='survey_questions')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    section = models.ForeignKey(SurveySection, on_delete=models.SET_NULL, blank=True, null=True,
+                                related_name='survey_questions')
+    position = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return '%s - %s' % (self.survey_id, self.question_id)
+
+    class Meta:
+        """
+        Reusing the table of the former automatic many to many relation
+        """
+        db_table = 'survey_survey_question'
+        unique_together = ('survey', 'question')
+        indexes = [models.Index(fields=['survey', 'position'],
+                                name='survey_question_position_idx')]
+
+
+class SurveyAssignment(models.Model):
+    """
+    This is assignment class, a survey assigned to
+    an employee with the employee's completion status
+    """
+    ASSIGNED = 'assigned'
+    IN_PROGRESS = 'in_progress'
+    COMPLETED = 'completed'
+
+    Status_types = (
+        (ASSIGNED, 'Not started'),
+        (IN_PROGRESS, 'In progress'),
+        (COMPLETED, 'Completed'),
+    )
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='assignments')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE,
+                                 related_name='assignments')
+    status = models.CharField(max_length=20, choices=Status_types, default=ASSIGNED)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    revision = models.PositiveIntegerField(default=0,
+                                           help_text='Incremented on every save that '
+                                                     'changes the answers.')
+
+    def __str__(self):
+        return '%s - %s' % (self.survey_id, self.employee_id)
+
+    class Meta:
+        """
+        Reusing the table of the former automatic many to many relation
+        """
+        db_table = 'survey_survey_employee'
+        unique_together = ('survey', 'employee')
+        indexes = [models.Index(fields=['employee', 'status'], name='assignment_emp_status_idx'),
+                   models.Index(fields=['survey', 'status'], name='assignment_survey_status_idx')]
 
 
 def validate_list(value):
@@ -134,6 +311,141 @@ class SurveyFeedback(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     response = models.TextField(blank=True, null=True)
+    integer_response = models.IntegerField(blank=True, null=True)
+    choices = models.ManyToManyField(QuestionChoice, blank=True)
     flag = models.BooleanField()
     created_date = models.DateField(auto_now_add=True)
-    updated_date = models.DateField(auto_now_add=True)
+    updated_date = models.DateField(auto_now=True)
+
+    class Meta:
+        """
+        One answer per question, indexed on the employee access paths
+        """
+        unique_together = ('survey', 'employee', 'question')
+        indexes = [models.Index(fields=['survey', 'employee', 'flag'],
+                                name='feedback_survey_emp_flag_idx')]
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbound email queue model drained by
+    the send_queued_mail management command
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    Status_types = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    from_email = models.CharField(max_length=200, blank=True, null=True)
+    recipient = models.CharField(max_length=200)
+    status = models.CharField(max_length=20, choices=Status_types, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    sent_date = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return '%s to %s' % (self.subject, self.recipient)
+
+    class Meta:
+        """
+        Indexing queue on the worker lookup
+        """
+        indexes = [models.Index(fields=['status', 'next_attempt'])]
+
+
+class NotificationLog(models.Model):
+    """
+    Ledger of reminder notifications already
+    sent to an employee for a survey
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=50)
+    sent_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '%s - %s' % (self.kind, self.employee_id)
+
+    class Meta:
+        """
+        One notification of each kind per employee and survey
+        """
+        unique_together = ('employee', 'survey', 'kind')
+
+
+class SurveyResultSummary(models.Model):
+    """
+    Precomputed results of a survey updated as answers are saved
+    """
+    survey = models.OneToOneField(Survey, on_delete=models.CASCADE)
+    respondent_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.survey)
+
+
+class QuestionResultSummary(models.Model):
+    """
+    Precomputed answer counts and integer statistics of a survey question
+    """
+    summary = models.ForeignKey(SurveyResultSummary, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answer_count = models.PositiveIntegerField(default=0)
+    integer_count = models.PositiveIntegerField(default=0)
+    integer_sum = models.BigIntegerField(default=0)
+    integer_min = models.IntegerField(blank=True, null=True)
+    integer_max = models.IntegerField(blank=True, null=True)
+
+    def integer_mean(self):
+        if self.integer_count:
+            return self.integer_sum / self.integer_count
+
+    def __str__(self):
+        return str(self.question)
+
+    class Meta:
+        """
+        One summary per question of a survey
+        """
+        unique_together = ('summary', 'question')
+
+
+class ChoiceResultCount(models.Model):
+    """
+    Number of answers that picked a choice
+    """
+    question_summary = models.ForeignKey(QuestionResultSummary, on_delete=models.CASCADE)
+    choice = models.ForeignKey(QuestionChoice, on_delete=models.CASCADE)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        One counter per choice of a question summary
+        """
+        unique_together = ('question_summary', 'choice')
+
+
+class IntegerResultCount(models.Model):
+    """
+    Histogram bucket of an integer question
+    """
+    question_summary = models.ForeignKey(QuestionResultSummary, on_delete=models.CASCADE)
+    value = models.IntegerField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        One counter per answered value of a question summary
+        """
+        unique_together = ('question_summary', 'value')
+        ordering = ('value',)
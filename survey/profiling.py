@@ -0,0 +1,190 @@
+"""
+This is profiling file records wall time, SQL and template render
+time of survey requests into a bounded in-memory ring buffer and
+enforces per view query budgets
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+LOGGER = logging.getLogger(__name__)
+
+PROFILES = deque(maxlen=getattr(settings, 'SURVEY_PROFILING_BUFFER', 500))
+_active = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    A view issued more SQL queries than its budget allows
+    """
+
+
+class RequestProfile:
+    """
+    Timings of one request
+    """
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.view = None
+        self.status = None
+        self.started = timezone.now()
+        self.wall_time = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.budget = None
+
+    def execute(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper counting and timing every statement
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    @property
+    def wall_ms(self):
+        return self.wall_time * 1000
+
+    @property
+    def sql_ms(self):
+        return self.sql_time * 1000
+
+    @property
+    def template_ms(self):
+        return self.template_time * 1000
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.sql_count > self.budget
+
+    def __str__(self):
+        return '{} {} ({}): {:.1f}ms, {} queries in {:.1f}ms, templates {:.1f}ms'.format(
+            self.method, self.path, self.view, self.wall_ms, self.sql_count,
+            self.sql_ms, self.template_ms)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in middleware, enabled by SURVEY_PROFILING, profiling the views of
+    SURVEY_PROFILING_MODULES and checking SURVEY_QUERY_BUDGETS, a mapping
+    of url names to the number of queries allowed. Requests over budget are
+    logged, or raise QueryBudgetExceeded when SURVEY_QUERY_BUDGET_ACTION
+    is 'raise'
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SURVEY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.modules = tuple(getattr(settings, 'SURVEY_PROFILING_MODULES', ('survey.',)))
+        self.budgets = getattr(settings, 'SURVEY_QUERY_BUDGETS', {})
+        self.budget_action = getattr(settings, 'SURVEY_QUERY_BUDGET_ACTION', 'log')
+
+    def __call__(self, request):
+        profile = RequestProfile(request.method, request.path)
+        _active.profile = profile
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile.execute):
+                response = self.get_response(request)
+        finally:
+            _active.profile = None
+        profile.wall_time = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.func.__module__.startswith(self.modules):
+            return response
+        profile.view = match.view_name
+        profile.status = response.status_code
+        profile.budget = self.budgets.get(match.view_name)
+        PROFILES.append(profile)
+        if profile.over_budget:
+            message = 'Query budget of %s exceeded: %s' % (profile.budget, profile)
+            if self.budget_action == 'raise':
+                raise QueryBudgetExceeded(message)
+            LOGGER.warning(message)
+        return response
+
+
+class ProfilingTemplate(Template):
+    """
+    Template adding its render time to the profile of the current request
+    """
+
+    def render(self, context=None, request=None):
+        profile = getattr(_active, 'profile', None)
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend returning ProfilingTemplate instances
+    """
+
+    def from_string(self, template_code):
+        return ProfilingTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfilingTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            # The debug page lists tried templates per backend
+            exc.backend = self
+            raise
+
+
+def summarize(profiles):
+    """
+    Request count, median and 95th percentile wall time and mean queries per view
+    :param profiles:
+    """
+    by_view = {}
+    for profile in profiles:
+        by_view.setdefault(profile.view, []).append(profile)
+    summary = []
+    for view, rows in sorted(by_view.items()):
+        walls = sorted(profile.wall_time for profile in rows)
+        summary.append({
+            'view': view,
+            'requests': len(rows),
+            'p50': walls[len(walls) // 2] * 1000,
+            'p95': walls[min(len(walls) - 1, int(len(walls) * 0.95))] * 1000,
+            'queries': sum(profile.sql_count for profile in rows) / len(rows),
+            'over_budget': sum(profile.over_budget for profile in rows),
+        })
+    return summary
+
+
+def profiling_view(request):
+    """
+    Admin page listing the profiled requests, newest first
+    :param request:
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    profiles = list(reversed(PROFILES))
+    context = dict(admin.site.each_context(request), title='Request profiles',
+                   profiles=profiles, summary=summarize(profiles),
+                   enabled=getattr(settings, 'SURVEY_PROFILING', False))
+    return TemplateResponse(request, 'admin/survey/profiling.html', context)
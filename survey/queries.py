@@ -0,0 +1,353 @@
+"""
+This is query layer file contains batched
+data access used by the survey views
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localdate, now
+from .definitions import bump_version, get_answer_rules
+from .models import Organization, QuestionChoice, SurveyAssignment, SurveyFeedback, \
+    SurveyQuestion
+from .results import record_answers, remove_answers, replace_answers
+from .validation import normalize_answers
+
+
+ARCHIVED_ORGANIZATIONS_KEY = 'archived-organization-ids'
+
+
+def get_archived_organization_ids():
+    """
+    Cached set of archived organization ids so organization
+    scoped querysets do not need to join Organization. Invalidation
+    only reaches the cache of the current process, the entry expires
+    so other processes catch up within SURVEY_ARCHIVED_CACHE_TIMEOUT
+    """
+    archived = cache.get(ARCHIVED_ORGANIZATIONS_KEY)
+    if archived is None:
+        archived = set(Organization.objects.filter(is_archived=True).values_list('id', flat=True))
+        cache.set(ARCHIVED_ORGANIZATIONS_KEY, archived,
+                  getattr(settings, 'SURVEY_ARCHIVED_CACHE_TIMEOUT', 60))
+    return archived
+
+
+def invalidate_archived_organizations():
+    """
+    Forgetting the cached archived organization ids
+    """
+    cache.delete(ARCHIVED_ORGANIZATIONS_KEY)
+
+
+def scope_to_organization(queryset, organization_id, field='organization_id'):
+    """
+    Limiting a queryset to one active organization without a join
+    :param queryset:
+    :param organization_id:
+    :param field: lookup of the organization id on the queryset model
+    """
+    if organization_id in get_archived_organization_ids():
+        return queryset.none()
+    return queryset.filter(**{field: organization_id})
+
+
+def assign_employees(survey, employee_ids):
+    """
+    Replacing the assignees of a survey, existing assignments keep
+    their status. Returns the ids of the newly assigned employees
+    :param survey:
+    :param employee_ids:
+    """
+    employee_ids = set(employee_ids)
+    assignments = SurveyAssignment.objects.filter(survey_id=survey.id)
+    existing = set(assignments.values_list('employee_id', flat=True))
+    assignments.exclude(employee_id__in=employee_ids).delete()
+    added = employee_ids - existing
+    SurveyAssignment.objects.bulk_create([
+        SurveyAssignment(survey_id=survey.id, employee_id=employee_id)
+        for employee_id in sorted(added)])
+    return added
+
+
+def add_questions(survey, question_ids, section=None):
+    """
+    Appending questions to a survey after its last question, questions
+    already in the survey are skipped. Returns the ids of the added questions
+    :param survey:
+    :param question_ids: ids in the order the questions are shown
+    :param section: optional section of the added questions
+    """
+    rows = SurveyQuestion.objects.filter(survey_id=survey.id)
+    existing = set(rows.values_list('question_id', flat=True))
+    added = [question_id for question_id in dict.fromkeys(question_ids)
+             if question_id not in existing]
+    last = rows.aggregate(last=Max('position'))['last'] or 0
+    SurveyQuestion.objects.bulk_create([
+        SurveyQuestion(survey_id=survey.id, question_id=question_id, section=section,
+                       position=last + offset)
+        for offset, question_id in enumerate(added, 1)])
+    bump_version(survey.organization_id)
+    return added
+
+
+def set_questions(survey, question_ids):
+    """
+    Replacing the questions of a survey, remaining questions keep
+    their position and section and new ones are appended
+    :param survey:
+    :param question_ids:
+    """
+    SurveyQuestion.objects.filter(survey_id=survey.id).exclude(
+        question_id__in=question_ids).delete()
+    return add_questions(survey, question_ids)
+
+
+def get_response_index(survey_id, employee_id, question_ids=None):
+    """
+    Building answers of an employee for a survey
+    keyed by question id with a single query
+    :param survey_id:
+    :param employee_id:
+    :param question_ids: optional questions to limit the answers to
+    """
+    answers = SurveyFeedback.objects.filter(survey_id=survey_id, employee_id=employee_id)
+    if question_ids is not None:
+        answers = answers.filter(question_id__in=question_ids)
+    index = {}
+    for answer in answers:
+        index.setdefault(answer.question_id, []).append(answer)
+    return index
+
+
+def get_employee_dashboard(emp, today=None):
+    """
+    Fetching all assignments of an employee with their surveys once
+    and splitting them into upcoming, current and expired surveys.
+    Current surveys are further split into assigned, incomplete
+    and completed surveys based on the assignment status
+    :param emp:
+    :param today:
+    """
+    today = today or localdate()
+    assignments = SurveyAssignment.objects.filter(employee_id=emp.id).select_related(
+        'survey').order_by('survey__startDatetime', 'survey_id')
+
+    upcoming_surveys = list()
+    current_surveys = list()
+    expired_surveys = list()
+    completed_survey = list()
+    assigned_survey = list()
+    incomplete_survey = list()
+    for assignment in assignments:
+        survey = assignment.survey
+        if survey.startDatetime is None or survey.endDatetime is None:
+            continue
+        if survey.startDatetime > today:
+            upcoming_surveys.append(survey)
+        elif survey.endDatetime < today:
+            expired_surveys.append(survey)
+        else:
+            current_surveys.append(survey)
+            if assignment.status == SurveyAssignment.COMPLETED:
+                completed_survey.append(survey)
+            elif assignment.status == SurveyAssignment.IN_PROGRESS:
+                incomplete_survey.append(survey)
+            else:
+                assigned_survey.append(survey)
+
+    return {'survey_list': current_surveys,
+            'upcoming_surveys': upcoming_surveys,
+            'expired_surveys': expired_surveys,
+            'current_surveys': current_surveys,
+            'completed_survey': completed_survey,
+            'assigned_survey': assigned_survey,
+            'incomplete_survey': incomplete_survey,
+            'completed_survey_count': len(completed_survey),
+            'pending_survey_count': len(assigned_survey)}
+
+
+def save_answers(survey, emp, organization_id, answers, finish=False, replace=False):
+    """
+    Saving new answers of an employee for a survey in one transaction.
+    Submitted values are checked and normalized by the cached answer
+    rules of the survey first, bad input raises ValidationError before
+    anything is written. The assignment row is locked and already
+    answered questions are fetched once under that lock,
+    new answers are bulk created and finishing flags every answer
+    of the employee with a single update. The employee's assignment
+    status and the survey result summary are updated in the same
+    transaction. Already answered questions are skipped unless replace
+    is set, then changed answers are updated in place and answers
+    submitted blank are removed. The revision of the assignment moves
+    on with every save changing the answers
+    :param survey:
+    :param emp:
+    :param organization_id:
+    :param answers: mapping of question id to list of submitted values
+    :param finish:
+    :param replace:
+    """
+    normalized = normalize_answers(get_answer_rules(survey.id, organization_id), answers)
+    assignment = SurveyAssignment.objects.filter(survey_id=survey.id, employee_id=emp.id)
+    with transaction.atomic():
+        # Saves of the same employee and survey wait here for each other,
+        # so answered questions are read after an earlier save committed
+        status = next(iter(assignment.select_for_update().values_list('status', flat=True)),
+                      None)
+        answered_ids = set(SurveyFeedback.objects.filter(
+            survey_id=survey.id, employee_id=emp.id).values_list('question_id', flat=True))
+
+        new_answers = list()
+        new_choices = dict()
+        changed = dict()
+        for question_id, value in normalized.items():
+            answer = SurveyFeedback(survey_id=survey.id, employee_id=emp.id,
+                                    question_id=question_id,
+                                    organization_id=organization_id,
+                                    response=value.response,
+                                    integer_response=value.integer_response, flag=finish)
+            if question_id not in answered_ids:
+                new_choices[question_id] = set(value.choice_ids)
+                new_answers.append(answer)
+            elif replace:
+                changed[question_id] = (answer, set(value.choice_ids))
+
+        # Blank submissions of answered questions clear them
+        cleared = {question_id for question_id in answers
+                   if question_id not in normalized and question_id in answered_ids} \
+            if replace else set()
+        first_response = bool(new_answers) and not answered_ids
+        SurveyFeedback.objects.bulk_create(new_answers)
+        link_answer_choices(survey.id, emp.id, new_choices)
+        updated = replace_changed_answers(survey.id, emp.id, changed)
+        updated += remove_cleared_answers(survey.id, emp.id, cleared)
+        # The locked status decides the transition, so the status and
+        # the revision of the assignment move in one update
+        changes = dict()
+        completed = False
+        if finish and (new_answers or answered_ids):
+            SurveyFeedback.objects.filter(survey_id=survey.id, employee_id=emp.id,
+                                          flag=False).update(flag=True, updated_date=localdate())
+            if status is not None and status != SurveyAssignment.COMPLETED:
+                changes.update(status=SurveyAssignment.COMPLETED, completed_at=now(),
+                               started_at=Coalesce('started_at', Value(now())))
+                completed = True
+        elif new_answers and status == SurveyAssignment.ASSIGNED:
+            changes.update(status=SurveyAssignment.IN_PROGRESS, started_at=now())
+        if new_answers or updated or completed:
+            changes['revision'] = F('revision') + 1
+        if changes:
+            assignment.update(**changes)
+        record_answers(survey.id, new_answers, new_choices, first_response=first_response,
+                       completed=completed)
+    return len(new_answers) + updated
+
+
+def remove_cleared_answers(survey_id, employee_id, question_ids):
+    """
+    Deleting stored answers of questions submitted blank and taking
+    them out of the survey summary. Finished answers are kept.
+    Returns the number of removed answers
+    :param survey_id:
+    :param employee_id:
+    :param question_ids: questions whose answers were cleared
+    """
+    if not question_ids:
+        return 0
+    stored = list(SurveyFeedback.objects.filter(
+        survey_id=survey_id, employee_id=employee_id, flag=False,
+        question_id__in=list(question_ids)).prefetch_related('choices'))
+    if not stored:
+        return 0
+    choices = {answer.question_id: {choice.id for choice in answer.choices.all()}
+               for answer in stored}
+    SurveyFeedback.objects.filter(id__in=[answer.id for answer in stored]).delete()
+    last_response = not SurveyFeedback.objects.filter(survey_id=survey_id,
+                                                      employee_id=employee_id).exists()
+    remove_answers(survey_id, stored, choices, last_response=last_response)
+    return len(stored)
+
+
+def replace_changed_answers(survey_id, employee_id, changed):
+    """
+    Updating stored answers whose submitted values differ, with one
+    CASE update for the values and updated date and one bulk insert
+    for the choices. Finished answers are kept.
+    Returns the number of updated answers
+    :param survey_id:
+    :param employee_id:
+    :param changed: mapping of question id to (unsaved answer, set of picked choice ids)
+    """
+    if not changed:
+        return 0
+    stored = SurveyFeedback.objects.filter(
+        survey_id=survey_id, employee_id=employee_id, flag=False,
+        question_id__in=list(changed)).prefetch_related('choices')
+    old_answers, old_choices, answers, new_choices = [], {}, [], {}
+    for answer in stored:
+        submitted, picked = changed[answer.question_id]
+        previous = {choice.id for choice in answer.choices.all()}
+        if (answer.response, answer.integer_response, previous) == \
+                (submitted.response, submitted.integer_response, picked):
+            continue
+        old_answers.append(SurveyFeedback(question_id=answer.question_id,
+                                          integer_response=answer.integer_response))
+        old_choices[answer.question_id] = previous
+        answer.response = submitted.response
+        answer.integer_response = submitted.integer_response
+        answer.updated_date = localdate()
+        answers.append(answer)
+        new_choices[answer.question_id] = picked
+    if not answers:
+        return 0
+    SurveyFeedback.objects.bulk_update(answers, ['response', 'integer_response', 'updated_date'])
+    through = SurveyFeedback.choices.through
+    through.objects.filter(surveyfeedback_id__in=[answer.id for answer in answers]).delete()
+    through.objects.bulk_create([
+        through(surveyfeedback_id=answer.id, questionchoice_id=choice_id)
+        for answer in answers for choice_id in new_choices[answer.question_id]])
+    replace_answers(survey_id, old_answers, old_choices, answers, new_choices)
+    return len(answers)
+
+
+def get_revision(survey_id, employee_id):
+    """
+    Current answer revision of an employee's assignment
+    :param survey_id:
+    :param employee_id:
+    """
+    return SurveyAssignment.objects.filter(survey_id=survey_id, employee_id=employee_id) \
+        .values_list('revision', flat=True).first()
+
+
+def link_answer_choices(survey_id, employee_id, new_choices):
+    """
+    Linking freshly created answers to their choices with one bulk insert
+    :param survey_id:
+    :param employee_id:
+    :param new_choices: mapping of question id to set of choice ids
+    """
+    new_choices = {question_id: ids for question_id, ids in new_choices.items() if ids}
+    if not new_choices:
+        return
+    through = SurveyFeedback.choices.through
+    answer_ids = SurveyFeedback.objects.filter(
+        survey_id=survey_id, employee_id=employee_id,
+        question_id__in=list(new_choices)).values_list('question_id', 'id')
+    through.objects.bulk_create([
+        through(surveyfeedback_id=answer_id, questionchoice_id=choice_id)
+        for question_id, answer_id in answer_ids for choice_id in new_choices[question_id]])
+
+
+def get_choice_tally(survey_id, question_id):
+    """
+    Counting answers per choice of a question with an indexed GROUP BY,
+    dropped choices are listed while answers still pick them
+    :param survey_id:
+    :param question_id:
+    """
+    return list(QuestionChoice.objects.filter(question_id=question_id).annotate(
+        total=Count('surveyfeedback', filter=Q(surveyfeedback__survey_id=survey_id))
+    ).filter(Q(is_active=True) | Q(total__gt=0)).order_by(
+        'position').values_list('label', 'total'))
@@ -0,0 +1,212 @@
+"""
+This is survey results file keeps the precomputed
+result summaries in step with saved answers
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, Value, When
+from .models import (ChoiceResultCount, IntegerResultCount, QuestionResultSummary,
+                     SurveyAssignment, SurveyFeedback, SurveyResultSummary)
+
+
+def ensure_rows(model, key_fields, keys):
+    """
+    Getting ids of rows identified by key fields, missing rows are
+    bulk created first. Rows a concurrent save created in the meantime
+    are skipped by the insert and picked up by the second fetch
+    :param model:
+    :param key_fields: names of the fields forming the key
+    :param keys: set of key tuples
+    """
+    def fetch():
+        rows = model.objects.filter(**{key_fields[0] + '__in': {key[0] for key in keys}})
+        return {row[:-1]: row[-1] for row in rows.values_list(*key_fields, 'id')}
+
+    ids = fetch()
+    missing = [key for key in keys if key not in ids]
+    if missing:
+        model.objects.bulk_create([model(**dict(zip(key_fields, key))) for key in missing],
+                                  ignore_conflicts=True)
+        ids = fetch()
+    return {key: ids[key] for key in keys}
+
+
+def record_answers(survey_id, answers, new_choices, first_response=False, completed=False):
+    """
+    Adding freshly saved answers of one employee to the survey summary.
+    Counters are moved with F() updates so concurrent saves do not
+    overwrite each other
+    :param survey_id:
+    :param answers: new SurveyFeedback objects
+    :param new_choices: mapping of question id to set of picked choice ids
+    :param first_response: first answers of the employee for this survey
+    :param completed: the employee just finished the survey
+    """
+    summary, _ = SurveyResultSummary.objects.get_or_create(survey_id=survey_id)
+    if first_response or completed:
+        SurveyResultSummary.objects.filter(id=summary.id).update(
+            respondent_count=F('respondent_count') + int(first_response),
+            completed_count=F('completed_count') + int(completed))
+    count_answers(summary.id, answers, new_choices)
+
+
+def replace_answers(survey_id, old_answers, old_choices, answers, new_choices):
+    """
+    Moving replaced answers of one employee in the survey summary from
+    their previous to their new values. Integer bounds of the replaced
+    questions are recomputed from the answers, they cannot be narrowed
+    by counters
+    :param survey_id:
+    :param old_answers: SurveyFeedback objects holding the previous values
+    :param old_choices: mapping of question id to set of previously picked choice ids
+    :param answers: the same answers holding the new values
+    :param new_choices: mapping of question id to set of picked choice ids
+    """
+    if not answers:
+        return
+    summary, _ = SurveyResultSummary.objects.get_or_create(survey_id=survey_id)
+    count_answers(summary.id, old_answers, old_choices, delta=-1)
+    count_answers(summary.id, answers, new_choices)
+    refresh_integer_bounds(summary.id, survey_id, old_answers)
+
+
+def remove_answers(survey_id, answers, choices, last_response=False):
+    """
+    Taking cleared answers of one employee out of the survey summary
+    :param survey_id:
+    :param answers: SurveyFeedback objects holding the removed values
+    :param choices: mapping of question id to set of previously picked choice ids
+    :param last_response: no answers of the employee are left for this survey
+    """
+    if not answers:
+        return
+    summary, _ = SurveyResultSummary.objects.get_or_create(survey_id=survey_id)
+    if last_response:
+        SurveyResultSummary.objects.filter(id=summary.id).update(
+            respondent_count=F('respondent_count') - 1)
+    count_answers(summary.id, answers, choices, delta=-1)
+    refresh_integer_bounds(summary.id, survey_id, answers)
+
+
+def refresh_integer_bounds(summary_id, survey_id, old_answers):
+    """
+    Recomputing integer bounds of questions that lost a value from the
+    stored answers, they cannot be narrowed by counters
+    :param summary_id:
+    :param survey_id:
+    :param old_answers: SurveyFeedback objects holding the previous values
+    """
+    question_ids = {answer.question_id for answer in old_answers
+                    if answer.integer_response is not None}
+    if not question_ids:
+        return
+    bounds = {row['question_id']: row for row in SurveyFeedback.objects.filter(
+        survey_id=survey_id, question_id__in=question_ids).values('question_id').annotate(
+            low=Min('integer_response'), high=Max('integer_response')).order_by()}
+    for question_id in question_ids:
+        row = bounds.get(question_id, {})
+        QuestionResultSummary.objects.filter(summary_id=summary_id,
+                                             question_id=question_id).update(
+            integer_min=row.get('low'), integer_max=row.get('high'))
+
+
+def count_answers(summary_id, answers, choices, delta=1):
+    """
+    Moving the question, choice and integer counters of a summary by
+    delta for every answer. Integer bounds are only widened
+    :param summary_id:
+    :param answers: SurveyFeedback objects
+    :param choices: mapping of question id to set of picked choice ids
+    :param delta: 1 to add the answers, -1 to take them out
+    """
+    if not answers:
+        return
+
+    question_ids = ensure_rows(QuestionResultSummary, ('summary_id', 'question_id'),
+                               {(summary_id, answer.question_id) for answer in answers})
+    question_ids = {question_id: row_id for (_, question_id), row_id in question_ids.items()}
+    QuestionResultSummary.objects.filter(id__in=question_ids.values()).update(
+        answer_count=F('answer_count') + delta)
+
+    choice_keys = {(question_ids[question_id], choice_id)
+                   for question_id, choice_ids in choices.items() for choice_id in choice_ids}
+    if choice_keys:
+        choice_ids = ensure_rows(ChoiceResultCount, ('question_summary_id', 'choice_id'),
+                                 choice_keys)
+        ChoiceResultCount.objects.filter(id__in=choice_ids.values()).update(
+            total=F('total') + delta)
+
+    integer_values = {}
+    for answer in answers:
+        if answer.integer_response is not None:
+            integer_values.setdefault(question_ids[answer.question_id], []).append(
+                answer.integer_response)
+    if not integer_values:
+        return
+    bucket_ids = ensure_rows(IntegerResultCount, ('question_summary_id', 'value'),
+                             {(row_id, value) for row_id, values in integer_values.items()
+                              for value in values})
+    IntegerResultCount.objects.filter(id__in=bucket_ids.values()).update(
+        total=F('total') + delta)
+
+    # Statistics of every question move in one UPDATE, one WHEN per question row
+    def per_row(field, change):
+        return Case(*[When(id=row_id, then=F(field) + change(values))
+                      for row_id, values in integer_values.items()], default=F(field))
+
+    updates = {'integer_count': per_row('integer_count', lambda values: delta * len(values)),
+               'integer_sum': per_row('integer_sum', lambda values: delta * sum(values))}
+    if delta > 0:
+        updates.update(
+            integer_min=Case(*[When(Q(id=row_id) & (Q(integer_min__isnull=True) |
+                                                    Q(integer_min__gt=min(values))),
+                                    then=Value(min(values)))
+                               for row_id, values in integer_values.items()],
+                             default=F('integer_min')),
+            integer_max=Case(*[When(Q(id=row_id) & (Q(integer_max__isnull=True) |
+                                                    Q(integer_max__lt=max(values))),
+                                    then=Value(max(values)))
+                               for row_id, values in integer_values.items()],
+                             default=F('integer_max')))
+    QuestionResultSummary.objects.filter(id__in=integer_values).update(**updates)
+
+
+def rebuild_summary(survey_id):
+    """
+    Recomputing the summary of a survey from all of its answers
+    :param survey_id:
+    """
+    answers = SurveyFeedback.objects.filter(survey_id=survey_id)
+    with transaction.atomic():
+        SurveyResultSummary.objects.filter(survey_id=survey_id).delete()
+        summary = SurveyResultSummary.objects.create(
+            survey_id=survey_id,
+            respondent_count=answers.values('employee_id').distinct().count(),
+            completed_count=SurveyAssignment.objects.filter(
+                survey_id=survey_id, status=SurveyAssignment.COMPLETED).count())
+
+        QuestionResultSummary.objects.bulk_create([
+            QuestionResultSummary(summary=summary, question_id=row['question_id'],
+                                  answer_count=row['answer_count'],
+                                  integer_count=row['integer_count'],
+                                  integer_sum=row['integer_sum'] or 0,
+                                  integer_min=row['integer_min'],
+                                  integer_max=row['integer_max'])
+            for row in answers.values('question_id').annotate(
+                answer_count=Count('id'), integer_count=Count('integer_response'),
+                integer_sum=Sum('integer_response'), integer_min=Min('integer_response'),
+                integer_max=Max('integer_response')).order_by()])
+        question_ids = dict(summary.questionresultsummary_set.values_list('question_id', 'id'))
+
+        through = SurveyFeedback.choices.through.objects.filter(surveyfeedback__survey_id=survey_id)
+        ChoiceResultCount.objects.bulk_create([
+            ChoiceResultCount(question_summary_id=question_ids[row['surveyfeedback__question_id']],
+                              choice_id=row['questionchoice_id'], total=row['total'])
+            for row in through.values('surveyfeedback__question_id', 'questionchoice_id').annotate(
+                total=Count('id')).order_by()])
+
+        IntegerResultCount.objects.bulk_create([
+            IntegerResultCount(question_summary_id=question_ids[row['question_id']],
+                               value=row['integer_response'], total=row['total'])
+            for row in answers.filter(integer_response__isnull=False).values(
+                'question_id', 'integer_response').annotate(total=Count('id')).order_by()])
+    return summary
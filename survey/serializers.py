@@ -0,0 +1,76 @@
+"""
+This is serializers file used by the employee JSON API
+"""
+from rest_framework import serializers
+from .models import Employee, Question, Survey, SurveySection
+
+
+class EmployeeSerializer(serializers.ModelSerializer):
+    """
+    Identity of the logged-in employee
+    """
+
+    class Meta:
+        model = Employee
+        fields = ('id', 'emp_name', 'emp_username')
+
+
+class SurveySerializer(serializers.ModelSerializer):
+    """
+    Survey without its questions
+    """
+
+    class Meta:
+        model = Survey
+        fields = ('id', 'survey_name', 'description', 'startDatetime', 'endDatetime')
+
+
+class SectionSerializer(serializers.ModelSerializer):
+    """
+    Section of a survey
+    """
+
+    class Meta:
+        model = SurveySection
+        fields = ('id', 'title', 'position')
+
+
+class QuestionSerializer(serializers.ModelSerializer):
+    """
+    Question with the labels of its choices and its section in the survey
+    """
+    choices = serializers.ListField(source='get_choice_labels', child=serializers.CharField())
+    section = serializers.IntegerField(source='section_id', allow_null=True)
+
+    class Meta:
+        model = Question
+        fields = ('id', 'question', 'question_type', 'is_required', 'choices', 'section')
+
+
+class DefinitionSerializer(serializers.Serializer):
+    """
+    Survey definition as cached by survey.definitions, questions in survey order
+    """
+    survey = SurveySerializer()
+    sections = SectionSerializer(many=True)
+    questions = QuestionSerializer(many=True)
+
+
+class AnswerBatchSerializer(serializers.Serializer):
+    """
+    Answers submitted in one request, keyed by question id. Questions
+    left out are not touched, answered questions are replaced and
+    questions submitted blank are cleared
+    """
+    answers = serializers.DictField(child=serializers.ListField(
+        child=serializers.CharField(allow_blank=True)))
+    finish = serializers.BooleanField(required=False, default=False)
+
+    def validate_answers(self, value):
+        """
+        Converting the question ids to integers
+        :param value:
+        """
+        if not all(str(key).isdigit() for key in value):
+            raise serializers.ValidationError('Answers must be keyed by question id.')
+        return {int(key): values for key, values in value.items()}
@@ -0,0 +1,51 @@
+"""
+This is signals file invalidating cached survey definitions,
+archived organizations and employee identities when they change
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .definitions import bump_version
+from .identity import forget_employee
+from .models import Employee, Organization, Question, Survey, SurveyQuestion, SurveySection
+from .queries import invalidate_archived_organizations
+
+
+@receiver(post_save, sender=Survey)
+@receiver(post_delete, sender=Survey)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_definitions(sender, instance, **kwargs):
+    """
+    Invalidating definitions of the organization of a changed survey or question
+    """
+    bump_version(instance.organization_id)
+
+
+@receiver(post_save, sender=SurveyQuestion)
+@receiver(post_save, sender=SurveySection)
+@receiver(post_delete, sender=SurveySection)
+def invalidate_survey_layout(sender, instance, **kwargs):
+    """
+    Invalidating definitions when the position or section of survey questions change,
+    adding and removing questions through survey.queries invalidates on its own
+    """
+    bump_version(instance.survey.organization_id)
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_organizations(sender, instance, **kwargs):
+    """
+    Forgetting cached archived organizations when an organization changes
+    """
+    invalidate_archived_organizations()
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_employee_identity(sender, instance, **kwargs):
+    """
+    Checking session identities of a changed or deleted employee again
+    """
+    if not kwargs.get('created'):
+        forget_employee(instance.id)
@@ -0,0 +1,59 @@
+// Autosave of the question page, only questions changed since the
+// last autosave are posted once the employee stops typing for a moment.
+// Questions emptied by the employee are posted blank, which clears them
+(function ($) {
+  var DELAY = 1500;
+  var $form = $('form[data-autosave]');
+  if (!$form.length) {
+    return;
+  }
+  var $status = $('#autosave-status');
+  var changed = {};
+  var timer = null;
+
+  function valuesOf(name) {
+    return $.map($form.find('[name="' + name + '"]').serializeArray(), function (field) {
+      return field.value;
+    });
+  }
+
+  function save() {
+    var names = Object.keys(changed);
+    if (!names.length) {
+      return;
+    }
+    changed = {};
+    var answers = {};
+    $.each(names, function (_, name) {
+      answers[name] = valuesOf(name);
+    });
+    $status.text('Saving...');
+    $.ajax({
+      url: $form.data('autosave'),
+      method: 'POST',
+      contentType: 'application/json',
+      data: JSON.stringify({answers: answers}),
+      headers: {'X-CSRFToken': $form.find('[name="csrfmiddlewaretoken"]').val()}
+    }).done(function () {
+      $status.text('All changes saved');
+    }).fail(function (xhr) {
+      $.each(names, function (_, name) {
+        changed[name] = true;
+      });
+      // Rejected answers wait for the employee to correct them
+      $status.text(xhr.status === 400 ? 'Some answers are not valid' : 'Changes not saved yet');
+    });
+  }
+
+  $form.on('input change', 'input, textarea, select', function () {
+    if (!/^\d+$/.test(this.name)) {
+      return;
+    }
+    changed[this.name] = true;
+    clearTimeout(timer);
+    timer = setTimeout(save, DELAY);
+  });
+  $form.on('submit', function () {
+    clearTimeout(timer);
+  });
+})(jQuery);
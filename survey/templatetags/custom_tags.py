@@ -1,7 +1,41 @@
+import warnings
 from django import template
+from django.utils.safestring import mark_safe
 register = template.Library()
 
 
+@register.filter
+def answers_for(response_index, question_id):
+    """
+    Looking up answers of a question in the
+    precomputed response index without any query
+    """
+    return response_index.get(question_id, [])
+
+
+@register.filter
+def fragment_for(fragments, question_id):
+    """
+    Cached input of a question rendered by survey.definitions
+    """
+    return mark_safe(fragments.get(question_id, ''))
+
+
+@register.filter
+def picked(answers, label):
+    """
+    Whether a choice label is part of the saved answer of a question
+    """
+    if not answers or answers[0].response is None:
+        return False
+    return label.strip() in {value.strip() for value in answers[0].response.split(',')}
+
+
 @register.filter
 def in_result(queryset, question_id):
+    """
+    Deprecated, build a response index and use answers_for instead
+    """
+    warnings.warn("in_result is deprecated, use answers_for with a response index",
+                  DeprecationWarning, stacklevel=2)
     return queryset.filter(question_id=question_id)
@@ -2,11 +2,50 @@
 This is the test file contains all
 test cases of modules, views, middleware
 """
+import csv
+import datetime
+import gzip
+import json
+import os
+import re
+import tarfile
+import tempfile
 import unittest
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+from django.contrib.auth.models import Permission
 from django.core import mail
-from django.test import TestCase, modify_settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.template import TemplateDoesNotExist, engines
+from django.db import connection, IntegrityError
+from django.db.models import F
+from django.db.models.query import QuerySet
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import quote_etag
+from django.utils import timezone
+import tablib
 from selenium import webdriver
-from survey.models import Organization, Employee, User, Question
+from survey.archives import dump_task, plan_tasks
+from survey.benchmarks import BASELINE_PATH, compare, explain_feedback, load_baseline, run_flows, \
+    seed, seed_feedback, summarize, time_question_list
+from survey.definitions import get_etag
+from survey.profiling import PROFILES, QueryBudgetExceeded
+from survey.admin import EmployeeResource, archive_action, restore_action
+from survey.identity import IDENTITY_FIELDS, remember_employee
+from survey.imports import import_employees, read_csv
+from survey.mail_queue import enqueue_mail, send_queued_mail
+from survey.queries import ARCHIVED_ORGANIZATIONS_KEY, add_questions, get_choice_tally, \
+    get_archived_organization_ids, invalidate_archived_organizations, save_answers, \
+    set_questions
+from survey.models import Organization, Employee, User, Question, Survey, SurveyFeedback, \
+    OutboundEmail, NotificationLog, SurveyAssignment, SurveyResultSummary, SurveyQuestion, \
+    SurveySection, QuestionChoice, QuestionResultSummary
 
 
 @modify_settings(MIDDLEWARE_CLASSES={
@@ -58,6 +97,84 @@ class EmailTest(TestCase):
         self.assertEqual(mail.outbox[0].subject, 'Subject here')
 
 
+class MailQueueTest(TestCase):
+    """
+    Outbound mail queue Test Cases
+    """
+
+    def test_worker_drains_queue(self):
+        """
+        testing queued emails are sent in batches by the worker
+        """
+        enqueue_mail('Survey Feedback ', 'body', ['a@example.com', 'b@example.com',
+                                                  'c@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        call_command('send_queued_mail', batch_size=2, stdout=StringIO())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['a@example.com', 'b@example.com', 'c@example.com'])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), 3)
+
+    def test_worker_retries_with_backoff(self):
+        """
+        testing unreachable servers count as attempts, retried later and finally failed
+        """
+        refused = mock.Mock(open=mock.Mock(side_effect=ConnectionRefusedError('refused')))
+        self.assertEqual(send_queued_mail(connection=refused), {'sent': 0, 'retried': 0,
+                                                                'failed': 0})
+        refused.open.assert_not_called()
+
+        enqueue_mail('Survey Feedback ', 'body', ['a@example.com'])
+        stats = send_queued_mail(max_attempts=2, connection=refused)
+        self.assertEqual(stats['retried'], 1)
+        message = OutboundEmail.objects.get()
+        self.assertEqual((message.status, message.attempts), (OutboundEmail.PENDING, 1))
+        self.assertGreater(message.next_attempt, message.created_date)
+        self.assertEqual(send_queued_mail(max_attempts=2, connection=refused)['retried'], 0)
+
+        OutboundEmail.objects.update(next_attempt=message.created_date)
+        self.assertEqual(send_queued_mail(max_attempts=2, connection=refused)['failed'], 1)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_retries_only_unsent(self):
+        """
+        testing messages delivered before a failure are not sent again
+        """
+        enqueue_mail('Survey Feedback ', 'body', ['a@example.com', 'b@example.com',
+                                                  'c@example.com'])
+        locmem = mail.get_connection()
+
+        def fail_second_message(messages):
+            if len(mail.outbox) == 1:
+                raise SMTPException('down')
+            return locmem.send_messages(messages)
+
+        flaky = mock.Mock(send_messages=mock.Mock(side_effect=fail_second_message))
+        stats = send_queued_mail(connection=flaky)
+        self.assertEqual(stats, {'sent': 1, 'retried': 2, 'failed': 0})
+        flaky.close.assert_called()
+        OutboundEmail.objects.update(next_attempt=timezone.now())
+        self.assertEqual(send_queued_mail()['sent'], 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['a@example.com', 'b@example.com', 'c@example.com'])
+
+    def test_worker_retries_unaccepted(self):
+        """
+        testing messages the backend does not accept are retried and not sent in a loop
+        """
+        enqueue_mail('Survey Feedback ', 'body', ['a@example.com'])
+        rejecting = mock.Mock(send_messages=mock.Mock(return_value=0))
+        stats = send_queued_mail(connection=rejecting, max_attempts=2)
+        self.assertEqual(stats, {'sent': 0, 'retried': 1, 'failed': 0})
+        self.assertEqual(rejecting.send_messages.call_count, 1)
+        message = OutboundEmail.objects.get()
+        self.assertEqual(message.status, OutboundEmail.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt, timezone.now())
+        OutboundEmail.objects.update(next_attempt=timezone.now())
+        self.assertEqual(send_queued_mail(connection=rejecting, max_attempts=2)['failed'], 1)
+
+
 class ModelsTest(TestCase):
     """
     Model Test Cases
@@ -149,6 +266,1645 @@ class ModelsTest(TestCase):
         self.assertEqual(question.__str__(), question.question)
 
 
+class QuestionChoiceTest(TestCase):
+    """
+    Question choice normalization Test Cases
+    """
+
+    def test_choices_follow_question(self):
+        """
+        testing choice rows are synced whenever a question is saved
+        """
+        org = ModelsTest.create_organization()
+        question = ModelsTest.create_question(question_type=Question.RADIO,
+                                              choices='good, bad,, good', organization=org)
+        self.assertEqual(list(question.questionchoice_set.values_list('label', 'position')),
+                         [('good', 0), ('bad', 1)])
+        survey = Survey.objects.create(survey_name='survey', description='CSR', organization=org)
+        answer = SurveyFeedback.objects.create(
+            survey=survey, question=question, organization=org, response='good', flag=True,
+            employee=ModelsTest.create_employee(organization=org))
+        answer.choices.set(question.questionchoice_set.filter(label='good'))
+        question.choices = 'bad, excellent'
+        question.save()
+        self.assertEqual(list(question.questionchoice_set.filter(is_active=True).values_list(
+            'label', 'position')), [('bad', 0), ('excellent', 1)])
+        self.assertEqual(list(answer.choices.values_list('label', 'is_active')),
+                         [('good', False)])
+        self.assertEqual(get_choice_tally(survey.id, question.id),
+                         [('good', 1), ('bad', 0), ('excellent', 0)])
+        question.choices = 'good, bad'
+        question.save()
+        self.assertEqual(list(question.questionchoice_set.filter(is_active=True).values_list(
+            'label', 'position')), [('good', 0), ('bad', 1)])
+        question.question_type = Question.TEXT
+        question.save()
+        self.assertFalse(question.questionchoice_set.filter(is_active=True).exists())
+
+    def test_bulk_created_questions_get_choices(self):
+        """
+        testing choices of bulk created questions are synced in one pass
+        """
+        org = ModelsTest.create_organization()
+        Question.objects.bulk_create([
+            Question(question='q%s' % index, question_type=Question.SELECT,
+                     choices='yes, no', organization=org) for index in range(3)])
+        questions = list(Question.objects.filter(organization=org))
+        with self.assertNumQueries(2):
+            Question.sync_all_choices(questions)
+        self.assertEqual(QuestionChoice.objects.filter(question__organization=org).count(), 6)
+
+    def test_choice_questions_need_choices(self):
+        """
+        testing choice questions are refused without a list of choices
+        """
+        question = Question(question='How was it ?', question_type=Question.RADIO,
+                            choices='good', organization=ModelsTest.create_organization())
+        with self.assertRaises(ValidationError) as raised:
+            question.full_clean()
+        self.assertEqual(list(raised.exception.message_dict), ['choices'])
+        question.question_type = Question.TEXT
+        question.full_clean()
+
+
+class EmployeeTestMixin:
+    """
+    Logged-in employee fixtures shared by view Test Cases
+    """
+
+    def setUp(self):
+        """
+        Setting up logged-in employee with its organization
+        """
+        cache.clear()
+        self.org = ModelsTest.create_organization()
+        self.emp = ModelsTest.create_employee(organization=self.org)
+        self.user = User.objects.create(username='admin', organization=self.org)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['username'] = self.emp.emp_username
+        remember_employee(session, self.emp)
+        session.save()
+
+    def create_surveys(self, count, start_offset=-1, end_offset=1):
+        """
+        Method for create surveys assigned to the logged-in employee
+        :param count:
+        :param start_offset:
+        :param end_offset:
+        """
+        today = datetime.date.today()
+        Survey.objects.bulk_create([
+            Survey(survey_name='survey %s' % index, description='CSR',
+                   organization=self.org,
+                   startDatetime=today + datetime.timedelta(days=start_offset),
+                   endDatetime=today + datetime.timedelta(days=end_offset))
+            for index in range(count)])
+        surveys = list(Survey.objects.filter(organization=self.org).order_by('-id')[:count])
+        SurveyAssignment.objects.bulk_create([
+            SurveyAssignment(survey_id=survey.id, employee_id=self.emp.id)
+            for survey in surveys])
+        return surveys
+
+    def create_questions(self, count, survey=None):
+        """
+        Method for create questions optionally assigned to a survey
+        :param count:
+        :param survey:
+        """
+        Question.objects.bulk_create([
+            Question(question='question %s' % index, question_type=Question.RADIO,
+                     choices='good, bad, very good', organization=self.org)
+            for index in range(count)])
+        questions = list(Question.objects.filter(organization=self.org).order_by('-id')[:count])
+        Question.sync_all_choices(questions)
+        if survey is not None:
+            add_questions(survey, [question.id for question in questions])
+        return questions
+
+
+class EmployeeDashboardTest(EmployeeTestMixin, TestCase):
+    """
+    Employee dashboard Test Cases
+    """
+
+    def dashboard_query_count(self):
+        """
+        Counting queries issued by the dashboard view
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('employee'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_dashboard_split(self):
+        """
+        testing surveys are split by date and assignment status
+        """
+        upcoming = self.create_surveys(1, start_offset=2, end_offset=3)[0]
+        expired = self.create_surveys(1, start_offset=-3, end_offset=-2)[0]
+        assigned, incomplete, completed = self.create_surveys(3)
+        for survey, status in ((incomplete, SurveyAssignment.IN_PROGRESS),
+                               (completed, SurveyAssignment.COMPLETED)):
+            SurveyAssignment.objects.filter(survey=survey).update(status=status)
+
+        response = self.client.get(reverse('employee'))
+        self.assertEqual(list(response.context['upcoming_surveys']), [upcoming])
+        self.assertEqual(list(response.context['expired_surveys']), [expired])
+        self.assertEqual(set(response.context['current_surveys']),
+                         {assigned, incomplete, completed})
+        self.assertEqual(response.context['assigned_survey'], [assigned])
+        self.assertEqual(response.context['incomplete_survey'], [incomplete])
+        self.assertEqual(response.context['completed_survey'], [completed])
+        self.assertEqual(response.context['completed_survey_count'], 1)
+        self.assertEqual(response.context['pending_survey_count'], 1)
+
+    def test_dashboard_query_count(self):
+        """
+        testing dashboard issues a fixed number of queries
+        """
+        self.create_surveys(1)
+        single = self.dashboard_query_count()
+        self.create_surveys(499)
+        self.assertEqual(self.dashboard_query_count(), single)
+
+
+class QuestionListTest(EmployeeTestMixin, TestCase):
+    """
+    Question list Test Cases
+    """
+
+    def question_list_query_count(self, survey):
+        """
+        Counting queries issued by the question list view
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('que_list', args=[survey.id]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_answers_rendered_from_index(self):
+        """
+        testing finished answers show their response and saved ones stay editable
+        """
+        survey = self.create_surveys(1)[0]
+        finished, saved, unanswered = self.create_questions(3, survey)
+        SurveyFeedback.objects.create(employee=self.emp, survey=survey,
+                                      question=finished, organization=self.org,
+                                      response='very good answer', flag=True)
+        SurveyFeedback.objects.create(employee=self.emp, survey=survey,
+                                      question=saved, organization=self.org,
+                                      response='very good', flag=False)
+        response = self.client.get(reverse('que_list', args=[survey.id]))
+        self.assertEqual(sorted(response.context['response_index']),
+                         sorted([finished.id, saved.id]))
+        self.assertContains(response, 'very good answer')
+        self.assertNotContains(response, 'name="%s"' % finished.id)
+        self.assertContains(response, 'value="very good" name="%s" checked' % saved.id)
+        self.assertNotContains(response, 'value="good" name="%s" checked' % saved.id)
+        self.assertContains(response, 'name="%s" />' % unanswered.id, count=3)
+
+    def test_question_list_query_count(self):
+        """
+        testing answers lookup does not add queries per question
+        """
+        small = self.create_surveys(1)[0]
+        large = self.create_surveys(1)[0]
+        for survey, count in ((small, 1), (large, 80)):
+            for question in self.create_questions(count, survey):
+                SurveyFeedback.objects.create(employee=self.emp, survey=survey,
+                                              question=question, organization=self.org,
+                                              response='good', flag=False)
+        self.assertEqual(self.question_list_query_count(large),
+                         self.question_list_query_count(small))
+
+
+class InputFragmentTest(EmployeeTestMixin, TestCase):
+    """
+    Cached question input fragment Test Cases
+    """
+
+    def setUp(self):
+        """
+        Seeding a survey with one question of every input type
+        """
+        super().setUp()
+        self.survey = self.create_surveys(1)[0]
+        self.questions = self.create_questions(5, self.survey)
+        for question, question_type in zip(self.questions, (
+                Question.TEXT, Question.RADIO, Question.SELECT, Question.SELECT_MULTIPLE,
+                Question.INTEGER)):
+            question.question_type = question_type
+            question.save()
+        self.url = reverse('que_list', args=[self.survey.id])
+
+    def test_fragments_match_template_rendering(self):
+        """
+        testing cached inputs render the same page as the template and are reused
+        """
+        SurveyFeedback.objects.create(employee=self.emp, survey=self.survey,
+                                      question=self.questions[1], organization=self.org,
+                                      response='bad', flag=False)
+        cached = self.client.get(self.url)
+        self.assertEqual(sorted(cached.context['input_fragments']),
+                         sorted(question.id for question in self.questions[2:] + [self.questions[0]]))
+        with override_settings(SURVEY_INPUT_FRAGMENTS=False):
+            rendered = self.client.get(self.url)
+        self.assertIsNone(rendered.context['input_fragments'])
+        def page(response):
+            return re.sub(r'name="csrfmiddlewaretoken" value="\w+"', '', response.content.decode())
+
+        self.assertHTMLEqual(page(cached), page(rendered))
+        self.assertContains(cached, 'value="bad" name="%s" checked' % self.questions[1].id)
+
+        with mock.patch.object(cache, 'set_many') as set_many:
+            self.client.get(self.url)
+        set_many.assert_not_called()
+
+    def test_question_change_renders_new_fragment(self):
+        """
+        testing changed choices are rendered once the definition version moves
+        """
+        self.client.get(self.url)
+        radio = self.questions[1]
+        radio.choices = 'yes, no'
+        radio.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'value="no" name="%s"' % radio.id)
+        self.assertNotContains(response, 'value="bad" name="%s"' % radio.id)
+
+
+class QuestionPaginationTest(EmployeeTestMixin, TestCase):
+    """
+    Sectioned and paginated question list Test Cases
+    """
+
+    def setUp(self):
+        """
+        Seeding a survey with two loose questions and two sections
+        """
+        super().setUp()
+        self.survey = self.create_surveys(1)[0]
+        self.questions = self.create_questions(5, self.survey)
+        self.intro = SurveySection.objects.create(survey=self.survey, title='Intro', position=1)
+        self.team = SurveySection.objects.create(survey=self.survey, title='Team', position=2)
+        placements = {self.questions[0]: (self.team, 9), self.questions[1]: (self.intro, 3),
+                      self.questions[2]: (self.intro, 2)}
+        for question, (section, position) in placements.items():
+            SurveyQuestion.objects.filter(survey=self.survey, question=question).update(
+                section=section, position=position)
+        self.url = reverse('que_list', args=[self.survey.id])
+
+    def test_one_section_per_page(self):
+        """
+        testing loose questions come first and each section is a page in position order
+        """
+        SurveyFeedback.objects.create(employee=self.emp, survey=self.survey,
+                                      question=self.questions[3], organization=self.org,
+                                      response='good', flag=False)
+        cache.clear()
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.context['page_count'], 3)
+        self.assertEqual(response.context['section_title'], 'Intro')
+        self.assertEqual(response.context['question_list'], [self.questions[2], self.questions[1]])
+        self.assertEqual(response.context['response_index'], {})
+        self.assertNotContains(response, 'dataTables')
+        self.assertContains(response, 'Intro - Page 2 of 3')
+
+        response = self.client.get(self.url, {'page': 'last'})
+        self.assertEqual(response.context['question_list'], [self.questions[3], self.questions[4]])
+        self.assertEqual(list(response.context['response_index']), [self.questions[3].id])
+        response = self.client.get(self.url, {'page': 99})
+        self.assertEqual(response.context['question_list'], [self.questions[0]])
+
+    @override_settings(SURVEY_PAGE_SIZE=2)
+    def test_page_size_bounds_loose_questions(self):
+        """
+        testing questions outside sections are split by the page size
+        """
+        cache.clear()
+        questions = self.create_questions(3, self.survey)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['page_count'], 5)
+        self.assertEqual(len(response.context['question_list']), 2)
+        response = self.client.get(self.url, {'page': 3})
+        self.assertEqual(response.context['question_list'], [questions[2]])
+
+    def test_section_change_invalidates_pages(self):
+        """
+        testing section edits are shown without waiting for the definition cache
+        """
+        self.client.get(self.url)
+        self.intro.title = 'Welcome'
+        self.intro.save()
+        self.assertEqual(self.client.get(self.url, {'page': 2}).context['section_title'],
+                         'Welcome')
+
+    def test_save_moves_between_pages(self):
+        """
+        testing Next saves the answers of the page and opens the following page
+        """
+        question = self.questions[1]
+        response = self.client.post(reverse('save', args=[self.survey.id]),
+                                    {str(question.id): 'bad', 'page': '2',
+                                     'btn_response': 'Next'})
+        self.assertRedirects(response, self.url + '?page=3', fetch_redirect_response=False)
+        self.assertEqual(SurveyFeedback.objects.get(question=question).response, 'bad')
+        response = self.client.post(reverse('save', args=[self.survey.id]),
+                                    {'page': '1', 'btn_response': 'Previous'})
+        self.assertRedirects(response, self.url + '?page=1', fetch_redirect_response=False)
+
+
+class SurveyDefinitionCacheTest(EmployeeTestMixin, TestCase):
+    """
+    Survey definition cache Test Cases
+    """
+
+    def test_cache_hit_and_invalidation(self):
+        """
+        testing cached definitions skip survey queries and follow question edits
+        """
+        survey = self.create_surveys(1)[0]
+        question = self.create_questions(3, survey)[0]
+        url = reverse('que_list', args=[survey.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('"survey_question"', tables)
+        self.assertNotIn('FROM "survey_survey"', tables)
+
+        question.question = 'How was the offsite ?'
+        question.save()
+        self.assertContains(self.client.get(url), 'How was the offsite ?')
+
+        set_questions(survey, [other.id for other in survey.question.exclude(id=question.id)])
+        self.assertNotContains(self.client.get(url), 'How was the offsite ?')
+
+
+class SaveAnswersTest(EmployeeTestMixin, TestCase):
+    """
+    Saving answers Test Cases
+    """
+
+    def test_save_and_finish(self):
+        """
+        testing answers are created once and flagged on finish
+        """
+        survey = self.create_surveys(1)[0]
+        first, second = self.create_questions(2, survey)
+        Question.objects.filter(id=first.id).update(question_type=Question.SELECT_MULTIPLE)
+        self.client.post(reverse('save', args=[survey.id]),
+                         {str(first.id): ['good', 'bad'], 'btn_response': 'Save'})
+        answer = SurveyFeedback.objects.get(survey=survey, employee=self.emp)
+        self.assertEqual(answer.response, 'good, bad')
+        self.assertFalse(answer.flag)
+        assignment = SurveyAssignment.objects.get(survey=survey, employee=self.emp)
+        self.assertEqual(assignment.status, SurveyAssignment.IN_PROGRESS)
+        self.assertIsNotNone(assignment.started_at)
+
+        self.client.post(reverse('save', args=[survey.id]),
+                         {str(first.id): 'very good', str(second.id): 'bad',
+                          'btn_response': 'Finish'})
+        answers = dict(SurveyFeedback.objects.filter(
+            survey=survey, employee=self.emp).values_list('question_id', 'response'))
+        self.assertEqual(answers, {first.id: 'very good', second.id: 'bad'})
+        self.assertFalse(SurveyFeedback.objects.filter(flag=False).exists())
+        assignment = SurveyAssignment.objects.get(survey=survey, employee=self.emp)
+        self.assertEqual(assignment.status, SurveyAssignment.COMPLETED)
+        self.assertIsNotNone(assignment.completed_at)
+        self.assertEqual(assignment.revision, 2)
+
+        self.client.post(reverse('save', args=[survey.id]),
+                         {str(first.id): 'good', 'btn_response': 'Save'})
+        self.assertEqual(SurveyFeedback.objects.get(question=first).response, 'very good')
+        self.assertEqual(OutboundEmail.objects.filter(recipient=self.emp.emp_username).count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_concurrent_first_saves(self):
+        """
+        testing a save waiting on another first save of the employee sees its answers
+        """
+        survey = self.create_surveys(1)[0]
+        question = self.create_questions(1, survey)[0]
+        lock = QuerySet.select_for_update
+        waiting = []
+
+        def other_save_commits_first(queryset, *args, **kwargs):
+            if queryset.model is SurveyAssignment and not waiting:
+                waiting.append(queryset)
+                save_answers(survey, self.emp, self.org.id, {question.id: ['good']})
+            return lock(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True,
+                               side_effect=other_save_commits_first):
+            response = self.client.post(reverse('save', args=[survey.id]),
+                                        {str(question.id): 'good', 'btn_response': 'Save'})
+        self.assertEqual(len(waiting), 1)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(SurveyFeedback.objects.filter(survey=survey).count(), 1)
+        self.assertEqual(SurveyResultSummary.objects.get(survey=survey).respondent_count, 1)
+
+    def test_structured_answers(self):
+        """
+        testing choice and integer answers are stored in typed columns
+        """
+        survey = self.create_surveys(1)[0]
+        multiple, number = self.create_questions(2, survey)
+        Question.objects.filter(id=multiple.id).update(question_type=Question.SELECT_MULTIPLE)
+        Question.objects.filter(id=number.id).update(question_type=Question.INTEGER)
+        self.client.post(reverse('save', args=[survey.id]),
+                         {str(multiple.id): [' very good', 'bad '],
+                          str(number.id): '42', 'btn_response': 'Save'})
+        answer = SurveyFeedback.objects.get(question=multiple)
+        self.assertEqual(sorted(answer.choices.values_list('label', flat=True)),
+                         ['bad', 'very good'])
+        self.assertEqual(SurveyFeedback.objects.get(question=number).integer_response, 42)
+        self.assertEqual(get_choice_tally(survey.id, multiple.id),
+                         [('good', 0), ('bad', 1), ('very good', 1)])
+
+    def test_invalid_answers_rejected(self):
+        """
+        testing bad input saves nothing and is reported on the same page
+        """
+        survey = self.create_surveys(1)[0]
+        radio, number = self.create_questions(2, survey)
+        Question.objects.filter(id=number.id).update(question_type=Question.INTEGER)
+        response = self.client.post(reverse('save', args=[survey.id]),
+                                    {str(radio.id): 'unknown', str(number.id): 'forty',
+                                     'page': '1', 'btn_response': 'Finish'}, follow=True)
+        self.assertRedirects(response, reverse('que_list', args=[survey.id]) + '?page=1')
+        self.assertContains(response, '%s: unknown is not one of the available choices.'
+                            % radio.question)
+        self.assertContains(response, '%s: Enter a whole number.' % number.question)
+        self.assertFalse(SurveyFeedback.objects.filter(survey=survey).exists())
+        self.assertEqual(SurveyAssignment.objects.get(survey=survey, employee=self.emp).status,
+                         SurveyAssignment.ASSIGNED)
+        self.assertEqual(len(mail.outbox) + OutboundEmail.objects.count(), 0)
+
+    def test_answer_rules_cached(self):
+        """
+        testing choices are read once per survey definition, not per save
+        """
+        survey = self.create_surveys(1)[0]
+        radio, number = self.create_questions(2, survey)
+        number.question_type = Question.INTEGER
+        number.save()
+        url = reverse('save', args=[survey.id])
+        self.client.post(url, {str(radio.id): 'good', 'btn_response': 'Save'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {str(radio.id): ' bad ', str(number.id): ' 0042 ',
+                                   'btn_response': 'Save'})
+        # Choices of replaced answers are still read through the answer
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'FROM "survey_questionchoice"' in query['sql']
+                          and 'survey_surveyfeedback_choices' not in query['sql']])
+        self.assertEqual(SurveyFeedback.objects.get(question=radio).response, 'bad')
+        answer = SurveyFeedback.objects.get(question=number)
+        self.assertEqual((answer.response, answer.integer_response), ('42', 42))
+
+    def save_query_count(self, count, question_type=None):
+        """
+        Counting queries issued when finishing a survey of count questions
+        """
+        survey = self.create_surveys(1)[0]
+        questions = self.create_questions(count, survey)
+        if question_type == Question.INTEGER:
+            Question.objects.filter(id__in=[question.id for question in questions]).update(
+                question_type=question_type)
+            data = {str(question.id): str(index) for index, question in enumerate(questions)}
+        else:
+            data = {str(question.id): ' good' for question in questions}
+        data['btn_response'] = 'Finish'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('save', args=[survey.id]), data)
+        self.assertEqual(SurveyFeedback.objects.filter(survey=survey, flag=True).count(), count)
+        return len(queries)
+
+    def test_save_query_count(self):
+        """
+        testing a large submission takes the same handful of queries as a small one
+        """
+        small = self.save_query_count(5)
+        self.assertEqual(self.save_query_count(50), small)
+        self.assertLessEqual(small, 30)
+
+    def test_integer_save_query_count(self):
+        """
+        testing integer statistics of all questions move in a fixed number of queries
+        """
+        small = self.save_query_count(5, Question.INTEGER)
+        self.assertEqual(self.save_query_count(50, Question.INTEGER), small)
+        summary = QuestionResultSummary.objects.filter(integer_count=1).order_by(
+            'integer_max').last()
+        self.assertEqual((summary.integer_min, summary.integer_max, summary.integer_sum),
+                         (49, 49, 49))
+
+    def test_summary_rows_created_concurrently(self):
+        """
+        testing a save racing another first save of the survey keeps its answers
+        """
+        survey = self.create_surveys(1)[0]
+        question = self.create_questions(1, survey)[0]
+        create = QuestionResultSummary.objects.bulk_create
+
+        def race(rows, **kwargs):
+            # Another save inserts the same summary rows first
+            create([QuestionResultSummary(summary_id=row.summary_id, question_id=row.question_id)
+                    for row in rows])
+            return create(rows, **kwargs)
+
+        with mock.patch.object(QuestionResultSummary.objects, 'bulk_create', side_effect=race):
+            self.client.post(reverse('save', args=[survey.id]),
+                             {str(question.id): 'good', 'btn_response': 'Save'})
+        self.assertEqual(QuestionResultSummary.objects.get(question=question).answer_count, 1)
+
+
+class OutboundEmailAdminTest(EmployeeTestMixin, TestCase):
+    """
+    Outbound email admin Test Cases
+    """
+
+    def test_queue_limited_to_superusers(self):
+        """
+        testing organization admins cannot read the queue of every organization
+        """
+        enqueue_mail('Survey Feedback ', 'secret body', ['other@example.com'])
+        self.user.is_staff = True
+        self.user.save()
+        self.user.user_permissions.add(Permission.objects.get(codename='view_outboundemail'))
+        url = reverse('admin:survey_outboundemail_changelist')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertContains(self.client.get(url), 'other@example.com')
+
+
+class NotificationTaskTest(EmployeeTestMixin, TestCase):
+    """
+    Email notification task Test Cases
+    """
+
+    def test_notification_windows(self):
+        """
+        testing every window mails its assigned employees
+        """
+        self.create_surveys(1, start_offset=1, end_offset=3)
+        self.create_surveys(2, start_offset=0, end_offset=1)
+        self.create_surveys(1, start_offset=-3, end_offset=-1)
+        # Surveys ended long before the ledger existed are not notified
+        self.create_surveys(1, start_offset=-40, end_offset=-30)
+        out = StringIO()
+        call_command('email_notification_task', batch_size=2, stdout=out)
+        subjects = sorted(message.subject for message in mail.outbox)
+        self.assertEqual(subjects, ['Survey assigned to you ending tomorrow.',
+                                    'Survey assigned to you ending tomorrow.',
+                                    'Survey assigned to you was ended.',
+                                    'You have a new survey coming tomorrow.',
+                                    'You have a new survey in your dashboard.',
+                                    'You have a new survey in your dashboard.'])
+        self.assertEqual(mail.outbox[0].to, [self.emp.emp_username])
+        self.assertIn('Hello %s' % self.emp.emp_name, mail.outbox[0].body)
+        self.assertIn('Sent 6 emails', out.getvalue())
+
+    def test_ledger_prevents_double_send(self):
+        """
+        testing reruns and resumed runs never mail the same notification twice
+        """
+        surveys = self.create_surveys(4, start_offset=-5, end_offset=-2)
+        locmem = mail.get_connection()
+
+        def fail_third_message(messages):
+            if len(mail.outbox) == 2:
+                raise SMTPException('down')
+            return locmem.send_messages(messages)
+
+        with mock.patch('survey.management.commands.email_notification_task.get_connection',
+                        return_value=mock.Mock(send_messages=fail_third_message)):
+            with self.assertRaises(SMTPException):
+                call_command('email_notification_task', batch_size=3, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(NotificationLog.objects.count(), 2)
+
+        call_command('email_notification_task', batch_size=2, stdout=StringIO())
+        call_command('email_notification_task', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(set(NotificationLog.objects.values_list('survey_id', flat=True)),
+                         {survey.id for survey in surveys})
+
+    def test_dry_run(self):
+        """
+        testing dry run resolves recipients without sending
+        """
+        self.create_surveys(3, start_offset=0, end_offset=2)
+        out = StringIO()
+        call_command('email_notification_task', dry_run=True, stdout=out)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIn('Resolved 3 emails', out.getvalue())
+
+
+class FeedbackIndexTest(EmployeeTestMixin, TestCase):
+    """
+    Feedback index usage Test Cases on a small dataset, run
+    manage.py benchmark --explain 1000000 for the full volume
+    """
+    FEEDBACK_ROWS = 2000
+
+    def setUp(self):
+        """
+        Seeding feedback rows the way the index benchmark does
+        """
+        super().setUp()
+        self.answer = seed_feedback(rows=self.FEEDBACK_ROWS)
+
+    def test_feedback_access_paths(self):
+        """
+        testing composite indexes serve the feedback filters
+        """
+        results = explain_feedback(self.answer)
+        self.assertEqual([path for path, index, plan in results],
+                         ['survey_employee', 'survey_employee_question',
+                          'survey_employee_flag', 'current_surveys'])
+        for path, index, plan in results:
+            self.assertIsNotNone(index, plan)
+
+    def test_unique_answer_per_question(self):
+        """
+        testing a second answer for the same question is rejected
+        """
+        with self.assertRaises(IntegrityError):
+            SurveyFeedback.objects.create(survey_id=self.answer.survey_id,
+                                          employee_id=self.answer.employee_id,
+                                          question_id=self.answer.question_id,
+                                          organization_id=self.answer.organization_id,
+                                          response='bad', flag=False)
+
+
+class ResultSummaryTest(EmployeeTestMixin, TestCase):
+    """
+    Survey result summary Test Cases
+    """
+
+    def snapshot(self, survey):
+        """
+        Summary of a survey as plain values
+        """
+        summary = SurveyResultSummary.objects.get(survey=survey)
+        questions = {}
+        for row in summary.questionresultsummary_set.all():
+            questions[row.question_id] = (
+                row.answer_count, row.integer_count, row.integer_sum, row.integer_min,
+                row.integer_max,
+                sorted(row.choiceresultcount_set.values_list('choice__label', 'total')),
+                list(row.integerresultcount_set.values_list('value', 'total')))
+        return summary.respondent_count, summary.completed_count, questions
+
+    def test_incremental_matches_rebuild(self):
+        """
+        testing incremental updates equal a full rebuild
+        """
+        survey = self.create_surveys(1)[0]
+        radio, number = self.create_questions(2, survey)
+        Question.objects.filter(id=number.id).update(question_type=Question.INTEGER)
+        other = ModelsTest.create_employee(emp_name='sonal', emp_username='sonal@gmail.com',
+                                           organization=self.org)
+        SurveyAssignment.objects.create(survey=survey, employee=other)
+        url = reverse('save', args=[survey.id])
+        self.client.post(url, {str(radio.id): ' bad', 'btn_response': 'Save'})
+        self.client.post(url, {str(number.id): '7', 'btn_response': 'Finish'})
+        session = self.client.session
+        session['username'] = other.emp_username
+        session.save()
+        self.client.post(url, {str(radio.id): ' bad', str(number.id): '3',
+                               'btn_response': 'Finish'})
+
+        incremental = self.snapshot(survey)
+        self.assertEqual(incremental, (2, 2, {
+            radio.id: (2, 0, 0, None, None, [('bad', 2)], []),
+            number.id: (2, 2, 10, 3, 7, [], [(3, 1), (7, 1)])}))
+        call_command('rebuild_result_summary', survey.id, stdout=StringIO())
+        self.assertEqual(self.snapshot(survey), incremental)
+
+    def test_admin_results_page(self):
+        """
+        testing the read-only results page renders the summary
+        """
+        survey = self.create_surveys(1)[0]
+        radio = self.create_questions(1, survey)[0]
+        self.client.post(reverse('save', args=[survey.id]),
+                         {str(radio.id): ' good', 'btn_response': 'Finish'})
+        self.user.is_superuser = True
+        self.user.is_staff = True
+        self.user.save()
+        summary = SurveyResultSummary.objects.get(survey=survey)
+        response = self.client.get(reverse('admin:survey_surveyresultsummary_change',
+                                           args=[summary.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'good: 1')
+
+
+class ExportAnswersTest(EmployeeTestMixin, TestCase):
+    """
+    Streaming answers export Test Cases
+    """
+
+    def setUp(self):
+        """
+        Seeding answers of two organizations
+        """
+        super().setUp()
+        survey = self.create_surveys(1)[0]
+        for question in self.create_questions(3, survey):
+            SurveyFeedback.objects.create(employee=self.emp, survey=survey, question=question,
+                                          organization=self.org, response='good, bad',
+                                          flag=True)
+        other_org = ModelsTest.create_organization(company_name='Other')
+        other_question = ModelsTest.create_question(organization=other_org)
+        other_survey = Survey.objects.create(survey_name='other', description='other',
+                                             organization=other_org)
+        SurveyFeedback.objects.create(employee=self.emp, survey=other_survey,
+                                      question=other_question, organization=other_org,
+                                      response='secret', flag=True)
+        self.user.is_staff = True
+        self.user.save()
+        self.user.user_permissions.add(Permission.objects.get(codename='view_surveyfeedback'))
+
+    def test_csv_scoped_to_organization(self):
+        """
+        testing organization admin streams only its own answers
+        """
+        response = self.client.get(reverse('admin:survey_surveyfeedback_export'))
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'survey_id', 'survey'])
+        self.assertEqual([row[7] for row in rows[1:]], ['good, bad'] * 3)
+
+    def test_gzipped_json_lines(self):
+        """
+        testing gzipped json lines export
+        """
+        response = self.client.get(reverse('admin:survey_surveyfeedback_export'),
+                                   {'format': 'jsonl', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)['employee'] for line in lines],
+                         [self.emp.emp_username] * 3)
+
+    def test_export_command(self):
+        """
+        testing the export command writes every answer in chunks
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'answers.csv')
+        call_command('export_answers', output=path, chunk_size=1, stderr=StringIO())
+        with open(path) as export:
+            self.assertEqual(len(export.read().splitlines()), 5)
+
+
+class EmployeeImportTest(EmployeeTestMixin, TestCase):
+    """
+    Bulk employee import Test Cases
+    """
+    HEADER = 'emp_name,emp_username,emp_password,emp_designation,emp_address\n'
+
+    def employee_csv(self, count, start=0):
+        """
+        Building a CSV file content of count employees
+        :param count:
+        :param start:
+        """
+        return self.HEADER + ''.join(
+            'emp %s,emp%s@example.com,Secret@123,Engineer,Pune\n' % (index, index)
+            for index in range(start, start + count))
+
+    def test_import_command_reports_rejected_rows(self):
+        """
+        testing valid rows are imported in batches and bad rows are reported
+        """
+        content = self.employee_csv(5) + ',missing@example.com,x,y,z\n' \
+            'bad,not-an-email,x,y,z\nagain,emp1@example.com,x,y,z\n' \
+            'taken,%s,x,y,z\n' % self.emp.emp_username
+        path = os.path.join(tempfile.mkdtemp(), 'employees.csv')
+        with open(path, 'w') as employees:
+            employees.write(content)
+        Employee.objects.filter(id=self.emp.id).update(organization=None)
+        out, err = StringIO(), StringIO()
+        call_command('import_employees', path, organization=self.org.id, batch_size=2,
+                     stdout=out, stderr=err)
+        self.assertIn('created 5, updated 0, rejected 4', out.getvalue())
+        self.assertEqual(Employee.objects.filter(organization=self.org).count(), 5)
+        self.assertIn('Line 7', err.getvalue())
+        self.assertIn('Duplicate username in file.', err.getvalue())
+
+    def test_reimport_updates_in_place(self):
+        """
+        testing reimported employees are updated with one statement per batch
+        """
+        import_employees(read_csv(StringIO(self.employee_csv(3))), self.org.id)
+        changed = self.employee_csv(3).replace('Engineer', 'Manager')
+        with CaptureQueriesContext(connection) as queries:
+            report = import_employees(read_csv(StringIO(changed)), self.org.id, batch_size=10)
+        self.assertEqual((report.created, report.updated), (0, 3))
+        self.assertEqual(set(Employee.objects.filter(organization=self.org).exclude(
+            id=self.emp.id).values_list('emp_designation', flat=True)), {'Manager'})
+        self.assertLessEqual(len(queries), 5)
+
+    def test_fewer_queries_than_resource(self):
+        """
+        testing bulk import needs far fewer queries than EmployeeResource
+        """
+        content = self.employee_csv(100)
+        dataset = tablib.Dataset().load(content, format='csv')
+        with CaptureQueriesContext(connection) as resource_queries:
+            EmployeeResource().import_data(dataset, dry_run=True)
+        with CaptureQueriesContext(connection) as bulk_queries:
+            import_employees(read_csv(StringIO(content)), self.org.id, batch_size=50)
+        self.assertLess(len(bulk_queries) * 20, len(resource_queries))
+
+    def test_updated_employee_session_refreshed(self):
+        """
+        testing sessions of employees updated by an import see the change on the next request
+        """
+        self.client.get(reverse('employee'))
+        import_employees(read_csv(StringIO(
+            self.HEADER + 'renamed,%s,Secret@123,Engineer,Pune\n' % self.emp.emp_username)),
+                         self.org.id)
+        self.client.get(reverse('employee'))
+        self.assertEqual(self.client.session['employee']['emp_name'], 'renamed')
+
+    def test_admin_upload(self):
+        """
+        testing the admin bulk import page imports an uploaded file
+        """
+        self.user.is_superuser = True
+        self.user.is_staff = True
+        self.user.save()
+        upload = SimpleUploadedFile('employees.csv', self.employee_csv(2).encode())
+        response = self.client.post(reverse('admin:survey_employee_bulk_import'),
+                                    {'file': upload, 'update_existing': 'on'})
+        self.assertContains(response, 'created 2, updated 0, rejected 0')
+
+    def test_changelist_links_bulk_import(self):
+        """
+        testing the employee changelist links the bulk import page
+        """
+        self.user.is_superuser = True
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('admin:survey_employee_changelist'))
+        self.assertContains(response, reverse('admin:survey_employee_bulk_import'))
+
+
+class ArchiveOrganizationTest(EmployeeTestMixin, TestCase):
+    """
+    Organization archive Test Cases
+    """
+
+    def setUp(self):
+        """
+        Making the logged-in user an organization admin
+        """
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.user.user_permissions.add(*Permission.objects.filter(
+            codename__in=['view_employee', 'view_survey', 'view_question',
+                          'view_surveyfeedback']))
+
+    def test_archive_and_restore(self):
+        """
+        testing archive hides organization data with one update and no joins
+        """
+        self.create_surveys(2)
+        organizations = Organization.objects.filter(id=self.org.id)
+        with CaptureQueriesContext(connection) as queries:
+            archive_action(None, None, organizations)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(Organization.objects.get(id=self.org.id).is_archived)
+
+        url = reverse('admin:survey_survey_changelist')
+        self.assertNotContains(self.client.get(url), 'survey 0')
+
+        restore_action(None, None, organizations)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(url), 'survey 0')
+        survey_queries = [query['sql'] for query in queries
+                          if 'FROM "survey_survey"' in query['sql']]
+        self.assertTrue(survey_queries)
+        self.assertFalse(any('"is_archived" = ' in sql for sql in survey_queries))
+
+    @override_settings(SURVEY_ARCHIVED_CACHE_TIMEOUT=30)
+    def test_archived_ids_expire(self):
+        """
+        testing other processes see archived organizations once the cached ids expire
+        """
+        invalidate_archived_organizations()
+        with mock.patch.object(cache, 'set') as cache_set:
+            get_archived_organization_ids()
+        cache_set.assert_called_once_with(ARCHIVED_ORGANIZATIONS_KEY, set(), 30)
+
+
+@override_settings(SURVEY_PROFILING=True, SURVEY_QUERY_BUDGET_ACTION='raise')
+class ProfilingMiddlewareTest(EmployeeTestMixin, TestCase):
+    """
+    Request profiling and query budget Test Cases
+    """
+
+    def setUp(self):
+        """
+        Seeding a survey and an empty profile buffer
+        """
+        super().setUp()
+        PROFILES.clear()
+        self.survey = self.create_surveys(1)[0]
+        self.questions = self.create_questions(20, self.survey)
+
+    def test_survey_flow_recorded_within_budgets(self):
+        """
+        testing the employee flow is profiled and stays within the default budgets
+        """
+        self.client.get(reverse('employee'))
+        self.client.get(reverse('que_list', args=[self.survey.id]))
+        self.client.post(reverse('save', args=[self.survey.id]),
+                         dict({str(question.id): 'good' for question in self.questions},
+                              Finish='Finish'))
+        profiles = {profile.view: profile for profile in PROFILES}
+        self.assertEqual(sorted(profiles), ['employee', 'que_list', 'save'])
+        self.assertGreater(profiles['que_list'].sql_count, 0)
+        self.assertGreater(profiles['que_list'].template_time, 0)
+        self.assertEqual(profiles['que_list'].budget, 8)
+
+    def test_budget_exceeded_raises(self):
+        """
+        testing a view over its query budget raises
+        """
+        with self.settings(SURVEY_QUERY_BUDGETS={'employee': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('employee'))
+        self.assertTrue(PROFILES[-1].over_budget)
+
+    def test_admin_page_lists_profiles(self):
+        """
+        testing superusers see the ring buffer on the admin page
+        """
+        self.client.get(reverse('employee'))
+        self.user.is_superuser = self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('profiling'))
+        self.assertContains(response, '/employee/')
+        self.assertEqual(response.context['summary'][0]['view'], 'employee')
+
+    def test_missing_template_names_backend(self):
+        """
+        testing a missing template is reported against the profiling backend
+        """
+        backend = engines.all()[0]
+        with self.assertRaises(TemplateDoesNotExist) as raised:
+            backend.get_template('survey/missing.html')
+        self.assertIs(raised.exception.backend, backend)
+
+
+class BenchmarkTest(TestCase):
+    """
+    Employee flow benchmark Test Cases
+    """
+
+    def test_flow_report_and_baseline_compare(self):
+        """
+        testing seeded flows report every step and regressions are detected
+        """
+        cache.clear()
+        seed(organizations=1, employees=4, questions=6, surveys=3, questions_per_survey=4)
+        report = summarize(*run_flows(iterations=4, warmup=1))
+        self.assertEqual(sorted(report['steps']), ['employee', 'login', 'que_list', 'save'])
+        self.assertEqual(report['requests'], 16)
+        self.assertEqual(report['steps']['employee']['requests'], 4)
+        self.assertGreater(report['steps']['save']['queries'], 0)
+        self.assertEqual(compare(report, report), [])
+        slower = json.loads(json.dumps(report))
+        slower['steps']['save']['queries'] *= 2
+        self.assertEqual([row[:2] for row in compare(slower, report)], [('save', 'queries')])
+
+    def test_question_list_render_modes(self):
+        """
+        testing the render benchmark times the question list in both modes
+        """
+        cache.clear()
+        report = summarize(*time_question_list(questions=12, iterations=2, warmup=1))
+        self.assertEqual(sorted(report['steps']), ['fragments', 'templates'])
+        self.assertEqual(report['steps']['fragments']['requests'], 2)
+        self.assertEqual(report['steps']['fragments']['queries'],
+                         report['steps']['templates']['queries'])
+
+    def test_committed_baseline(self):
+        """
+        testing the committed baseline was recorded with the default configuration
+        """
+        baseline = load_baseline(BASELINE_PATH)['sqlite']
+        self.assertEqual(baseline['config']['iterations'], 50)
+        self.assertEqual(sorted(baseline['steps']), ['employee', 'login', 'que_list', 'save'])
+
+    def test_save_checks_baseline_before_run(self):
+        """
+        testing an unusable baseline file is rejected before any flow runs
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        with open(path, 'w') as baseline:
+            baseline.write('not json')
+        with self.assertRaisesMessage(CommandError, 'not a valid baseline file'):
+            call_command('benchmark', baseline=path, save=True)
+        with self.assertRaisesMessage(CommandError, 'not writable'):
+            call_command('benchmark', baseline=os.path.join(path + '.missing', 'baseline.json'),
+                         save=True)
+
+
+class ArchiveCommandTest(EmployeeTestMixin, TestCase):
+    """
+    Streaming and incremental archive Test Cases
+    """
+
+    def setUp(self):
+        """
+        Seeding answers and an archive directory
+        """
+        super().setUp()
+        self.survey = self.create_surveys(1)[0]
+        self.questions = self.create_questions(4, self.survey)
+        self.answer(self.questions[:2])
+        self.directory = tempfile.mkdtemp()
+
+    def answer(self, questions):
+        """
+        Saving an answer to every question
+        :param questions:
+        """
+        for question in questions:
+            SurveyFeedback.objects.create(employee=self.emp, survey=self.survey,
+                                          question=question, organization=self.org,
+                                          response='good', flag=True)
+
+    def archive(self, *args):
+        """
+        Running the archive command and returning the new manifest
+        :param args:
+        """
+        out = StringIO()
+        with override_settings(SurveyRepo=self.directory,
+                               surveyArchive='%Y-%m-%d--%H-%M-%S-%f'):
+            call_command('archive', *args, stdout=out)
+        with open(os.path.join(self.directory, 'archive-manifest.json')) as manifest:
+            return json.load(manifest), out.getvalue()
+
+    def test_stream_archive_members_and_report(self):
+        """
+        testing every model gets its own member with rows and bytes reported
+        """
+        manifest, out = self.archive('--stream', '--compression', 'gz', '--level', '1')
+        self.assertTrue(manifest['archive'].endswith('.tar.gz'))
+        entries = {entry['model']: entry for entry in manifest['models']}
+        self.assertEqual(entries['survey.surveyfeedback']['rows'], 2)
+        self.assertEqual(entries['survey.question']['rows'], 4)
+        self.assertIn('data/survey.surveyfeedback.json: 2 rows', out)
+        with tarfile.open(os.path.join(self.directory, manifest['archive'])) as tar:
+            member = tar.extractfile(entries['survey.question']['member'])
+            self.assertEqual(len(json.load(member)), 4)
+            self.assertIn('meta.json', tar.getnames())
+
+    def test_split_ranges_cover_every_answer_once(self):
+        """
+        testing answers split into primary key ranges are dumped exactly once
+        """
+        self.answer(self.questions[2:])
+        tasks = plan_tasks([Question, SurveyFeedback], parts=3)
+        self.assertEqual([task.member for task in tasks],
+                         ['data/survey.question.json', 'data/survey.surveyfeedback.0000.json',
+                          'data/survey.surveyfeedback.0001.json',
+                          'data/survey.surveyfeedback.0002.json'])
+        dumped = [json.load(dump_task(task).fileobj) for task in tasks[1:]]
+        self.assertEqual(sorted(row['pk'] for rows in dumped for row in rows),
+                         list(SurveyFeedback.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_incremental_archive_and_restore(self):
+        """
+        testing incremental archives hold new answers only and restore on top of a full one
+        """
+        full, _ = self.archive('--stream')
+        self.answer(self.questions[2:])
+        # Answers to a question added after the full archive need the question too
+        added = self.create_questions(1, self.survey)
+        self.answer(added)
+        # Answers of the full archive updated before the last archive are left out
+        SurveyFeedback.objects.filter(question=self.questions[1]).update(
+            updated_date=datetime.date.today() - datetime.timedelta(days=1))
+        SurveyFeedback.objects.filter(question=self.questions[0]).update(response='edited')
+        incremental, _ = self.archive('--incremental', '--compression', 'xz')
+        self.assertEqual(incremental['base'], full['archive'])
+        self.assertEqual([(entry['member'], entry['rows']) for entry in incremental['models']
+                          if entry['model'] == 'survey.surveyfeedback'],
+                         [('data/survey.surveyfeedback.json', 3),
+                          ('data/survey.surveyfeedback.updated.json', 1)])
+        self.assertEqual(incremental['last_feedback_id'],
+                         SurveyFeedback.objects.latest('id').id)
+        nothing_new, _ = self.archive('--incremental')
+        self.assertEqual([entry['rows'] for entry in nothing_new['models']
+                          if entry['member'] == 'data/survey.surveyfeedback.json'], [0])
+
+        archives = [os.path.join(self.directory, manifest['archive'])
+                    for manifest in (full, incremental, nothing_new)]
+        with self.assertRaisesMessage(CommandError, 'restore %s before it' % full['archive']):
+            call_command('restore_archive', archives[1], stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'follows %s' % incremental['archive']):
+            call_command('restore_archive', archives[0], archives[2], stdout=StringIO())
+
+        SurveyFeedback.objects.all().delete()
+        added_id = added[0].id
+        added[0].delete()
+        call_command('restore_archive', *archives, stdout=StringIO())
+        self.assertEqual(SurveyFeedback.objects.filter(survey=self.survey).count(), 5)
+        self.assertEqual(SurveyFeedback.objects.get(question=self.questions[0]).response,
+                         'edited')
+        self.assertTrue(SurveyFeedback.objects.filter(question_id=added_id).exists())
+
+    def test_incremental_needs_a_manifest(self):
+        """
+        testing an incremental archive is refused without an earlier archive
+        """
+        with self.assertRaisesMessage(CommandError, 'take a full archive before'):
+            self.archive('--incremental')
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_full_archive_writes_manifest(self):
+        """
+        testing a plain full archive becomes the base of the next incremental one
+        """
+        self.archive('--stream')
+        full, _ = self.archive()
+        self.assertEqual(full['mode'], 'full')
+        self.assertEqual(full['last_feedback_id'], SurveyFeedback.objects.latest('id').id)
+        incremental, _ = self.archive('--incremental')
+        self.assertEqual(incremental['base'], full['archive'])
+
+
+class SurveyChangelistTest(EmployeeTestMixin, TestCase):
+    """
+    Survey admin changelist Test Cases
+    """
+
+    def setUp(self):
+        """
+        Making the logged-in user a superuser
+        """
+        super().setUp()
+        self.user.is_superuser = True
+        self.user.is_staff = True
+        self.user.save()
+
+    def assign_employees(self, surveys, count):
+        """
+        Assigning count new employees to every survey
+        :param surveys:
+        :param count:
+        """
+        start = Employee.objects.count()
+        Employee.objects.bulk_create([
+            Employee(emp_name='emp %s' % index, emp_username='emp%s@example.com' % index,
+                     organization=self.org) for index in range(start, start + count)])
+        employees = list(Employee.objects.order_by('-id')[:count])
+        SurveyAssignment.objects.bulk_create([
+            SurveyAssignment(survey=survey, employee=employee)
+            for survey in surveys for employee in employees])
+
+    def changelist_query_count(self):
+        """
+        Counting queries issued by the survey changelist
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:survey_survey_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_bounded(self):
+        """
+        testing the changelist does not query per survey or per assignee
+        """
+        self.assign_employees(self.create_surveys(2), 2)
+        small = self.changelist_query_count()
+        self.assign_employees(self.create_surveys(40), 30)
+        self.assertEqual(self.changelist_query_count(), small)
+
+    def test_assignee_preview_and_list(self):
+        """
+        testing the column previews assignees and links to the paginated list
+        """
+        survey = self.create_surveys(1)[0]
+        self.assign_employees([survey], 150)
+        response = self.client.get(reverse('admin:survey_survey_changelist'))
+        preview = survey.employee.order_by('emp_username').values_list('emp_username', flat=True)
+        self.assertContains(response, '151 employees</a> %s, ...' % ', '.join(preview[:3]))
+        url = reverse('admin:survey_survey_assignees', args=[survey.id])
+        response = self.client.get(url, {'page': 2})
+        self.assertContains(response, '2 / 2 (151 employees)')
+        self.assertEqual(len(response.context['page']), 51)
+
+    def test_status_counts_completed_assignments(self):
+        """
+        testing one employee finishing does not complete the survey for everyone
+        """
+        survey = self.create_surveys(1)[0]
+        self.assign_employees([survey], 2)
+        question = self.create_questions(1, survey)[0]
+        self.client.post(reverse('save', args=[survey.id]),
+                         {str(question.id): 'good', 'btn_response': 'Finish'})
+        response = self.client.get(reverse('admin:survey_survey_changelist'))
+        self.assertContains(response, '1 of 3 completed')
+
+    @staticmethod
+    def inline_data(survey, sections=(), placements=None):
+        """
+        Method for build the section and question inline forms of the survey change form
+        :param survey:
+        :param sections: titles of new sections
+        :param placements: mapping of question id to (section id, position)
+        """
+        placements = placements or {}
+        rows = list(survey.survey_questions.order_by('position', 'id'))
+        data = {'sections-TOTAL_FORMS': len(sections), 'sections-INITIAL_FORMS': 0,
+                'survey_questions-TOTAL_FORMS': len(rows),
+                'survey_questions-INITIAL_FORMS': len(rows)}
+        for index, title in enumerate(sections):
+            data.update({'sections-%s-title' % index: title,
+                         'sections-%s-position' % index: index + 1})
+        for index, row in enumerate(rows):
+            section_id, position = placements.get(row.question_id, (row.section_id, row.position))
+            data.update({'survey_questions-%s-id' % index: row.id,
+                         'survey_questions-%s-survey' % index: survey.id,
+                         'survey_questions-%s-section' % index: section_id or '',
+                         'survey_questions-%s-position' % index: position})
+        return data
+
+    def test_saving_sections_and_order(self):
+        """
+        testing the admin form adds sections, places questions and keeps their placement
+        """
+        survey = self.create_surveys(1)[0]
+        first, second = self.create_questions(2, survey)
+        third = self.create_questions(1)[0]
+        url = reverse('admin:survey_survey_change', args=[survey.id])
+        form = {'survey_name': survey.survey_name, 'description': survey.description,
+                'questions': [first.id, second.id], 'assignees': [self.emp.id]}
+        response = self.client.post(url, dict(form, **self.inline_data(survey, ['Intro'])))
+        self.assertEqual(response.status_code, 302)
+        intro = survey.sections.get()
+        self.client.post(url, dict(form, **self.inline_data(survey, placements={
+            first.id: (intro.id, 5), second.id: (None, 1)})))
+        form['questions'] = [first.id, second.id, third.id]
+        self.client.post(url, dict(form, **self.inline_data(survey)))
+        self.assertEqual(list(survey.survey_questions.order_by('position').values_list(
+            'question_id', 'section_id', 'position')),
+                         [(second.id, None, 1), (first.id, intro.id, 5), (third.id, None, 6)])
+
+    def test_saving_assignees_keeps_status(self):
+        """
+        testing the admin form replaces assignees and mails only new ones
+        """
+        survey = self.create_surveys(1)[0]
+        question = self.create_questions(1, survey)[0]
+        SurveyAssignment.objects.filter(survey=survey).update(status=SurveyAssignment.COMPLETED)
+        self.assign_employees([], 2)
+        first, second = Employee.objects.order_by('-id')[:2]
+        response = self.client.post(reverse('admin:survey_survey_change', args=[survey.id]), {
+            'survey_name': survey.survey_name, 'description': survey.description,
+            'questions': [question.id], 'assignees': [self.emp.id, first.id],
+            'startDatetime': survey.startDatetime, 'endDatetime': survey.endDatetime,
+            **self.inline_data(survey)})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(dict(survey.assignments.values_list('employee_id', 'status')),
+                         {self.emp.id: SurveyAssignment.COMPLETED,
+                          first.id: SurveyAssignment.ASSIGNED})
+        self.assertEqual(list(OutboundEmail.objects.values_list('recipient', flat=True)),
+                         [first.emp_username])
+
+
+class EmployeeIdentityTest(EmployeeTestMixin, TestCase):
+    """
+    Session-backed employee identity Test Cases
+    """
+
+    @staticmethod
+    def lookups(queries):
+        """
+        Method for pick employee and session queries out of captured ones
+        :param queries:
+        """
+        return [query['sql'] for query in queries.captured_queries
+                if 'FROM "survey_employee"' in query['sql'] or 'django_session' in query['sql']]
+
+    def test_employee_resolved_once_per_session(self):
+        """
+        testing the employee and session are read once and then come from the session cache
+        """
+        self.create_surveys(1)
+        session = self.client.session
+        del session['employee']
+        session.save()
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse('employee'))
+        self.assertEqual(len([sql for sql in self.lookups(first)
+                              if 'FROM "survey_employee"' in sql]), 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('employee'))
+        self.assertEqual(self.lookups(queries), [])
+        self.assertLessEqual(len(queries), len(first) - 2)
+        self.assertEqual(response.context['employee'][0].id, self.emp.id)
+        self.assertContains(response, self.emp.emp_name)
+
+    def test_login_stores_identity(self):
+        """
+        testing login keeps the identity in the session and logout drops it
+        """
+        self.client.post(reverse('login'), {'username': self.emp.emp_username,
+                                            'password': self.emp.emp_password})
+        identity = self.client.session['employee']
+        self.assertEqual({field: identity[field] for field in IDENTITY_FIELDS},
+                         {'id': self.emp.id, 'organization_id': self.org.id,
+                          'emp_name': self.emp.emp_name, 'emp_username': self.emp.emp_username})
+        self.client.get(reverse('logout'))
+        self.assertNotIn('employee', self.client.session)
+
+    def test_unknown_username_redirects_to_login(self):
+        """
+        testing a session username without an employee is sent back to login
+        """
+        session = self.client.session
+        del session['employee']
+        session.save()
+        self.emp.delete()
+        response = self.client.get(reverse('employee'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def test_deleted_employee_loses_session(self):
+        """
+        testing a stored identity is not served after its employee is deleted
+        """
+        self.assertEqual(self.client.get(reverse('employee')).status_code, 200)
+        self.emp.delete()
+        response = self.client.get(reverse('employee'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertNotIn('employee', self.client.session)
+
+    def test_moved_employee_gets_new_organization(self):
+        """
+        testing the organization of a moved employee drives the next request
+        """
+        other = ModelsTest.create_organization(company_name='Other')
+        self.emp.organization = other
+        self.emp.save()
+        self.client.get(reverse('employee'))
+        self.assertEqual(self.client.session['employee']['organization_id'], other.id)
+
+    @override_settings(SURVEY_IDENTITY_TTL=60)
+    def test_identity_expires(self):
+        """
+        testing identities changed without signals are checked again after the TTL
+        """
+        Employee.objects.filter(id=self.emp.id).update(emp_name='renamed')
+        self.client.get(reverse('employee'))
+        self.assertEqual(self.client.session['employee']['emp_name'], self.emp.emp_name)
+        session = self.client.session
+        session['employee']['checked'] -= 61
+        session.save()
+        self.client.get(reverse('employee'))
+        self.assertEqual(self.client.session['employee']['emp_name'], 'renamed')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        """
+        testing the identity survives in signed cookie sessions without session queries
+        """
+        survey = self.create_surveys(1)[0]
+        self.client.force_login(self.user)
+        self.client.post(reverse('login'), {'username': self.emp.emp_username,
+                                            'password': self.emp.emp_password})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('que_list', args=[survey.id]))
+        self.assertEqual(self.lookups(queries), [])
+        self.assertContains(response, self.emp.emp_name)
+
+
+class SurveyApiTest(EmployeeTestMixin, TestCase):
+    """
+    Employee JSON API Test Cases
+    """
+
+    def setUp(self):
+        """
+        Seeding a current survey with a radio and an integer question
+        """
+        super().setUp()
+        self.survey = self.create_surveys(1)[0]
+        self.radio, self.number = self.create_questions(2, self.survey)
+        self.number.question_type = Question.INTEGER
+        self.number.save()
+
+    def test_dashboard(self):
+        """
+        testing the dashboard lists the current survey as assigned
+        """
+        response = self.client.get(reverse('api_employee'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['employee']['id'], self.emp.id)
+        self.assertEqual([survey['id'] for survey in response.json()['current']],
+                         [self.survey.id])
+        self.assertEqual(response.json()['assigned'], [self.survey.id])
+
+    def test_requires_employee_session(self):
+        """
+        testing requests without a logged-in employee are refused
+        """
+        session = self.client.session
+        del session['username']
+        session.save()
+        self.assertEqual(self.client.get(reverse('api_employee')).status_code, 403)
+
+    def test_definition_conditional_get(self):
+        """
+        testing unchanged definitions come back as 304 until a question changes
+        """
+        url = reverse('api_survey', args=[self.survey.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['questions'][1]['choices'], ['good', 'bad', 'very good'])
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'survey_question' in query['sql']])
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                         .status_code, 304)
+        self.radio.question = 'changed ?'
+        self.radio.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_shared_between_processes(self):
+        """
+        testing the ETag comes from the database, not from the cache of one process
+        """
+        url = reverse('api_survey', args=[self.survey.id])
+        response = self.client.get(url)
+        etag, modified = response['ETag'], response['Last-Modified']
+        stale = Organization.objects.get(id=self.org.id)
+        cache.clear()
+        response = self.client.get(url)
+        self.assertEqual((response['ETag'], response['Last-Modified']), (etag, modified))
+
+        Organization.objects.filter(id=self.org.id).update(
+            definition_version=F('definition_version') + 1)
+        self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        stale.location = 'Mumbai'
+        stale.save()
+        self.assertEqual(Organization.objects.get(id=self.org.id).definition_version,
+                         stale.definition_version + 1)
+
+    def test_definition_of_other_organization(self):
+        """
+        testing surveys of another organization are not found
+        """
+        other = ModelsTest.create_organization()
+        survey = Survey.objects.create(survey_name='other', description='CSR', organization=other)
+        url = reverse('api_survey', args=[survey.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        etag = quote_etag(get_etag(survey.id, self.org.id))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+        missing = reverse('api_survey', args=[survey.id + 100])
+        self.assertEqual(self.client.get(missing, HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.assertEqual(self.client.get(reverse('que_list', args=[survey.id])).status_code,
+                         404)
+
+    def test_batched_upserts_keep_summary(self):
+        """
+        testing partial batches insert and replace answers and the summary follows
+        """
+        url = reverse('api_answers', args=[self.survey.id])
+        response = self.client.post(url, {'answers': {str(self.radio.id): ['bad']}},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['saved'], 1)
+        response = self.client.post(url, {'answers': {str(self.radio.id): ['good'],
+                                                      str(self.number.id): ['7']}},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['saved'], 2)
+        response = self.client.post(url, {'answers': {str(self.number.id): ['3']},
+                                          'finish': True}, content_type='application/json')
+        answers = response.json()['answers']
+        self.assertEqual(answers[str(self.radio.id)]['response'], 'good')
+        self.assertEqual(answers[str(self.number.id)]['integer_response'], 3)
+        self.assertTrue(answers[str(self.number.id)]['finished'])
+        self.assertEqual(SurveyFeedback.objects.filter(survey=self.survey).count(), 2)
+
+        incremental = ResultSummaryTest.snapshot(self, self.survey)
+        self.assertEqual(incremental, (1, 1, {
+            self.radio.id: (1, 0, 0, None, None, [('bad', 0), ('good', 1)], []),
+            self.number.id: (1, 1, 3, 3, 3, [], [(3, 1), (7, 0)])}))
+        call_command('rebuild_result_summary', self.survey.id, stdout=StringIO())
+        rebuilt = ResultSummaryTest.snapshot(self, self.survey)
+        self.assertEqual(rebuilt[:2], incremental[:2])
+        self.assertEqual(rebuilt[2][self.radio.id][5], [('good', 1)])
+        self.assertEqual(rebuilt[2][self.number.id][:5], incremental[2][self.number.id][:5])
+
+    def test_invalid_batch_rejected(self):
+        """
+        testing answers breaking the question rules are refused before any write
+        """
+        url = reverse('api_answers', args=[self.survey.id])
+        response = self.client.post(url, {'answers': {str(self.radio.id): ['good', 'bad'],
+                                                      str(self.number.id): ['7'],
+                                                      '999999': ['x']}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'answers': {
+            str(self.radio.id): ['Select only one choice.'],
+            '999999': ['Question is not part of this survey.']}})
+        self.assertFalse(SurveyFeedback.objects.filter(survey=self.survey).exists())
+        response = self.client.post(reverse('api_autosave', args=[self.survey.id]),
+                                    {'answers': {str(self.number.id): ['7.5']}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SurveyAssignment.objects.get(survey=self.survey,
+                                                      employee=self.emp).revision, 0)
+
+    def test_autosave_deltas(self):
+        """
+        testing autosave updates only changed answers and moves the revision
+        """
+        url = reverse('api_autosave', args=[self.survey.id])
+        response = self.client.post(url, {'answers': {str(self.radio.id): ['bad']}},
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'saved': 1, 'revision': 1})
+        answer = SurveyFeedback.objects.get(question=self.radio)
+        SurveyFeedback.objects.filter(id=answer.id).update(
+            updated_date=answer.updated_date - datetime.timedelta(days=3))
+        response = self.client.post(url, {'answers': {str(self.radio.id): ['bad']}},
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'saved': 0, 'revision': 1})
+        response = self.client.post(url, {'answers': {str(self.radio.id): ['very good']}},
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'saved': 1, 'revision': 2})
+        answer.refresh_from_db()
+        self.assertEqual((answer.response, answer.flag), ('very good', False))
+        self.assertEqual(answer.updated_date, datetime.date.today())
+
+    def test_autosave_clears_blank_answers(self):
+        """
+        testing an answer submitted blank is removed and taken out of the summary
+        """
+        url = reverse('api_autosave', args=[self.survey.id])
+        self.client.post(url, {'answers': {str(self.radio.id): ['good'],
+                                           str(self.number.id): ['7']}},
+                         content_type='application/json')
+        response = self.client.post(url, {'answers': {str(self.number.id): ['']}},
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'saved': 1, 'revision': 2})
+        self.assertEqual(list(SurveyFeedback.objects.filter(survey=self.survey).values_list(
+            'question_id', flat=True)), [self.radio.id])
+        self.assertEqual(ResultSummaryTest.snapshot(self, self.survey), (1, 0, {
+            self.radio.id: (1, 0, 0, None, None, [('good', 1)], []),
+            self.number.id: (0, 0, 0, None, None, [], [(7, 0)])}))
+        response = self.client.post(url, {'answers': {str(self.radio.id): []}},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['saved'], 1)
+        self.assertEqual(SurveyResultSummary.objects.get(survey=self.survey).respondent_count, 0)
+
+    def test_autosave_query_count_independent_of_delta_size(self):
+        """
+        testing changed answers are updated in bulk
+        """
+        questions = [self.radio] + self.create_questions(30, self.survey)
+        url = reverse('api_autosave', args=[self.survey.id])
+
+        def autosave(count, label):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {'answers': {
+                    str(question.id): [label] for question in questions[:count]}},
+                                            content_type='application/json')
+            self.assertEqual(response.json()['saved'], count)
+            return len(queries)
+
+        autosave(len(questions), 'good')
+        autosave(len(questions), 'bad')
+        self.assertEqual(autosave(len(questions), 'good'), autosave(1, 'bad'))
+
+    def test_rejects_bad_batch(self):
+        """
+        testing answers not keyed by question id are rejected
+        """
+        response = self.client.post(reverse('api_answers', args=[self.survey.id]),
+                                    {'answers': {'radio': ['good']}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SurveyFeedback.objects.exists())
+
+
 class TestLogin(unittest.TestCase):
     """
     Testing Using Selenium
@@ -14,7 +14,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.login_gateway, name='login_gateway'),
@@ -23,4 +23,8 @@ urlpatterns = [
     path('que_list/<int:survey_id>', views.question_list, name='que_list'),
     path('save/<int:survey_id>', views.save, name='save'),
     path('logout/', views.user_logout, name='logout'),
+    path('api/employee/', api.employee_dashboard, name='api_employee'),
+    path('api/surveys/<int:survey_id>/', api.survey_definition, name='api_survey'),
+    path('api/surveys/<int:survey_id>/answers/', api.survey_answers, name='api_answers'),
+    path('api/surveys/<int:survey_id>/autosave/', api.autosave, name='api_autosave'),
 ]
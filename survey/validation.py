@@ -0,0 +1,97 @@
+"""
+This is answer validation file compiles one rule per survey
+question that checks submitted values and normalizes them into
+the typed columns of an answer
+"""
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from .models import Question, QuestionChoice
+
+NormalizedAnswer = namedtuple('NormalizedAnswer', ('response', 'integer_response', 'choice_ids'))
+
+
+class AnswerRule:
+    """
+    Compiled rule of one question. Choice questions carry their allowed
+    labels mapped to choice ids in position order
+    """
+
+    def __init__(self, question_id, question, question_type, choices=None):
+        self.question_id = question_id
+        self.question = question
+        self.question_type = question_type
+        self.choices = choices or {}
+
+    def normalize(self, values):
+        """
+        Normalized answer of submitted values, None when nothing was answered
+        :param values: submitted strings
+        """
+        values = [value.strip() for value in values if value and value.strip()]
+        if not values:
+            return None
+        if self.question_type == Question.INTEGER:
+            if len(values) > 1:
+                raise ValidationError('Enter a single whole number.')
+            try:
+                number = int(values[0])
+            except ValueError:
+                raise ValidationError('Enter a whole number.')
+            return NormalizedAnswer(str(number), number, frozenset())
+        if self.question_type in Question.CHOICE_TYPES:
+            unknown = [value for value in dict.fromkeys(values) if value not in self.choices]
+            if unknown:
+                raise ValidationError('%s is not one of the available choices.'
+                                      % ', '.join(unknown))
+            labels = [label for label in self.choices if label in values]
+            if len(labels) > 1 and self.question_type != Question.SELECT_MULTIPLE:
+                raise ValidationError('Select only one choice.')
+            return NormalizedAnswer(', '.join(labels), None,
+                                    frozenset(self.choices[label] for label in labels))
+        return NormalizedAnswer(', '.join(values), None, frozenset())
+
+
+def build_rules(questions):
+    """
+    Compiling the rules of the questions of a survey,
+    choices of all questions are read with one query
+    :param questions:
+    """
+    choices = {}
+    for question_id, label, choice_id in QuestionChoice.objects.filter(
+            is_active=True,
+            question_id__in=[question.id for question in questions
+                             if question.question_type in Question.CHOICE_TYPES]).order_by(
+                'question_id', 'position').values_list('question_id', 'label', 'id'):
+        choices.setdefault(question_id, {})[label] = choice_id
+    return {question.id: AnswerRule(question.id, question.question, question.question_type,
+                                    choices.get(question.id))
+            for question in questions}
+
+
+def normalize_answers(rules, answers):
+    """
+    Normalizing submitted answers of a survey. Problems of all answers
+    are collected and raised together, keyed by question id, so nothing
+    is written for a submission with bad input
+    :param rules: compiled rules keyed by question id
+    :param answers: mapping of question id to list of submitted values
+    """
+    normalized = {}
+    errors = {}
+    for question_id, values in answers.items():
+        rule = rules.get(question_id)
+        if rule is None:
+            errors[str(question_id)] = ['Question is not part of this survey.']
+            continue
+        try:
+            answer = rule.normalize(values)
+        except ValidationError as error:
+            errors[str(question_id)] = error.messages
+            continue
+        if answer is not None:
+            normalized[question_id] = answer
+    if errors:
+        raise ValidationError(errors)
+    return normalized
@@ -2,14 +2,19 @@
 This is views file contains business logic
 """
 import logging
-from smtplib import SMTPAuthenticationError
 
+from django.contrib import messages
 from django.contrib.auth import logout
+from django.core.exceptions import ValidationError
+from django.http import Http404
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.utils.timezone import now
-from django.core.mail import EmailMessage
-from .models import Employee, Survey, Question, SurveyFeedback
+from .definitions import get_answer_rules, get_definition, get_input_fragments
+from .identity import remember_employee
+from .mail_queue import enqueue_mail
+from .models import Employee, Survey
+from .queries import get_employee_dashboard, get_response_index, save_answers
 
 
 LOGGER = logging.getLogger(__name__)
@@ -34,28 +39,51 @@ def question_list(request, survey_id):
         if request.session['username'] is None:
             raise ConnectionError
         session_name = request.session['username']
-        emp = Employee.objects.get(emp_username=session_name)
+        emp = request.employee
+        if emp is None:
+            return redirect('login')
         LOGGER.info("This is the survey question view and current user is %s", session_name)
-        survey = Survey.objects.filter(id=survey_id)
-        survey_data = Survey.objects.filter(id=survey_id).values('question')
-        count = 0
-        que_id1 = ()
-        for questions in survey_data:
-            print(questions)
-            que_id = survey_data[count]['question']
-            que_id1 += (que_id,)
-            count += 1
-
-        question_data = Question.objects.filter(id__in=que_id1)
-        ans_data = SurveyFeedback.objects.filter(survey_id=survey_id, employee_id=emp.id)
-        LOGGER.info("ans data : %s ", ans_data)
-        context = {'question_list': question_data, 'survey_id': survey_id,
-                   'response': ans_data, 'employee': emp, 'survey': survey}
+        definition = get_definition(survey_id, emp.organization_id)
+        if definition is None:
+            LOGGER.error("Survey %s does not exist in organization %s", survey_id,
+                         emp.organization_id)
+            raise Http404
+        # Long or sectioned surveys are shown one page at a time
+        pages = definition['pages']
+        page_number = get_page_number(request.GET.get('page'), len(pages))
+        page = pages[page_number - 1]
+        response_index = get_response_index(
+            survey_id, emp.id,
+            [que.id for que in page['questions']] if len(pages) > 1 else None)
+        LOGGER.info("answered questions : %s ", len(response_index))
+        # Inputs of unanswered questions come from the fragment cache
+        input_fragments = get_input_fragments(
+            [que for que in page['questions'] if que.id not in response_index],
+            emp.organization_id, definition['version'])
+        context = {'question_list': page['questions'], 'survey_id': survey_id,
+                   'response_index': response_index, 'input_fragments': input_fragments,
+                   'employee': emp, 'survey': [definition['survey']],
+                   'section_title': page['title'], 'page_number': page_number,
+                   'page_count': len(pages)}
         return render(request, 'survey/question_list.html', context)
     except ConnectionError:
         LOGGER.error("something went wrong")
 
 
+def get_page_number(value, page_count=None):
+    """
+    Page number requested for a question list, the first
+    page for missing or invalid numbers
+    :param value:
+    :param page_count: last page, unbounded when not given
+    """
+    try:
+        number = max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+    return min(number, page_count) if page_count else number
+
+
 @login_required(login_url='login')
 def employee(request):
     """
@@ -68,46 +96,12 @@ def employee(request):
         # survey details of logged in user displaying on this view
         if 'username' in request.session:
             session_name = request.session['username']
-            emp = Employee.objects.get(emp_username=session_name)
-            employee_data = Employee.objects.filter(id=emp.id)
-            survey_emp_data = Survey.objects.filter(employee=emp.id, startDatetime__lte=now(),
-                                                    endDatetime__gte=now())
-            upcoming_surveys = Survey.objects.filter(employee=emp.id, startDatetime__gt=now(),
-                                                     endDatetime__gte=now())
-            expired_surveys = Survey.objects.filter(employee=emp.id, startDatetime__lt=now(),
-                                                    endDatetime__lte=now())
-            current_surveys = Survey.objects.filter(employee=emp.id, startDatetime__lte=now(),
-                                                    endDatetime__gte=now())
+            emp = request.employee
+            if emp is None:
+                return redirect('login')
             LOGGER.info("you are now in employee dashboard view ")
-
-            completed_survey = list()
-            assigned_survey = list()
-            incomplete_survey = list()
-
-            for survey in survey_emp_data:
-                survey_feedback = SurveyFeedback.objects.filter(
-                    employee_id=emp.id, survey_id=survey.id).count()
-                if survey_feedback:
-                    if SurveyFeedback.objects.filter(
-                            survey_id=survey.id, employee_id=emp.id, flag=True):
-                        completed_survey.append(survey)
-                    else:
-                        incomplete_survey.append(survey)
-                else:
-                    assigned_survey.append(survey)
-
-            pending_survey_count = len(assigned_survey)
-            completed_survey_count = len(completed_survey)
-            context = {'session': session_name, 'survey_list': survey_emp_data,
-                       'employee': employee_data,
-                       'completed_survey': completed_survey,
-                       'assigned_survey': assigned_survey,
-                       'upcoming_surveys': upcoming_surveys,
-                       'expired_surveys': expired_surveys,
-                       'current_surveys': current_surveys,
-                       'completed_survey_count': completed_survey_count,
-                       'pending_survey_count': pending_survey_count,
-                       'incomplete_survey': incomplete_survey}
+            context = get_employee_dashboard(emp)
+            context.update({'session': session_name, 'employee': [emp]})
             return render(request, "survey/survey.html", context)
         return redirect('login')
     except ConnectionError:
@@ -125,8 +119,10 @@ def login(request):
         password = request.POST.get("password")
         LOGGER.info("Employee Authentication")
         try:
-            if Employee.objects.get(emp_username=username, emp_password=password):
+            emp = Employee.objects.get(emp_username=username, emp_password=password)
+            if emp:
                 request.session['username'] = username
+                remember_employee(request.session, emp)
                 if request.session is None:
                     raise Exception
                 LOGGER.info("%s is just logged in into the employee dashboard :", username)
@@ -161,57 +157,49 @@ def save(request, survey_id):
     :param survey_id:
     """
     session_name = request.session['username']
-    emp = Employee.objects.get(emp_username=session_name)
+    emp = request.employee
+    if emp is None:
+        return redirect('login')
     LOGGER.info("%s is saving question answers into the system ", session_name)
+    try:
+        survey = Survey.objects.get(id=survey_id, employee=emp.id,
+                                    organization=request.user.organization_id)
+    except Survey.DoesNotExist:
+        LOGGER.error("Survey %s is not assigned to %s", survey_id, session_name)
+        return redirect("employee")
+
+    answers = {}
     for name in request.POST:
-        all_answers = SurveyFeedback.objects.filter(survey=Survey.objects.get(id=survey_id),
-                                                    employee=Employee.objects.get(id=emp.id))
-
-        if name not in ('csrfmiddlewaretoken', 'btn_response'):
-            is_record = SurveyFeedback.objects.filter(survey=Survey.objects.get(id=survey_id),
-                                                      employee=Employee.objects.get(id=emp.id),
-                                                      question=Question.objects.get(id=name))
-            if not is_record:
-                if request.POST[name]:
-                    if request.POST.getlist(name):
-                        survey_result_obj = SurveyFeedback()
-                        survey_result_obj.survey = Survey.objects.get(id=survey_id)
-                        survey_result_obj.employee = Employee.objects.get(id=emp.id)
-                        survey_result_obj.question = Question.objects.get(id=name)
-                        survey_result_obj.organization = request.user.organization
-                        survey_result_obj.response = ', '.join(
-                            request.POST.getlist(name))
-                        survey_status = Survey.objects.get(
-                            employee=Employee.objects.get(id=emp.id),
-                            id=survey_id,
-                            organization=request.user.organization)
-                        if request.POST["btn_response"] == "Finish":
-                            survey_result_obj.flag = True
-                            LOGGER.info("Result data : %s", survey_result_obj)
-                            survey_result_obj.save()
-                            survey_status.flag = True
-                            survey_status.save()
-
-                        else:
-                            survey_result_obj.flag = False
-                            survey_result_obj.save()
-                            survey_status.flag = False
-                            survey_status.save()
-        elif name == 'btn_response' and request.POST["btn_response"] == "Finish":
-
-            for record in all_answers:
-                record.flag = True
-                record.save()
-            try:
-                email_body = "Hi, \n Your have completed the survey \n" + \
-                             request.build_absolute_uri('/')[:-1].strip("/") \
-                             + "/employee"
-                email = EmailMessage(
-                    'Survey Feedback ', email_body, to=[session_name]
-                )
-                email.send()
-                LOGGER.info("Email has been sent to : %s", session_name)
-            except SMTPAuthenticationError:
-                LOGGER.exception("Email error : ")
+        if name not in ('csrfmiddlewaretoken', 'btn_response') and name.isdigit():
+            answers[int(name)] = request.POST.getlist(name)
+    finish = request.POST.get("btn_response") == "Finish"
+    step = {"Previous": -1, "Next": 1}.get(request.POST.get("btn_response"))
+    try:
+        saved = save_answers(survey, emp, request.user.organization_id, answers, finish,
+                             replace=True)
+    except ValidationError as error:
+        # Nothing was saved, the employee corrects the answers on the same page
+        LOGGER.error("Answers of %s for survey %s rejected : %s", session_name, survey_id,
+                     error.message_dict)
+        rules = get_answer_rules(survey_id, request.user.organization_id)
+        for question_id, problems in error.message_dict.items():
+            rule = rules.get(int(question_id))
+            for problem in problems:
+                messages.error(request, '%s: %s' % (rule.question, problem) if rule else problem)
+        return redirect('%s?page=%s' % (reverse('que_list', args=[survey_id]),
+                                        get_page_number(request.POST.get("page"))))
+    LOGGER.info("%s answers saved for survey %s", saved, survey_id)
+
+    if step:
+        # question_list clamps the page to the pages of the survey
+        page_number = max(get_page_number(request.POST.get("page")) + step, 1)
+        return redirect('%s?page=%s' % (reverse('que_list', args=[survey_id]), page_number))
+
+    if finish:
+        email_body = "Hi, \n Your have completed the survey \n" + \
+                     request.build_absolute_uri('/')[:-1].strip("/") \
+                     + "/employee"
+        enqueue_mail('Survey Feedback ', email_body, [session_name])
+        LOGGER.info("Email has been queued for : %s", session_name)
 
     return redirect("employee")